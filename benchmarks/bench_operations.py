@@ -0,0 +1,278 @@
+"""Throughput benchmark for the googD storage operations, run against the local fake Drive.
+
+No network or Google account is needed: every scenario runs against
+tests.fake_drive with the configured latency, bandwidth and error rate. Results,
+including p50/p95/p99 latency of the individual API requests, are printed as JSON.
+
+    python -m benchmarks.bench_operations --latency-ms 20 --jobs 8
+    python -m benchmarks.bench_operations --quick --error-rate 0.02
+    python -m benchmarks.bench_operations --quick --engine both
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from google.auth.credentials import AnonymousCredentials
+
+from functions import async_engine, rate_limit, storage_operations
+from functions.async_engine import AsyncUploadOperation, AsyncDownloadOperation, AsyncListOperation, \
+    AsyncRemoveOperation, AsyncBulkRemoveOperation
+from functions.storage_operations import UploadOperation, DownloadOperation, ListOperation, RemoveOperation, \
+    BulkRemoveOperation
+from tests.fake_drive import FakeDrive, FakeDriveServer
+
+KB = 1024
+MB = 1024 * 1024
+
+# (scenario, file count, file size) for the full and the --quick suites
+FULL_SUITE = [
+    ('list', 1000, 0), ('list', 10000, 0),
+    ('upload', 200, 4 * KB), ('upload', 20, 1 * MB), ('upload', 2, 32 * MB),
+    ('download', 50, 64 * KB), ('download', 4, 8 * MB), ('download_ranged', 1, 64 * MB),
+    ('remove', 50, 0), ('bulk_remove', 1000, 0),
+]
+QUICK_SUITE = [
+    ('list', 500, 0), ('upload', 20, 4 * KB), ('upload', 2, 1 * MB),
+    ('download', 10, 64 * KB), ('download_ranged', 1, 4 * MB), ('remove', 10, 0), ('bulk_remove', 100, 0),
+]
+
+
+class TimingExecutor(rate_limit.RequestExecutor):
+    """Request executor that records the latency of every API request and counts retries."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def call(self, function, nbytes=0, cost=1, retryable=rate_limit.is_retryable):
+        attempts = []
+
+        def timed():
+            attempts.append(None)
+            start = time.perf_counter()
+            try:
+                return function()
+            finally:
+                with self.lock:
+                    self.latencies.append(time.perf_counter() - start)
+
+        try:
+            return super().call(timed, nbytes, cost, retryable)
+        finally:
+            with self.lock:
+                self.retries += len(attempts) - 1
+
+
+class TimingAsyncExecutor(async_engine.AsyncRequestExecutor):
+    """Async request executor that records into a TimingExecutor's latencies and retries."""
+
+    def __init__(self, timing, concurrency=rate_limit.DEFAULT_CONCURRENCY):
+        super().__init__(timing, concurrency)
+        self.timing = timing
+
+    async def call(self, function, nbytes=0, cost=1):
+        attempts = []
+
+        async def timed():
+            attempts.append(None)
+            start = time.perf_counter()
+            try:
+                return await function()
+            finally:
+                self.timing.latencies.append(time.perf_counter() - start)
+
+        try:
+            return await super().call(timed, nbytes, cost)
+        finally:
+            self.timing.retries += len(attempts) - 1
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def new_drive(self):
+        drive = FakeDrive(latency=self.args.latency_ms / 1000,
+                          bandwidth=self.args.bandwidth_mbps * MB if self.args.bandwidth_mbps else None,
+                          error_rate=self.args.error_rate, seed=self.args.seed)
+        return FakeDriveServer(drive).start()
+
+    def local_files(self, count, size):
+        folder = tempfile.mkdtemp(dir=self.tmp.name)
+        data = os.urandom(size)
+        paths = []
+        for i in range(count):
+            paths.append(os.path.join(folder, f'file{i:05d}.bin'))
+            with open(paths[-1], 'wb') as f:
+                f.write(data)
+        return paths
+
+    def run(self, scenario, count, size, engine='threads'):
+        server = self.new_drive()
+        drive = server.drive
+        storage_operations.API_ENDPOINT = server.endpoint
+        credentials = AnonymousCredentials()
+        jobs = self.args.jobs
+        executor = TimingExecutor(rate=None, base_delay=0.05, max_delay=1.0)
+        # The async operations of one scenario share a timed executor drawing on the same limits
+        timed = TimingAsyncExecutor(executor) if engine == 'async' else None
+        try:
+            # Setup does not count towards the measurement
+            if engine == 'async':
+                run = self.async_scenario(scenario, count, size, drive, credentials, jobs, timed)
+            elif scenario == 'list':
+                for i in range(count):
+                    drive.add_file(f'file{i:05d}.txt')
+                run = ListOperation(credentials, page_size=1000).execute
+            elif scenario == 'upload':
+                paths = self.local_files(count, size)
+                run = UploadOperation(credentials, paths, 'bench', jobs=jobs, sessions=NoSessions()).execute
+            elif scenario in ('download', 'download_ranged'):
+                data = os.urandom(size)
+                names = [f'file{i:05d}.bin' for i in range(count)]
+                for name in names:
+                    drive.add_file(name, data)
+                destination = tempfile.mkdtemp(dir=self.tmp.name)
+                ranged = scenario == 'download_ranged'
+
+                def run():
+                    for name in names:
+                        DownloadOperation(credentials, name, destination, ranged=ranged, jobs=jobs).execute()
+            elif scenario == 'remove':
+                names = [f'file{i:05d}.tmp' for i in range(count)]
+                for name in names:
+                    drive.add_file(name)
+
+                def run():
+                    for name in names:
+                        RemoveOperation(credentials, name).execute()
+            elif scenario == 'bulk_remove':
+                for i in range(count):
+                    drive.add_file(f'file{i:05d}.tmp')
+                run = BulkRemoveOperation(credentials, pattern='*.tmp').execute
+            else:
+                raise ValueError(f"Unknown scenario {scenario}")
+
+            rate_limit._executor = executor
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                run()
+            seconds = time.perf_counter() - start
+        finally:
+            server.stop()
+
+        latencies_ms = [latency * 1000 for latency in executor.latencies]
+        result = {
+            'scenario': scenario,
+            'engine': engine,
+            'files': count,
+            'file_size': size,
+            'seconds': round(seconds, 3),
+            'files_per_sec': round(count / seconds, 1),
+            'requests': len(latencies_ms),
+            'requests_per_sec': round(len(latencies_ms) / seconds, 1),
+            'retries': executor.retries,
+            'latency_ms': {name: round(percentile(latencies_ms, fraction), 2) if latencies_ms else None
+                           for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))},
+        }
+        if size:
+            result['mb_per_sec'] = round(count * size / MB / seconds, 2)
+        return result
+
+
+    def async_scenario(self, scenario, count, size, drive, credentials, jobs, executor):
+        """Set up a scenario for the async engine, returning the callable to measure."""
+        if scenario == 'list':
+            for i in range(count):
+                drive.add_file(f'file{i:05d}.txt')
+            return AsyncListOperation(credentials, page_size=1000, executor=executor).execute
+        if scenario == 'upload':
+            paths = self.local_files(count, size)
+            return AsyncUploadOperation(credentials, paths, 'bench', jobs=jobs, executor=executor).execute
+        if scenario == 'download':
+            data = os.urandom(size)
+            names = [f'file{i:05d}.bin' for i in range(count)]
+            for name in names:
+                drive.add_file(name, data)
+            destination = tempfile.mkdtemp(dir=self.tmp.name)
+            return lambda: [AsyncDownloadOperation(credentials, name, destination, executor=executor).execute()
+                            for name in names]
+        if scenario == 'remove':
+            names = [f'file{i:05d}.tmp' for i in range(count)]
+            for name in names:
+                drive.add_file(name)
+            return lambda: [AsyncRemoveOperation(credentials, name, executor=executor).execute() for name in names]
+        if scenario == 'bulk_remove':
+            for i in range(count):
+                drive.add_file(f'file{i:05d}.tmp')
+            return AsyncBulkRemoveOperation(credentials, pattern='*.tmp', executor=executor).execute
+        raise ValueError(f"Unknown scenario {scenario} for the async engine")
+
+
+class NoSessions(storage_operations.UploadSessions):
+    """Upload session store that keeps nothing, so benchmark runs leave no state behind."""
+
+    def __init__(self):
+        super().__init__(os.devnull)
+        self.sessions = {}
+
+    def save(self, path, key, uri, offset):
+        pass
+
+    def discard(self, path):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark googD operations against a local fake Drive")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Added to every HTTP round trip")
+    parser.add_argument('--bandwidth-mbps', type=float, default=0,
+                        help="MiB per second for request and response bodies, per connection (default: no limit)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with a 503")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the injected errors")
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--quick', action='store_true', help="Run a smaller suite")
+    parser.add_argument('--scenario', action='append', help="Only run these scenarios (repeatable)")
+    parser.add_argument('--engine', choices=['threads', 'async', 'both'], default='threads',
+                        help="Operations to measure; async has no download_ranged scenario (default: threads)")
+    args = parser.parse_args(argv)
+
+    suite = QUICK_SUITE if args.quick else FULL_SUITE
+    if args.scenario:
+        suite = [case for case in suite if case[0] in args.scenario]
+
+    bench = Bench(args)
+    endpoint, executor = storage_operations.API_ENDPOINT, rate_limit._executor
+    try:
+        engines = ['threads', 'async'] if args.engine == 'both' else [args.engine]
+        results = [bench.run(*case, engine) for case in suite for engine in engines
+                   if not (engine == 'async' and case[0] == 'download_ranged')]
+    finally:
+        storage_operations.API_ENDPOINT, rate_limit._executor = endpoint, executor
+        bench.tmp.cleanup()
+
+    config = {key: getattr(args, key) for key in ('latency_ms', 'bandwidth_mbps', 'error_rate', 'seed', 'jobs', 'engine')}
+    print(json.dumps({'config': config, 'results': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
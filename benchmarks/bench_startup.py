@@ -0,0 +1,90 @@
+"""Startup-time benchmark for googD.
+
+Measures how long the CLI takes before any real work starts and prints the
+results as JSON. Exits with status 1 when a measurement exceeds its budget.
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child process snippets, each printing the seconds spent in the measured step
+IMPORT_OPERATIONS = '''
+import time
+start = time.perf_counter()
+import functions.storage_operations
+print(time.perf_counter() - start)
+'''
+
+BUILD_SERVICE = '''
+import time
+from google.auth.credentials import AnonymousCredentials
+from functions import storage_operations
+credentials = AnonymousCredentials()
+start = time.perf_counter()
+storage_operations.get_service(credentials)
+cold = time.perf_counter() - start
+start = time.perf_counter()
+storage_operations.get_service(credentials)
+print(cold, time.perf_counter() - start)
+'''
+
+
+def run_python(*args):
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def measure_help():
+    start = time.perf_counter()
+    run_python('googD.py', '--help')
+    return time.perf_counter() - start
+
+
+def summarize(samples):
+    return {'min_ms': round(min(samples) * 1000, 2), 'median_ms': round(statistics.median(samples) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure googD startup latency")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-help-ms', type=float, default=300.0,
+                        help="Budget for the median wall time of 'googD.py --help'")
+    parser.add_argument('--max-warm-service-ms', type=float, default=1.0,
+                        help="Budget for the median time of reusing the shared service")
+    args = parser.parse_args()
+
+    help_times, import_times, cold_builds, warm_builds = [], [], [], []
+    for _ in range(args.runs):
+        help_times.append(measure_help())
+        import_times.append(float(run_python('-c', IMPORT_OPERATIONS)))
+        cold, warm = map(float, run_python('-c', BUILD_SERVICE).split())
+        cold_builds.append(cold)
+        warm_builds.append(warm)
+
+    results = {
+        'runs': args.runs,
+        'help': summarize(help_times),
+        'import_storage_operations': summarize(import_times),
+        'build_service_cold': summarize(cold_builds),
+        'build_service_warm': summarize(warm_builds),
+    }
+    regressions = []
+    if results['help']['median_ms'] > args.max_help_ms:
+        regressions.append('help')
+    if results['build_service_warm']['median_ms'] > args.max_warm_service_ms:
+        regressions.append('build_service_warm')
+    results['regressions'] = regressions
+    print(json.dumps(results, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,727 @@
+import asyncio
+import fnmatch
+import json
+import os
+import posixpath
+import random
+import ssl
+import sys
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from functions import storage_operations
+from functions.compression import DecompressingWriter, compression_of
+from functions.instrumentation import get_recorder, phase
+from functions.rate_limit import DEFAULT_CONCURRENCY, AdaptiveConcurrency, describe, get_executor, is_retryable, \
+    is_throttled, retry_after
+from functions.storage_operations import FILE_FIELDS, FOLDER_MIME_TYPE, PAGE_SIZE, UPLOAD_CHUNK_SIZE, \
+    DownloadOperation, ListFilter, ListingPrinter, UploadOperation, bulk_remove_query, collect_sources, \
+    get_folder_cache, is_current, local_path, quote
+
+DEFAULT_ENDPOINT = 'https://www.googleapis.com/'
+READ_SIZE = 64 * 1024
+# Largest file sent as one multipart request, bigger ones take a resumable session
+MULTIPART_LIMIT = 5 * 1024 * 1024
+TIMEOUT = 60  # Seconds without progress before a connection is given up
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body', 'size')
+
+    def __init__(self, status, headers, body, size):
+        self.status = status
+        self.headers = headers  # Lower-case names
+        self.body = body  # Empty when the body went to a sink
+        self.size = size
+
+    def json(self):
+        return json.loads(self.body) if self.body else {}
+
+
+class _StaleConnection(Exception):
+    """The server closed the connection before sending a response."""
+
+
+class AsyncHttpClient:
+    """Minimal HTTP/1.1 client on asyncio streams that keeps connections alive between requests.
+
+    Each host gets a pool of idle connections, and at most ``max_connections`` requests
+    are in flight at once. A request that finds its pooled connection closed by the
+    server is resent on a new one. A 2xx response body can be streamed to ``sink``
+    instead of being held in memory.
+    """
+
+    def __init__(self, max_connections=DEFAULT_CONCURRENCY, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(max_connections)
+        self.idle = {}
+        self.ssl_context = None
+        self.opened = 0
+
+    async def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+    async def _open(self, scheme, host, port):
+        context = None
+        if scheme == 'https':
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            context = self.ssl_context
+        connection = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=context), self.timeout)
+        self.opened += 1
+        return connection
+
+    async def request(self, method, url, headers=None, body=b'', sink=None):
+        parts = urllib.parse.urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+        recorder = get_recorder()
+        start = time.perf_counter()
+        response = None
+        try:
+            async with self.slots:
+                while True:
+                    pool = self.idle.get(origin)
+                    reused = bool(pool)
+                    reader, writer = pool.pop() if reused else await self._open(*origin)
+                    try:
+                        writer.write(data)
+                        await writer.drain()
+                        response, keep_alive = await self._read_response(reader, method, sink)
+                    except _StaleConnection as e:
+                        writer.close()
+                        if reused:
+                            continue  # Closed while idle, before answering: resend on a new connection
+                        raise ConnectionResetError(f"{parts.netloc} closed the connection") from e
+                    except BaseException:
+                        writer.close()
+                        raise
+                    if keep_alive:
+                        self.idle.setdefault(origin, []).append((reader, writer))
+                    else:
+                        writer.close()
+                    return response
+        finally:
+            if recorder:
+                recorder.record_request(method, url, start, time.perf_counter() - start,
+                                        response.status if response else None, len(body),
+                                        response.size if response else 0)
+
+    async def _wait(self, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionResetError("connection closed mid-response") from e
+
+    async def _read_response(self, reader, method, sink):
+        try:
+            status_line = await self._wait(reader.readline())
+        except ConnectionError as e:
+            raise _StaleConnection() from e
+        if not status_line:
+            raise _StaleConnection()
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await self._wait(reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version != 'HTTP/1.0' and headers.get('connection', '').lower() != 'close'
+
+        chunks = []
+        write = sink if sink and 200 <= status < 300 else chunks.append
+        size = 0
+
+        async def copy(length):
+            nonlocal size
+            while length:
+                data = await self._wait(reader.read(min(READ_SIZE, length)))
+                if not data:
+                    raise ConnectionResetError("connection closed mid-response")
+                write(data)
+                size += len(data)
+                length -= len(data)
+
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            pass
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                length = int((await self._wait(reader.readline())).split(b';')[0], 16)
+                if not length:
+                    while (await self._wait(reader.readline())) not in (b'\r\n', b'\n', b''):
+                        pass  # Trailers
+                    break
+                await copy(length)
+                await self._wait(reader.readexactly(2))
+        elif 'content-length' in headers:
+            await copy(int(headers['content-length']))
+        else:
+            # The body runs to the end of the connection
+            while True:
+                data = await self._wait(reader.read(READ_SIZE))
+                if not data:
+                    break
+                write(data)
+                size += len(data)
+            keep_alive = False
+        return Response(status, headers, b''.join(chunks), size), keep_alive
+
+
+def http_error(response, uri):
+    """Wrap an error response in the HttpError googleapiclient raises, so the retry policy applies unchanged."""
+    return HttpError(httplib2.Response(dict(response.headers, status=response.status)), response.body, uri=uri)
+
+
+class AsyncAdaptiveConcurrency(AdaptiveConcurrency):
+    """AdaptiveConcurrency for the tasks of an event loop, which wait on the loop instead of blocking it."""
+
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.loop = self.waiters = None
+
+    def _waiters(self):
+        # Conditions belong to one event loop, and every execute() runs a new one
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop, self.waiters, self.active = loop, asyncio.Condition(), 0
+        return self.waiters
+
+    async def __aenter__(self):
+        waiters = self._waiters()
+        async with waiters:
+            await waiters.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        waiters = self._waiters()
+        async with waiters:
+            self.active -= 1
+            # The limit may have grown since the waiters last looked
+            waiters.notify_all()
+
+
+class AsyncRequestExecutor:
+    """Async counterpart of RequestExecutor, sharing the process-wide rate and bandwidth buckets.
+
+    At most ``concurrency`` calls are in flight, fewer while the API throttles. Throttling and
+    transient errors are retried with the same jittered exponential backoff, waiting on the
+    event loop instead of a thread.
+    """
+
+    def __init__(self, executor=None, concurrency=DEFAULT_CONCURRENCY):
+        executor = executor or get_executor()
+        self.requests = executor.requests
+        self.bytes = executor.bytes
+        self.max_retries = executor.max_retries
+        self.base_delay = executor.base_delay
+        self.max_delay = executor.max_delay
+        self.concurrency = AsyncAdaptiveConcurrency(concurrency)
+
+    async def consume(self, nbytes):
+        """Charge transferred bytes against the bandwidth limit."""
+        if self.bytes and nbytes:
+            await asyncio.sleep(self.bytes.reserve(nbytes))
+
+    async def call(self, function, nbytes=0, cost=1):
+        """Await ``function()``, which performs one API request of ``cost`` calls sending ``nbytes``."""
+        attempt = 0
+        while True:
+            if self.requests:
+                wait = self.requests.reserve(cost)
+                if wait:
+                    await asyncio.sleep(wait)
+            await self.consume(nbytes)
+            try:
+                async with self.concurrency:
+                    result = await function()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                if isinstance(e, HttpError) and is_throttled(e):
+                    self.concurrency.on_throttle()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, retry_after(e) or 0)
+                attempt += 1
+                recorder = get_recorder()
+                if recorder:
+                    recorder.record_retry(describe(e))
+                print(f"Request failed ({describe(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s",
+                      file=sys.stderr)
+                await asyncio.sleep(delay)
+                continue
+            self.concurrency.on_success()
+            return result
+
+
+class AsyncDrive:
+    """The Drive v3 REST calls of the async engine, sent through one pooled client."""
+
+    def __init__(self, credentials, executor=None, concurrency=DEFAULT_CONCURRENCY):
+        base = (storage_operations.API_ENDPOINT or DEFAULT_ENDPOINT).rstrip('/') + '/'
+        self.files_url = base + 'drive/v3/files'
+        self.upload_url = base + 'upload/drive/v3/files'
+        self.credentials = credentials
+        self.executor = executor or AsyncRequestExecutor(concurrency=concurrency)
+        self.http = AsyncHttpClient(concurrency)
+        self.refresh_lock = asyncio.Lock()
+
+    async def close(self):
+        await self.http.close()
+
+    async def headers(self, extra=None):
+        if not self.credentials.valid:
+            async with self.refresh_lock:
+                if not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    # google-auth refreshes with a blocking request, keep it off the event loop
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        headers = dict(extra or {})
+        self.credentials.apply(headers)
+        return headers
+
+    async def request(self, method, url, params=None, body=b'', headers=None, nbytes=0, sink=None):
+        """Send one API request through the executor; ``sink()`` makes a fresh body sink per attempt."""
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+
+        async def send():
+            response = await self.http.request(method, url, await self.headers(headers), body,
+                                               sink() if sink else None)
+            if response.status >= 400:
+                raise http_error(response, url)
+            return response
+        return await self.executor.call(send, nbytes)
+
+    async def list_pages(self, query, fields, page_size=PAGE_SIZE):
+        """Yield the files of each result page of a query."""
+        params = {'q': query, 'fields': f"nextPageToken, files({fields})", 'pageSize': page_size}
+        while True:
+            result = (await self.request('GET', self.files_url, params)).json()
+            yield result.get('files', [])
+            if not result.get('nextPageToken'):
+                return
+            params['pageToken'] = result['nextPageToken']
+
+    async def find(self, name, parent_id=None, mime_type=None, include_trashed=True):
+        query = f"name = '{quote(name)}'"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        if mime_type:
+            query += f" and mimeType = '{mime_type}'"
+        if not include_trashed:
+            query += " and trashed = false"
+        with phase('name_lookup'):
+            response = await self.request('GET', self.files_url, {'q': query, 'fields': f"files({FILE_FIELDS})"})
+        return response.json().get('files', [])
+
+    async def create(self, metadata, fields='id'):
+        response = await self.request('POST', self.files_url, {'fields': fields}, json.dumps(metadata).encode(),
+                                      {'Content-Type': 'application/json; charset=UTF-8'})
+        return response.json()
+
+    async def delete(self, file_id):
+        await self.request('DELETE', f"{self.files_url}/{file_id}")
+
+    async def download(self, file_id, destination, compression=None):
+        """Stream a file's content into ``destination`` through a temporary file, returning the bytes received.
+
+        With ``compression`` (from compression_of), the content is decompressed as it arrives
+        and checked against the original size and MD5.
+        """
+        partial = destination + '.part'
+        files, writers = [], []
+
+        def sink():
+            # A retried request starts the file over
+            if files:
+                files[-1].close()
+            files.append(open(partial, 'wb'))
+            writers.append(DecompressingWriter(files[-1], *compression) if compression else files[-1])
+            return writers[-1].write
+        try:
+            response = await self.request('GET', f"{self.files_url}/{file_id}", {'alt': 'media'}, sink=sink)
+            if compression:
+                writers[-1].finish()
+            files[-1].close()
+            os.replace(partial, destination)
+        finally:
+            for f in files:
+                f.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+        await self.executor.consume(response.size)
+        return response.size
+
+    async def upload(self, path, metadata, chunk_size=UPLOAD_CHUNK_SIZE, fields='id'):
+        """Upload a local file: one multipart request if it is small, a resumable session of chunks otherwise."""
+        size = os.path.getsize(path)
+        if size <= min(chunk_size, MULTIPART_LIMIT):
+            with open(path, 'rb') as f:
+                content = await asyncio.to_thread(f.read)
+            boundary = f"googd{random.getrandbits(64):016x}"
+            body = (f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                    f"{json.dumps(metadata)}\r\n--{boundary}\r\n"
+                    f"Content-Type: application/octet-stream\r\n\r\n").encode() + content + \
+                f"\r\n--{boundary}--".encode()
+            response = await self.request('POST', self.upload_url, {'uploadType': 'multipart', 'fields': fields},
+                                          body, {'Content-Type': f"multipart/related; boundary={boundary}"},
+                                          nbytes=len(body))
+            return response.json()
+
+        session = await self.request('POST', self.upload_url, {'uploadType': 'resumable', 'fields': fields},
+                                     json.dumps(metadata).encode(),
+                                     {'Content-Type': 'application/json; charset=UTF-8',
+                                      'X-Upload-Content-Length': str(size)})
+        uri = session.headers['location']
+        offset = 0
+        with open(path, 'rb') as f:
+            while True:
+                f.seek(offset)
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                response = await self.request('PUT', uri, body=chunk, nbytes=len(chunk), headers={
+                    'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{size}"})
+                if response.status != 308:
+                    return response.json()
+                # Continue from what the server acknowledged, which may be less than what was sent
+                acknowledged = response.headers.get('range')
+                offset = int(acknowledged.rsplit('-', 1)[1]) + 1 if acknowledged else 0
+
+
+class AsyncStorageOperation(ABC):
+    """Base of the async operations: ``execute()`` runs ``run()`` on a new event loop with its own client."""
+
+    def __init__(self, credentials, jobs=4, executor=None):
+        self.credentials = credentials
+        self.jobs = max(1, jobs)
+        self.executor = executor
+        self.drive = None
+        self.folder_locks = {}
+
+    def execute(self):
+        return asyncio.run(self._main())
+
+    async def _main(self):
+        self.drive = AsyncDrive(self.credentials, self.executor)
+        try:
+            return await self.run()
+        finally:
+            await self.drive.close()
+
+    @abstractmethod
+    async def run(self):
+        pass
+
+    async def resolve_folder(self, path, create=False, parent_id='root'):
+        """Async StorageOperation.resolve_folder, sharing the process-wide folder cache."""
+        cache = get_folder_cache()
+        folder_id, prefix, missing = parent_id, '', False
+        for segment in [segment for segment in path.split('/') if segment]:
+            prefix = f"{prefix}/{segment}" if prefix else segment
+            key = (parent_id, prefix)
+            cached = cache.get(key)
+            if cached is None:
+                async with self.folder_locks.setdefault(key, asyncio.Lock()):
+                    # Another task may have resolved or created it while we waited
+                    cached = cache.get(key)
+                    if cached is None:
+                        folders = [] if missing else await self.drive.find(segment, folder_id, FOLDER_MIME_TYPE,
+                                                                                 include_trashed=False)
+                        cached = folders[0]['id'] if folders else None
+                        if cached is None:
+                            if not create:
+                                return None
+                            missing = True
+                            folder = await self.drive.create({'name': segment, 'mimeType': FOLDER_MIME_TYPE,
+                                                              'parents': [folder_id]})
+                            cached = folder['id']
+                            print(f"Created folder '{prefix}' with ID: {cached}")
+                        cache.set(key, cached)
+            folder_id = cached
+        return folder_id
+
+    async def walk(self, folder_id, prefix, query, fields, page_size=PAGE_SIZE):
+        """Yield (path, item) pairs of a folder tree, listing up to ``jobs`` folders concurrently."""
+        rows = asyncio.Queue()
+        slots = asyncio.Semaphore(self.jobs)
+        pending = 0
+
+        async def list_folder(parent_id, prefix):
+            try:
+                async with slots:
+                    q = f"'{parent_id}' in parents" + (f" and {query}" if query else '')
+                    async for page in self.drive.list_pages(q, fields, page_size):
+                        for item in page:
+                            path = prefix + item['name']
+                            if item['mimeType'] == FOLDER_MIME_TYPE:
+                                start(item['id'], path + '/')
+                            rows.put_nowait((path, item))
+            except Exception as e:
+                print(f"Failed to list folder {prefix or '/'}: {e}", file=sys.stderr)
+            finally:
+                rows.put_nowait(None)
+
+        def start(parent_id, prefix):
+            nonlocal pending
+            pending += 1
+            tasks.add(asyncio.ensure_future(list_folder(parent_id, prefix)))
+
+        tasks = set()
+        start(folder_id, prefix)
+        try:
+            while pending:
+                row = await rows.get()
+                if row is None:
+                    pending -= 1
+                else:
+                    yield row
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class AsyncListOperation(AsyncStorageOperation):
+    def __init__(self, credentials, recursive=False, output_format='text', page_size=PAGE_SIZE, jobs=4,
+                 filters=None, fields=None, executor=None):
+        super().__init__(credentials, jobs, executor)
+        self.recursive = recursive
+        self.page_size = page_size
+        self.filters = filters or ListFilter()
+        self.printer = ListingPrinter(output_format, fields)
+
+    async def run(self):
+        fields = self.printer.request_fields(self.filters)
+        query = self.filters.query()
+        if self.recursive:
+            # Folders that do not match are still fetched, to descend into them
+            extra_query = f"({query} or mimeType = '{FOLDER_MIME_TYPE}')" if query else None
+            async for path, item in self.walk('root', '', extra_query, fields, self.page_size):
+                self.emit(path, item)
+        else:
+            query = "'root' in parents" + (f" and {query}" if query else '')
+            async for page in self.drive.list_pages(query, fields, self.page_size):
+                for item in page:
+                    self.emit(item['name'], item)
+        self.printer.finish()
+
+    def emit(self, path, item):
+        if not self.filters or self.filters.matches(item):
+            self.printer.row(path, item)
+
+
+class AsyncUploadOperation(AsyncStorageOperation):
+    def __init__(self, credentials, source, folder_name=None, jobs=4, chunk_size=UPLOAD_CHUNK_SIZE, executor=None):
+        super().__init__(credentials, jobs, executor)
+        self.sources = [source] if isinstance(source, str) else list(source)
+        self.folder_name = folder_name
+        self.chunk_size = chunk_size
+
+    async def run(self):
+        files, folders, missing = collect_sources(self.sources)
+        for path in missing:
+            print(f"Error: The file {path} does not exist.")
+        if not files and not folders:
+            return []
+
+        folder_id = None
+        if self.folder_name:
+            folder_id = await self.resolve_folder(self.folder_name, create=True)
+        # Recreate uploaded directory trees, parents before children
+        folder_ids = {(): folder_id}
+        for parts in folders:
+            folder_ids[parts] = await self.resolve_folder('/'.join(parts), create=True,
+                                                          parent_id=folder_id or 'root')
+
+        slots = asyncio.Semaphore(self.jobs)
+
+        async def upload(path, parent_id):
+            async with slots:
+                metadata = {'name': os.path.basename(path)}
+                if parent_id:
+                    metadata['parents'] = [parent_id]
+                try:
+                    file_id = (await self.drive.upload(path, metadata, self.chunk_size)).get('id')
+                except Exception as e:
+                    print(f"Failed to upload {path}: {e}")
+                    return path, None, str(e)
+                print(f"Uploaded {path} with file ID: {file_id}")
+                return path, file_id, None
+
+        results = [(path, None, 'file does not exist') for path in missing]
+        results += await asyncio.gather(*(upload(path, folder_ids[parts]) for path, parts in files))
+        UploadOperation.print_summary(results)
+        return results
+
+
+class AsyncDownloadOperation(AsyncStorageOperation):
+    def __init__(self, credentials, file_name=None, destination_folder='.', jobs=4, folder_name=None,
+                 recursive=False, hash_cache=None, executor=None):
+        super().__init__(credentials, jobs, executor)
+        self.file_name = file_name
+        self.destination_folder = destination_folder
+        self.folder_name = folder_name
+        self.recursive = recursive
+        self.hash_cache = hash_cache
+
+    async def run(self):
+        if self.folder_name:
+            return await self.download_folder()
+        files = await self.drive.find(self.file_name)
+        if not files:
+            print(f"No file found with the name '{self.file_name}'.")
+            return None
+        file_id = files[0]['id']
+        print(f"Found file: {self.file_name} (ID: {file_id})")
+        destination = os.path.join(self.destination_folder, self.file_name)
+        await self.drive.download(file_id, destination, compression_of(files[0]))
+        print(f"Downloaded file to {destination}")
+        return destination
+
+    async def download_folder(self):
+        """Async DownloadOperation.download_folder: files download while the tree is still being listed."""
+        folder_id = await self.resolve_folder(self.folder_name)
+        if not folder_id:
+            print(f"Folder '{self.folder_name}' not found in Google Drive.")
+            return None
+        root = os.path.join(self.destination_folder, posixpath.basename(self.folder_name.strip('/')))
+        os.makedirs(root, exist_ok=True)
+        fields = DownloadOperation.TREE_FIELDS
+        if self.recursive:
+            rows = self.walk(folder_id, '', 'trashed = false', fields)
+        else:
+            rows = self.list_folder(folder_id, fields)
+
+        counts = {'downloaded': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        slots = asyncio.Semaphore(self.jobs)
+        # Downloads waiting to start, so the listing runs ahead but not unbounded
+        queued = asyncio.Semaphore(self.jobs * DownloadOperation.QUEUE_DEPTH)
+
+        async def fetch(rel, item, destination):
+            try:
+                async with slots:
+                    if await asyncio.to_thread(is_current, destination, item, self.hash_cache):
+                        counts['unchanged'] += 1
+                        return
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    await self.drive.download(item['id'], destination, compression_of(item))
+                    print(f"Downloaded {rel}")
+                    counts['downloaded'] += 1
+            except Exception as e:
+                print(f"Failed to download {rel}: {e}")
+                counts['failed'] += 1
+            finally:
+                queued.release()
+
+        tasks = set()
+        async for rel, item in rows:
+            destination = local_path(root, rel)
+            if destination is None:
+                print(f"Skipping {rel}: not a valid local path")
+                counts['skipped'] += 1
+            elif item['mimeType'] == FOLDER_MIME_TYPE:
+                if self.recursive:
+                    os.makedirs(destination, exist_ok=True)
+            elif 'md5Checksum' not in item:
+                print(f"Skipping {rel}: Google Docs files have no binary content")
+                counts['skipped'] += 1
+            else:
+                await queued.acquire()
+                task = asyncio.ensure_future(fetch(rel, item, destination))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        if self.hash_cache:
+            self.hash_cache.flush()
+        print(f"Downloaded folder to {root}: " + ", ".join(f"{n} {kind}" for kind, n in counts.items()))
+        return counts
+
+    async def list_folder(self, folder_id, fields):
+        async for page in self.drive.list_pages(f"'{folder_id}' in parents and trashed = false", fields):
+            for item in page:
+                yield item['name'], item
+
+
+class AsyncRemoveOperation(AsyncStorageOperation):
+    def __init__(self, credentials, filename, folder_name=None, dry_run=False, executor=None):
+        super().__init__(credentials, executor=executor)
+        self.filename = filename
+        self.folder_name = folder_name
+        self.dry_run = dry_run
+
+    async def run(self):
+        parent_id = 'root'
+        if self.folder_name:
+            parent_id = await self.resolve_folder(self.folder_name)
+            if not parent_id:
+                print(f"Folder '{self.folder_name}' not found in Google Drive.")
+                return
+        items = await self.drive.find(self.filename, parent_id)
+        if not items:
+            print(f"File with name {self.filename} not found in Google Drive.")
+            return
+        file_id = items[0]['id']
+        if self.dry_run:
+            print(f"Would remove: {self.filename} (ID: {file_id})")
+            return
+        await self.drive.delete(file_id)
+        get_folder_cache().forget(file_id)
+        print(f"Removed file with name: {self.filename} (ID: {file_id})")
+
+
+class AsyncBulkRemoveOperation(AsyncStorageOperation):
+    """Deletes every selected file with its own request, all of them in flight at once under the executor's limit."""
+
+    def __init__(self, credentials, pattern=None, folder_name=None, older_than=None, dry_run=False, executor=None):
+        super().__init__(credentials, executor=executor)
+        self.pattern = pattern
+        self.folder_name = folder_name
+        self.older_than = older_than  # Age in days
+        self.dry_run = dry_run
+
+    async def run(self):
+        folder_id = None
+        if self.folder_name:
+            folder_id = await self.resolve_folder(self.folder_name)
+            if not folder_id:
+                print(f"Folder '{self.folder_name}' not found in Google Drive.")
+                return []
+        # Collect the targets first, deleting while paging could skip results
+        targets = []
+        async for page in self.drive.list_pages(bulk_remove_query(folder_id, self.older_than, self.pattern),
+                                                'id, name'):
+            targets += [(item['id'], item['name']) for item in page
+                        if not self.pattern or fnmatch.fnmatchcase(item['name'], self.pattern)]
+        if self.dry_run:
+            for file_id, name in targets:
+                print(f"Would remove: {name} (ID: {file_id})")
+            print(f"{len(targets)} files would be removed")
+            return targets
+
+        async def remove(file_id, name):
+            try:
+                await self.drive.delete(file_id)
+            except Exception as e:
+                # A 404 means already gone, e.g. an earlier attempt's response was lost
+                if not (isinstance(e, HttpError) and e.resp.status == 404):
+                    print(f"Failed to remove {name} (ID: {file_id}): {e}")
+                    return file_id
+            get_folder_cache().forget(file_id)
+            return None
+
+        failed = [file_id for file_id in await asyncio.gather(*(remove(*target) for target in targets)) if file_id]
+        print(f"Removed {len(targets) - len(failed)} files, {len(failed)} failed")
+        return failed
@@ -1,44 +1,154 @@
+import json
 import os
-import pickle
+import sys
+import threading
+from datetime import datetime, timezone
 from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth import exceptions
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive lock on a file, held across processes and threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a+')
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class Authenticator:
     SCOPES = ['https://www.googleapis.com/auth/drive']
     CREDENTIALS_FILE = 'token.json'  # File to save user OAuth2 credentials
     CLIENT_SECRETS_FILE = 'client_secrets.json'  # File with OAuth2 client secrets
+    REFRESH_MARGIN = 300  # Seconds before expiry at which a token is refreshed
+    RETRY_INTERVAL = 30  # Seconds between background refresh attempts after a failure
+
+    # Credentials already loaded by this process, by token file path
+    _cache = {}
+    _cache_lock = threading.Lock()
 
     def __init__(self):
         self.credentials = None
+        self.stopped = threading.Event()
 
     def authenticate(self):
-        """Authenticate using OAuth2 flow, either from existing credentials or by user login."""
+        """Return valid credentials from memory, the token file, a refresh or the OAuth2 flow, in that order."""
+        path = os.path.abspath(self.CREDENTIALS_FILE)
+        with self._cache_lock:
+            credentials = self._cache.get(path)
+        if not self.is_fresh(credentials):
+            credentials = self.load_credentials()
+        if not self.is_fresh(credentials):
+            credentials = self.refresh_credentials(credentials)
+        with self._cache_lock:
+            self._cache[path] = credentials
+        self.credentials = credentials
+        print("Successful Authentication", file=sys.stderr)
+        return self.credentials
+
+    def is_fresh(self, credentials):
+        """Whether the credentials are valid and not about to expire."""
+        if not credentials or not credentials.valid:
+            return False
+        expiry = getattr(credentials, 'expiry', None)
+        return expiry is None or (expiry - _utcnow()).total_seconds() > self.REFRESH_MARGIN
+
+    def load_credentials(self):
+        """Read the stored credentials, or None if there are none usable."""
+        try:
+            with open(self.CREDENTIALS_FILE) as token:
+                return Credentials.from_authorized_user_info(json.load(token), self.SCOPES)
+        except FileNotFoundError:
+            return None
+        except (ValueError, UnicodeDecodeError):
+            # Also covers the pickled tokens written by earlier versions
+            print("OAuth token is invalid or expired. Requesting new authentication...")
+            return None
+
+    def refresh_credentials(self, credentials=None, interactive=True):
+        """Refresh the token under a file lock, so that concurrent processes refresh it only once.
+
+        Processes that wait for the lock pick up the token the first one stored. Without a
+        usable refresh token the OAuth2 flow is started, unless ``interactive`` is False.
+        """
+        with FileLock(f"{self.CREDENTIALS_FILE}.lock"):
+            stored = self.load_credentials()
+            if self.is_fresh(stored):
+                return stored
+            credentials = stored or credentials
+            if credentials and getattr(credentials, 'refresh_token', None):
+                try:
+                    credentials.refresh(Request())
+                    self.save_credentials(credentials)
+                    return credentials
+                except exceptions.RefreshError:
+                    if not interactive:
+                        raise
+                    print("OAuth token is invalid or expired. Requesting new authentication...")
+            if not interactive:
+                raise exceptions.RefreshError("No refresh token available.")
+            credentials = self.perform_oauth_flow()
+            self.save_credentials(credentials)
+            return credentials
 
-        # Check if we already have valid credentials
-        if os.path.exists(self.CREDENTIALS_FILE):
+    def start_background_refresh(self, credentials=None):
+        """Keep the credentials refreshed ahead of their expiry from a daemon thread.
+
+        The credentials object is updated in place, so services and HTTP clients built from it
+        never have to refresh inline.
+        """
+        thread = threading.Thread(target=self._refresh_loop, args=(credentials or self.credentials,),
+                                  name='googd-token-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stopped.set()
+
+    def _refresh_loop(self, credentials):
+        while not self.stopped.is_set() and credentials.expiry is not None:
+            wait = (credentials.expiry - _utcnow()).total_seconds() - self.REFRESH_MARGIN
+            if wait > 0 and self.stopped.wait(wait):
+                return
             try:
-                with open(self.CREDENTIALS_FILE, 'rb') as token:
-                    self.credentials = pickle.load(token)
-
-                # If credentials are expired, refresh them
-                if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                    self.credentials.refresh(Request())
-                    self.save_credentials()
-                elif not self.credentials or not self.credentials.valid:
-                    raise exceptions.DefaultCredentialsError('Invalid credentials.')
-
-            except (pickle.PickleError, exceptions.DefaultCredentialsError) as e:
-                print("OAuth token is invalid or expired. Requesting new authentication...")
-                self.credentials = None
-
-        # If no valid credentials, or invalid/expired credentials, start new OAuth2 flow
-        if not self.credentials:
-            self.credentials = self.perform_oauth_flow()
-            self.save_credentials()
-        print("Successful Authentication")
-        return self.credentials
+                fresh = self.refresh_credentials(credentials, interactive=False)
+            except Exception as e:
+                print(f"Background token refresh failed: {e}", file=sys.stderr)
+                self.stopped.wait(self.RETRY_INTERVAL)
+                continue
+            credentials.token, credentials.expiry = fresh.token, fresh.expiry
+            if not self.is_fresh(credentials):
+                # A token that outlives the margin by less than that would spin this loop
+                self.stopped.wait(self.RETRY_INTERVAL)
 
     def perform_oauth_flow(self):
         """Perform OAuth2 flow and get credentials."""
@@ -48,7 +158,11 @@ class Authenticator:
         creds = flow.run_local_server(port=0)  # Start the local server for OAuth2 callback
         return creds
 
-    def save_credentials(self):
-        """Save the OAuth2 credentials to a file for later use."""
-        with open(self.CREDENTIALS_FILE, 'wb') as token:
-            pickle.dump(self.credentials, token)
+    def save_credentials(self, credentials=None):
+        """Atomically save the OAuth2 credentials as JSON, readable only by the user."""
+        credentials = credentials or self.credentials
+        tmp_path = f"{self.CREDENTIALS_FILE}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as token:
+            token.write(credentials.to_json())
+        os.replace(tmp_path, self.CREDENTIALS_FILE)
@@ -1,14 +1,131 @@
 import argparse
+import re
+import time
+from datetime import datetime
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_time(value):
+    """A POSIX timestamp from an ISO date or time (local unless it has an offset) or an age such as 12h or 7d."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdw])', value.strip())
+    if match:
+        return time.time() - float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time {value!r}, use a date such as 2026-10-01 or an age such as 7d")
+
+
+def parse_size(value):
+    """A byte count from a size such as 500, 64K, 100MB or 1.5G (binary units)."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?', value.strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r}, use a size such as 100M")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+
+def positive_int(value):
+    """A whole number of at least 1, for counts such as --jobs and --page-size."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid count {value!r}, use a whole number of at least 1")
+    return number
 
 class CLI:
     def __init__(self):
         self.parser = argparse.ArgumentParser(description="Google Drive CLI Tool")
         self.parser.add_argument('--list', action='store_true', help="List files in Google Drive")
-        self.parser.add_argument('--upload', help="Upload a file to Google Drive")
+        self.parser.add_argument('--upload', nargs='+', metavar='PATH',
+                                 help="Upload files, globs or directories to Google Drive, or - to stream stdin")
         self.parser.add_argument('--delete', help="Delete a file from Google Drive", action='store_true')
         self.parser.add_argument('--download', help="Download a file from Google Drive", action='store_true')
-        self.parser.add_argument('--folder', help="Google Drive folder name to upload file to", default=None)
-        self.parser.add_argument('--file', help="File name to download", default=None)
+        self.parser.add_argument('--folder', help="Google Drive folder path, such as backups/2026/10, to upload to, download or delete from", default=None)
+        self.parser.add_argument('--file', help="File name to download, or the name of an upload from stdin", default=None)
+        self.parser.add_argument('--output', metavar='PATH',
+                                 help="Directory to download into, or - to stream the file to stdout (default: current directory)")
+        self.parser.add_argument('--chunk-size', type=positive_int, default=16, metavar='MB',
+                                 help="Size of each resumable upload request in MiB (default: 16)")
+        self.parser.add_argument('--dedup', action='store_true',
+                                 help="Skip uploading files whose identical copy (same name, size and MD5) is already in the folder")
+        self.parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                                 help="Compress uploads on the fly; downloads of such files are decompressed and verified")
+        self.parser.add_argument('--ranged', action='store_true',
+                                 help="Download in parallel HTTP Range segments, resuming interrupted downloads")
+        self.parser.add_argument('--recursive', action='store_true', help="List or download subfolders recursively")
+        self.parser.add_argument('--format', choices=['text', 'jsonl'], default='text',
+                                 help="Output format for --list (default: text)")
+        self.parser.add_argument('--page-size', type=positive_int, default=1000, metavar='N',
+                                 help="Number of files fetched per list request (default: 1000)")
+        self.parser.add_argument('--mime-type', metavar='TYPE',
+                                 help="List only files of this MIME type, such as application/pdf or image/*")
+        self.parser.add_argument('--name-prefix', metavar='TEXT', help="List only files whose name starts with TEXT")
+        self.parser.add_argument('--name-contains', metavar='TEXT', help="List only files whose name contains TEXT")
+        self.parser.add_argument('--modified-after', type=parse_time, metavar='TIME',
+                                 help="List only files modified after TIME, a date such as 2026-10-01 or an age such as 1d")
+        self.parser.add_argument('--modified-before', type=parse_time, metavar='TIME',
+                                 help="List only files modified before TIME")
+        self.parser.add_argument('--trashed', choices=['true', 'false'],
+                                 help="List only trashed (true) or untrashed (false) files")
+        self.parser.add_argument('--owner', metavar='EMAIL', help="List only files owned by EMAIL, or me")
+        self.parser.add_argument('--min-size', type=parse_size, metavar='SIZE',
+                                 help="List only files of at least SIZE, such as 100M")
+        self.parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                                 help="List only files of at most SIZE")
+        self.parser.add_argument('--fields', metavar='FIELDS',
+                                 help="Comma-separated file fields to fetch and print, such as id,name,size")
+        self.parser.add_argument('--pattern', metavar='GLOB', help="Delete every file whose name matches the pattern")
+        self.parser.add_argument('--older-than', type=float, metavar='DAYS',
+                                 help="Delete files not modified for this many days")
+        self.parser.add_argument('--ids-from-stdin', action='store_true',
+                                 help="Delete the file IDs read from stdin, one per line")
+        self.parser.add_argument('--dry-run', action='store_true', help="Print what would be deleted without deleting")
+        self.parser.add_argument('--sync', nargs=2, metavar=('LOCAL', 'REMOTE_FOLDER'),
+                                 help="Transfer only new or changed files between a local directory and a Drive folder")
+        self.parser.add_argument('--direction', choices=['up', 'down'], default='up',
+                                 help="Sync direction: up (local to Drive, default) or down (Drive to local)")
+        self.parser.add_argument('--copy', nargs=2, metavar=('SOURCE', 'FOLDER'),
+                                 help="Copy a Drive file, glob or folder tree into a Drive folder, server-side")
+        self.parser.add_argument('--move', nargs=2, metavar=('SOURCE', 'FOLDER'),
+                                 help="Move a Drive file, glob or folder into a Drive folder, server-side")
+        self.parser.add_argument('--jobs-file', metavar='FILE',
+                                 help="Run the upload, download, delete and list jobs of a JSONL manifest")
+        self.parser.add_argument('--checkpoint', metavar='FILE',
+                                 help="Log of finished --jobs-file jobs, skipped when rerun (default: FILE.checkpoint)")
+        self.parser.add_argument('--watch', action='store_true',
+                                 help="Follow Drive changes, mirroring --folder (default: the whole drive) into --output, "
+                                      "or printing them")
+        self.parser.add_argument('--poll-interval', type=float, default=5.0, metavar='SECONDS',
+                                 help="Shortest wait between two polls of the changes feed, doubled while idle (default: 5)")
+        self.parser.add_argument('--watch-state', metavar='FILE',
+                                 help="File keeping the --watch cursor across restarts (default: watch_state.db)")
+        self.parser.add_argument('--refresh-index', action='store_true',
+                                 help="Rebuild the local metadata index used to resolve file names")
+        self.parser.add_argument('--index-ttl', type=int, default=300, metavar='SECONDS',
+                                 help="Age after which the metadata index catches up with Drive changes (default: 300)")
+        self.parser.add_argument('--no-index', action='store_true', help="Do not use the local metadata index")
+        self.parser.add_argument('--serve', action='store_true',
+                                 help="Run as a daemon that executes commands forwarded over a local socket")
+        self.parser.add_argument('--no-daemon', action='store_true',
+                                 help="Run the command in this process even if a daemon is running")
+        self.parser.add_argument('--max-rps', type=float, default=100, metavar='N',
+                                 help="Most API requests per second, shared by all parallel workers (default: 100)")
+        self.parser.add_argument('--max-bandwidth', type=float, metavar='MB',
+                                 help="Most MiB per second transferred, shared by all parallel workers (default: no limit)")
+        self.parser.add_argument('--stats', action='store_true',
+                                 help="Print time, bytes and retries per API endpoint and phase when the command ends")
+        self.parser.add_argument('--trace', metavar='FILE',
+                                 help="Write every API request and phase to FILE as Chrome trace events")
+        self.parser.add_argument('--jobs', type=positive_int, default=4, metavar='N',
+                                 help="Number of parallel transfers (default: 4)")
+        self.parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                                 help="Run --list, --upload, --download and --delete on worker threads (default) "
+                                      "or as asyncio tasks on one event loop")
 
     def parse_arguments(self):
         return self.parser.parse_args()
@@ -0,0 +1,137 @@
+import hashlib
+import importlib.util
+import zlib
+
+# Codecs of --compress and the MIME type their Drive files get
+CODECS = {'gzip': 'application/gzip', 'zstd': 'application/zstd'}
+# appProperties keys recording how a file was compressed and what it was before
+CODEC_PROPERTY = 'googdCodec'
+SIZE_PROPERTY = 'googdSize'
+MD5_PROPERTY = 'googdMd5'
+READ_SIZE = 1024 * 1024
+
+
+def available(codec):
+    """Whether the codec can be used here; zstd needs the optional zstandard package."""
+    return codec == 'gzip' or (codec == 'zstd' and importlib.util.find_spec('zstandard') is not None)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression needs the zstandard package: pip install zstandard") from None
+    return zstandard
+
+
+def compressor(codec):
+    """A streaming compressor with compress(data) and flush()."""
+    if codec == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if codec == 'zstd':
+        return _zstandard().ZstdCompressor().compressobj()
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def decompressor(codec):
+    """A streaming decompressor with decompress(data) and flush()."""
+    if codec == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if codec == 'zstd':
+        return _zstandard().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def app_properties(codec, size=None, md5=None):
+    properties = {CODEC_PROPERTY: codec}
+    if size is not None:
+        properties[SIZE_PROPERTY] = str(size)
+    if md5 is not None:
+        properties[MD5_PROPERTY] = md5
+    return properties
+
+
+def compression_of(item):
+    """Return (codec, original size, original MD5) of a Drive file uploaded with --compress, or None.
+
+    The size and MD5 are None if the upload stopped before recording them.
+    """
+    properties = item.get('appProperties') or {}
+    codec = properties.get(CODEC_PROPERTY)
+    if codec not in CODECS:
+        return None
+    size = properties.get(SIZE_PROPERTY)
+    return codec, int(size) if size is not None else None, properties.get(MD5_PROPERTY)
+
+
+class CompressingReader:
+    """Readable stream of a source stream's content compressed on the fly.
+
+    Only one block of the source and its compressed output are held at a time. The
+    size and MD5 of the original content are known once the stream has been read to
+    its end.
+    """
+
+    def __init__(self, source, codec):
+        self.source = source
+        self.compressor = compressor(codec)
+        self.digest = hashlib.md5()
+        self.size = 0  # Original bytes read so far
+        self.compressed = 0  # Compressed bytes handed out so far
+        self.buffer = bytearray()
+        self.done = False
+
+    def read(self, n=-1):
+        while not self.done and (n < 0 or len(self.buffer) < n):
+            block = self.source.read(READ_SIZE)
+            if block:
+                self.digest.update(block)
+                self.size += len(block)
+                self.buffer += self.compressor.compress(block)
+            else:
+                self.buffer += self.compressor.flush()
+                self.done = True
+        n = len(self.buffer) if n < 0 else n
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        self.compressed += len(data)
+        return data
+
+    def md5(self):
+        return self.digest.hexdigest()
+
+
+class DecompressingWriter:
+    """Writable stream that decompresses what is written into ``output``.
+
+    finish() checks the decompressed content against the original size and MD5 recorded
+    at upload, raising IOError on a mismatch.
+    """
+
+    def __init__(self, output, codec, size=None, md5=None):
+        self.output = output
+        self.decompressor = decompressor(codec)
+        self.expected_size = size
+        self.expected_md5 = md5
+        self.digest = hashlib.md5()
+        self.size = 0
+
+    def _emit(self, data):
+        if data:
+            self.digest.update(data)
+            self.size += len(data)
+            self.output.write(data)
+
+    def write(self, data):
+        self._emit(self.decompressor.decompress(data))
+        return len(data)
+
+    def flush(self):
+        self.output.flush()
+
+    def finish(self):
+        self._emit(self.decompressor.flush())
+        if self.expected_size is not None and self.size != self.expected_size:
+            raise IOError(f"Decompressed {self.size} bytes, expected {self.expected_size}")
+        if self.expected_md5 is not None and self.digest.hexdigest() != self.expected_md5:
+            raise IOError("MD5 checksum mismatch after decompression")
@@ -0,0 +1,209 @@
+import contextvars
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Unix socket the daemon listens on, one per user, inside a directory only that user can enter
+SOCKET_PATH = os.environ.get('GOOGD_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+    f"googd-{os.getuid() if hasattr(os, 'getuid') else 'user'}", 'googd.sock')
+
+# Stream the current request writes its output to, None outside of a request
+_output = contextvars.ContextVar('googd_output', default=None)
+
+
+class _RoutedStream:
+    """Stand-in for sys.stdout/sys.stderr that sends writes made while serving a request to its client."""
+
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+
+    def write(self, data):
+        client = _output.get()
+        if client is None:
+            return self.default.write(data)
+        client.send(self.name, data)
+        return len(data)
+
+    def flush(self):
+        if _output.get() is None:
+            self.default.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+class _ClientConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+
+    def send(self, stream, data):
+        message = (json.dumps({stream: data}) + '\n').encode()
+        with self.lock:
+            try:
+                self.sock.sendall(message)
+            except OSError:
+                pass  # The client went away, keep running the command
+
+
+def is_supported():
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid')
+
+
+def _untrusted(path):
+    """Why the socket at ``path`` may be another user's, or None if it is ours and only we can replace it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    st = os.lstat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022 or not stat.S_ISDIR(st.st_mode):
+        return f"{directory} is not a directory only this user can write to"
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or not stat.S_ISSOCK(st.st_mode):
+        return f"{path} is not a socket owned by this user"
+    return None
+
+
+def _private_directory(path):
+    """Create the socket's directory closed to other users, refusing one that another user controls."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be a directory owned by this user and closed to others (chmod 700)")
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def forward(argv, socket_path=None, stdout=None, stderr=None):
+    """Run a command in the daemon and relay its output.
+
+    Returns the command's exit status, or None when no daemon is running.
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    if not is_supported():
+        return None
+    socket_path = socket_path or SOCKET_PATH
+    try:
+        problem = _untrusted(socket_path)
+    except OSError:
+        return None  # No daemon has been started
+    if problem:
+        # Another user could read the command and fake its output, so run it here instead
+        print(f"Warning: not using the googD daemon: {problem}", file=stderr)
+        return None
+    try:
+        sock = _connect(socket_path)
+    except OSError:
+        return None
+    with sock, sock.makefile('rb') as replies:
+        sock.sendall((json.dumps({'argv': list(argv), 'cwd': os.getcwd()}) + '\n').encode())
+        for line in replies:
+            message = json.loads(line)
+            if 'stdout' in message:
+                stdout.write(message['stdout'])
+            elif 'stderr' in message:
+                stderr.write(message['stderr'])
+            elif 'exit' in message:
+                stdout.flush()
+                return message['exit']
+    print("Lost connection to the googD daemon.", file=stderr)
+    return 1
+
+
+class Daemon:
+    """Serves commands over a local Unix socket with a fixed set of worker threads.
+
+    ``handler(argv, cwd)`` runs one command; whatever it prints is sent back to the client.
+    Worker threads are reused, so their HTTP connections stay open between commands.
+    """
+
+    def __init__(self, handler, socket_path=None, workers=8):
+        self.handler = handler
+        self.socket_path = socket_path or SOCKET_PATH
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.sock = None
+        self.stopped = threading.Event()
+        self.streams = None
+
+    def start(self):
+        _private_directory(os.path.dirname(os.path.abspath(self.socket_path)))
+        if os.path.lexists(self.socket_path):
+            if os.lstat(self.socket_path).st_uid != os.getuid():
+                raise RuntimeError(f"{self.socket_path} belongs to another user, refusing to replace it")
+            try:
+                _connect(self.socket_path).close()
+                raise RuntimeError(f"A googD daemon is already listening on {self.socket_path}")
+            except OSError:
+                os.remove(self.socket_path)  # Stale socket left by a daemon that died
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.sock.listen(64)
+        if not isinstance(sys.stdout, _RoutedStream):
+            self.streams = sys.stdout, sys.stderr
+            sys.stdout = _RoutedStream('stdout', sys.stdout)
+            sys.stderr = _RoutedStream('stderr', sys.stderr)
+
+    def serve_forever(self):
+        print(f"googD daemon listening on {self.socket_path}", file=sys.stderr)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn, _ = self.sock.accept()
+                except OSError:
+                    break
+                self.pool.submit(self._serve_connection, conn)
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopped.set()
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def close(self):
+        self.stop()
+        self.pool.shutdown(wait=True)
+        if self.streams:
+            sys.stdout, sys.stderr = self.streams
+            self.streams = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _serve_connection(self, conn):
+        with conn, conn.makefile('rb') as requests:
+            client = _ClientConnection(conn)
+            line = requests.readline()
+            if not line:
+                return
+            request = json.loads(line)
+            token = _output.set(client)
+            try:
+                self.handler(request['argv'], request.get('cwd'))
+                status = 0
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                status = 1
+            finally:
+                _output.reset(token)
+            client.send('exit', status)
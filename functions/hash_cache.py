@@ -0,0 +1,67 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+def md5_of_file(path, block_size=1024 * 1024):
+    """Compute the hex MD5 digest of a local file without loading it into memory."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """On-disk cache of local file MD5 digests keyed on (inode, size, mtime).
+
+    A file whose inode, size and modification time are unchanged is never read again.
+    """
+    CACHE_FILE = 'hash_cache.db'  # File holding the cached digests
+    COMMIT_EVERY = 1000  # Writes between commits, so large trees do not pay one fsync per file
+
+    def __init__(self, path=None):
+        self.path = path or self.CACHE_FILE
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    md5 TEXT NOT NULL
+                )
+            ''')
+
+    def md5(self, path, stat=None):
+        """Return the MD5 digest of the file, reading it only if it changed since it was last hashed."""
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            row = self.db.execute('SELECT inode, size, mtime_ns, md5 FROM hashes WHERE path = ?', (path,)).fetchone()
+        if row and tuple(row[:3]) == key:
+            return row[3]
+
+        digest = md5_of_file(path)
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO hashes (path, inode, size, mtime_ns, md5) VALUES (?, ?, ?, ?, ?)',
+                            (path, *key, digest))
+            self.pending += 1
+            if self.pending >= self.COMMIT_EVERY:
+                self.db.commit()
+                self.pending = 0
+        return digest
+
+    def flush(self):
+        with self.lock:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.db.close()
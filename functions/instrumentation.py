@@ -0,0 +1,191 @@
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+# Path segments that vary between calls of the same endpoint
+_ID_PATTERNS = [
+    (re.compile(r'^/upload/session/.*'), '/upload/session/:id'),
+    (re.compile(r'^(/(?:upload/)?drive/v3/files)/[^/]+'), r'\1/:id'),
+]
+
+
+def endpoint_name(method, uri):
+    """Group a request by method and endpoint, e.g. 'GET /drive/v3/files/:id'."""
+    path = urllib.parse.urlsplit(uri).path
+    for pattern, replacement in _ID_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return f"{method} {path}"
+
+
+class _Totals:
+    __slots__ = ('count', 'errors', 'seconds', 'max_seconds', 'sent', 'received')
+
+    def __init__(self):
+        self.count = self.errors = self.sent = self.received = 0
+        self.seconds = self.max_seconds = 0.0
+
+    def add(self, seconds, sent=0, received=0, error=False):
+        self.count += 1
+        self.errors += error
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.sent += sent
+        self.received += received
+
+
+class Recorder:
+    """Collects timings of API requests and phases of a run.
+
+    Totals are kept per endpoint and per phase, so recording costs a dictionary update.
+    With ``trace_path``, every event is also written as a Chrome trace event
+    (chrome://tracing, Perfetto) on its own line.
+    """
+
+    def __init__(self, trace_path=None):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.requests = {}
+        self.phases = {}
+        self.statuses = {}
+        self.retries = {}
+        self.trace = None
+        if trace_path:
+            self.trace = open(trace_path, 'w')
+            self.trace.write('[\n')
+
+    def _event(self, name, category, start, seconds, args):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                 'ts': round((start - self.start) * 1e6), 'dur': round(seconds * 1e6), 'args': args}
+        self.trace.write(json.dumps(event) + ',\n')
+
+    def record_request(self, method, uri, start, seconds, status=None, sent=0, received=0):
+        name = endpoint_name(method, uri)
+        error = status is None or status >= 400
+        with self.lock:
+            self.requests.setdefault(name, _Totals()).add(seconds, sent, received, error)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if self.trace:
+                self._event(name, 'http', start, seconds, {'status': status, 'sent': sent, 'received': received})
+
+    def record_phase(self, name, start, seconds):
+        with self.lock:
+            self.phases.setdefault(name, _Totals()).add(seconds)
+            if self.trace:
+                self._event(name, 'phase', start, seconds, {})
+
+    def record_retry(self, reason):
+        with self.lock:
+            self.retries[reason] = self.retries.get(reason, 0) + 1
+            if self.trace:
+                self._event(f"retry: {reason}", 'retry', time.perf_counter(), 0, {})
+
+    def close(self):
+        with self.lock:
+            if self.trace:
+                # Close the array so strict JSON parsers accept the file too
+                self.trace.write(json.dumps({'name': 'end', 'ph': 'i', 'pid': os.getpid(), 's': 'p',
+                                             'ts': round((time.perf_counter() - self.start) * 1e6)}) + '\n]\n')
+                self.trace.close()
+                self.trace = None
+
+    def summary(self):
+        """Return the totals as plain data, for --stats and tests."""
+        with self.lock:
+            def rows(totals):
+                return {name: {'count': t.count, 'errors': t.errors, 'seconds': round(t.seconds, 4),
+                               'avg_ms': round(t.seconds * 1000 / t.count, 2), 'max_ms': round(t.max_seconds * 1000, 2),
+                               'sent': t.sent, 'received': t.received}
+                        for name, t in sorted(totals.items())}
+            return {'wall_seconds': round(time.perf_counter() - self.start, 4), 'phases': rows(self.phases),
+                    'requests': rows(self.requests), 'statuses': {str(k): v for k, v in self.statuses.items()},
+                    'retries': dict(self.retries)}
+
+    def print_stats(self, file=None):
+        file = file or sys.stderr
+        summary = self.summary()
+        print(f"\nStats: {summary['wall_seconds']:.3f}s wall time", file=file)
+        for title, rows in (('Phase', summary['phases']), ('Request', summary['requests'])):
+            if not rows:
+                continue
+            print(f"{title:<40} {'count':>6} {'errors':>6} {'total s':>9} {'avg ms':>9} {'max ms':>9} "
+                  f"{'sent':>10} {'received':>10}", file=file)
+            for name, row in rows.items():
+                print(f"{name:<40} {row['count']:>6} {row['errors']:>6} {row['seconds']:>9.3f} {row['avg_ms']:>9.2f} "
+                      f"{row['max_ms']:>9.2f} {row['sent']:>10} {row['received']:>10}", file=file)
+        if summary['retries']:
+            print("Retries: " + ", ".join(f"{reason} x{count}" for reason, count in summary['retries'].items()),
+                  file=file)
+
+
+_recorder = None
+
+
+def get_recorder():
+    return _recorder
+
+
+def enable(trace_path=None):
+    """Start recording for the rest of the process."""
+    global _recorder
+    _recorder = Recorder(trace_path)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder:
+        recorder.close()
+    return recorder
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a block of work as a named phase; free when recording is off."""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record_phase(name, start, time.perf_counter() - start)
+
+
+def _body_size(body, headers):
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    try:
+        return int((headers or {}).get('Content-Length') or (headers or {}).get('content-length') or 0)
+    except ValueError:
+        return 0
+
+
+class InstrumentedHttp:
+    """Wraps an httplib2-style client and records every request it makes."""
+
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        recorder = _recorder
+        if recorder is None:
+            return self.http.request(uri, method, body, headers, *args, **kwargs)
+        start = time.perf_counter()
+        status, received = None, 0
+        try:
+            response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+            status, received = response.status, len(content or b'')
+            return response, content
+        finally:
+            recorder.record_request(method, uri, start, time.perf_counter() - start, status,
+                                    _body_size(body, headers), received)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
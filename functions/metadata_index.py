@@ -0,0 +1,209 @@
+import sqlite3
+import sys
+import threading
+import time
+
+from functions.rate_limit import get_executor
+
+INDEX_FIELDS = 'id, name, parents, mimeType, size, md5Checksum, modifiedTime, trashed'
+
+
+def _execute(request, http=None):
+    return get_executor().call(lambda: request.execute(http=http))
+
+
+class MetadataIndex:
+    """Local SQLite copy of the Drive file metadata, used to resolve names without API calls.
+
+    The index is built once with refresh() and then kept current incrementally from the
+    Drive changes feed. Lookups apply pending changes first when the index is older than
+    the TTL, and return None when the index has never been built so callers fall back to
+    querying the API.
+    """
+    INDEX_FILE = 'metadata_index.db'  # File holding the local metadata index
+    DEFAULT_TTL = 300  # Seconds before lookups catch up with the changes feed
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = path or self.INDEX_FILE
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    mime_type TEXT,
+                    size INTEGER,
+                    md5 TEXT,
+                    modified_time TEXT
+                );
+                CREATE TABLE IF NOT EXISTS parents (
+                    file_id TEXT NOT NULL,
+                    parent_id TEXT NOT NULL,
+                    PRIMARY KEY (file_id, parent_id)
+                );
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE INDEX IF NOT EXISTS files_name ON files (name);
+                CREATE INDEX IF NOT EXISTS parents_parent ON parents (parent_id);
+            ''')
+
+    def close(self):
+        self.db.close()
+
+    # -- state ----------------------------------------------------------
+    def _get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def is_built(self):
+        with self.lock:
+            return self._get_meta('start_page_token') is not None
+
+    def is_stale(self):
+        with self.lock:
+            synced_at = self._get_meta('synced_at')
+        return synced_at is None or time.time() - float(synced_at) > self.ttl
+
+    # -- maintenance ----------------------------------------------------
+    def refresh(self, service, http=None):
+        """Rebuild the index from a full listing of the drive."""
+        # Take the cursor first so changes made during the listing are replayed later
+        token = _execute(service.changes().getStartPageToken(), http)['startPageToken']
+        root_id = _execute(service.files().get(fileId='root', fields='id'), http)['id']
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM files')
+            self.db.execute('DELETE FROM parents')
+        count = 0
+        page_token = None
+        while True:
+            results = _execute(service.files().list(
+                q='trashed = false', fields=f'nextPageToken, files({INDEX_FIELDS})',
+                pageSize=1000, pageToken=page_token
+            ), http)
+            files = results.get('files', [])
+            with self.lock, self.db:
+                for item in files:
+                    self._upsert(item)
+            count += len(files)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        with self.lock, self.db:
+            self._set_meta('root_id', root_id)
+            self._set_meta('start_page_token', token)
+            self._set_meta('synced_at', time.time())
+        return count
+
+    def start(self, service, http=None):
+        """Begin following the changes feed without listing the drive.
+
+        The index then starts empty and only caches the files this process looks up or
+        creates, which is what a long-running daemon wants.
+        """
+        if self.is_built():
+            return
+        token = _execute(service.changes().getStartPageToken(), http)['startPageToken']
+        root_id = _execute(service.files().get(fileId='root', fields='id'), http)['id']
+        with self.lock, self.db:
+            self._set_meta('root_id', root_id)
+            self._set_meta('start_page_token', token)
+            self._set_meta('synced_at', time.time())
+
+    def update(self, service, http=None):
+        """Apply the changes recorded since the last sync, returning the number applied."""
+        with self.lock:
+            page_token = self._get_meta('start_page_token')
+        if page_token is None:
+            return 0
+        count = 0
+        while page_token:
+            results = _execute(service.changes().list(
+                pageToken=page_token, pageSize=1000,
+                fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({INDEX_FIELDS}))'
+            ), http)
+            with self.lock, self.db:
+                for change in results.get('changes', []):
+                    item = change.get('file')
+                    if change.get('removed') or not item or item.get('trashed'):
+                        self._delete(change['fileId'])
+                    else:
+                        self._upsert(item)
+                if 'newStartPageToken' in results:
+                    self._set_meta('start_page_token', results['newStartPageToken'])
+                    self._set_meta('synced_at', time.time())
+                else:
+                    self._set_meta('start_page_token', results['nextPageToken'])
+            count += len(results.get('changes', []))
+            page_token = results.get('nextPageToken')
+        return count
+
+    def ensure_fresh(self, service, http=None):
+        """Catch up with the changes feed if the index is older than the TTL."""
+        if not self.is_built() or not self.is_stale():
+            return
+        with self.update_lock:
+            # Another thread may have caught up while we waited
+            if not self.is_stale():
+                return
+            try:
+                self.update(service, http)
+            except Exception as e:
+                print(f"Could not update the metadata index: {e}", file=sys.stderr)
+
+    # -- reads and writes -----------------------------------------------
+    def lookup(self, name, parent_id=None, mime_type=None):
+        """Return the indexed files with this name, or None if the index has not been built."""
+        with self.lock:
+            if self._get_meta('start_page_token') is None:
+                return None
+            query = 'SELECT id, name, mime_type, size, md5, modified_time FROM files WHERE name = ?'
+            params = [name]
+            if parent_id is not None:
+                if parent_id == 'root':
+                    parent_id = self._get_meta('root_id')
+                query += ' AND id IN (SELECT file_id FROM parents WHERE parent_id = ?)'
+                params.append(parent_id)
+            if mime_type is not None:
+                query += ' AND mime_type = ?'
+                params.append(mime_type)
+            rows = self.db.execute(query, params).fetchall()
+        files = []
+        for file_id, name, mime_type, size, md5, modified_time in rows:
+            item = {'id': file_id, 'name': name, 'mimeType': mime_type, 'modifiedTime': modified_time}
+            if size is not None:
+                item['size'] = str(size)
+            if md5 is not None:
+                item['md5Checksum'] = md5
+            files.append(item)
+        return files
+
+    def add(self, item):
+        """Record a file created or updated by this process."""
+        with self.lock, self.db:
+            if item.get('parents') == ['root']:
+                item = dict(item, parents=[self._get_meta('root_id') or 'root'])
+            self._upsert(item)
+
+    def remove(self, file_id):
+        """Forget a file deleted by this process."""
+        with self.lock, self.db:
+            self._delete(file_id)
+
+    def _upsert(self, item):
+        size = item.get('size')
+        self.db.execute(
+            'INSERT OR REPLACE INTO files (id, name, mime_type, size, md5, modified_time) VALUES (?, ?, ?, ?, ?, ?)',
+            (item['id'], item['name'], item.get('mimeType'), int(size) if size is not None else None,
+             item.get('md5Checksum'), item.get('modifiedTime')))
+        self.db.execute('DELETE FROM parents WHERE file_id = ?', (item['id'],))
+        self.db.executemany('INSERT INTO parents (file_id, parent_id) VALUES (?, ?)',
+                            [(item['id'], parent) for parent in item.get('parents', [])])
+
+    def _delete(self, file_id):
+        self.db.execute('DELETE FROM files WHERE id = ?', (file_id,))
+        self.db.execute('DELETE FROM parents WHERE file_id = ?', (file_id,))
@@ -0,0 +1,204 @@
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from functions.instrumentation import get_recorder
+
+DEFAULT_RATE = 100  # Requests per second across all threads
+DEFAULT_CONCURRENCY = 32  # Most API requests in flight at once before any throttling
+MAX_RETRIES = 6
+BASE_DELAY = 1.0  # Seconds before the first retry, doubled on every attempt
+MAX_DELAY = 64.0
+
+# 403 reasons that mean "slow down" rather than "forbidden"
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    A caller takes its tokens immediately and sleeps off any deficit, so a request larger
+    than the bucket (a big chunk against a bandwidth limit) is still admitted and only
+    delays the callers after it.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens and return the seconds the caller must wait before using them."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self, amount=1, sleep=time.sleep):
+        wait = self.reserve(amount)
+        if wait:
+            sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """Limit on requests in flight that halves when the API throttles and creeps back up on success."""
+    COOLDOWN = 1.0  # Seconds during which further throttling does not halve the limit again
+
+    def __init__(self, limit):
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.active = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def on_success(self):
+        with self.condition:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.condition.notify()
+
+    def on_throttle(self):
+        with self.condition:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.COOLDOWN:
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = now
+
+
+def _reason(error):
+    try:
+        return json.loads(error.content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def is_throttled(error):
+    status = error.resp.status
+    return status == 429 or (status == 403 and _reason(error) in RATE_LIMIT_REASONS)
+
+
+def is_retryable(error):
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRY_STATUSES or is_throttled(error)
+    return isinstance(error, (ConnectionError, TimeoutError, socket.timeout))
+
+
+def is_rejected(error):
+    """Whether the server refused a request without applying it, so even a create or copy can be sent again."""
+    return isinstance(error, HttpError) and is_throttled(error)
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it said so."""
+    if not isinstance(error, HttpError):
+        return None
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestExecutor:
+    """Runs every API request of the process through shared rate, bandwidth and concurrency limits.
+
+    Throttling (429, 403 rate limit) and transient errors (5xx, dropped connections) are
+    retried with jittered exponential backoff, waiting at least as long as any Retry-After
+    header asks.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, bandwidth=None, concurrency=DEFAULT_CONCURRENCY,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY, sleep=time.sleep):
+        self.requests = TokenBucket(rate) if rate else None
+        # Bytes per second, with one second worth of burst
+        self.bytes = TokenBucket(bandwidth) if bandwidth else None
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def consume(self, nbytes):
+        """Charge transferred bytes against the bandwidth limit."""
+        if self.bytes and nbytes:
+            self.bytes.acquire(nbytes, self.sleep)
+
+    def call(self, function, nbytes=0, cost=1, retryable=is_retryable):
+        """Call ``function()``, which performs one API request of ``cost`` calls sending ``nbytes``.
+
+        Errors for which ``retryable(error)`` is true are retried.
+        """
+        attempt = 0
+        while True:
+            if self.requests:
+                self.requests.acquire(cost, self.sleep)
+            self.consume(nbytes)
+            try:
+                with self.concurrency:
+                    result = function()
+            except Exception as e:
+                if not retryable(e) or attempt >= self.max_retries:
+                    raise
+                if isinstance(e, HttpError) and is_throttled(e):
+                    self.concurrency.on_throttle()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, retry_after(e) or 0)
+                attempt += 1
+                recorder = get_recorder()
+                if recorder:
+                    recorder.record_retry(describe(e))
+                print(f"Request failed ({describe(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s",
+                      file=sys.stderr)
+                self.sleep(delay)
+                continue
+            self.concurrency.on_success()
+            return result
+
+
+def describe(error):
+    if isinstance(error, HttpError):
+        reason = _reason(error)
+        return f"HTTP {error.resp.status}" + (f" {reason}" if reason else '')
+    return type(error).__name__
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide request executor, shared by every worker thread."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = RequestExecutor()
+        return _executor
+
+
+def configure(rate=DEFAULT_RATE, bandwidth=None, concurrency=DEFAULT_CONCURRENCY):
+    """Replace the process-wide executor with one using these limits."""
+    global _executor
+    with _executor_lock:
+        _executor = RequestExecutor(rate, bandwidth, concurrency)
+        return _executor
@@ -1,45 +1,661 @@
+import contextlib
+import contextvars
+import fnmatch
+import functools
+import glob
+import json
 import os
+import posixpath
+import queue
+import shutil
+import sys
+import threading
+import time
+import zlib
 from abc import ABC, abstractmethod
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from array import array
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import google_auth_httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaUpload, build_http
+
+from functions.compression import CODECS, CompressingReader, DecompressingWriter, app_properties, compression_of
+from functions.hash_cache import md5_of_file
+from functions.instrumentation import InstrumentedHttp, phase
+from functions.rate_limit import get_executor, is_rejected, is_retryable
+from functions.watch_state import WatchState
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Number of files requested per files().list call (the Drive API maximum)
+PAGE_SIZE = 1000
+LIST_FIELDS = 'id, name, mimeType, modifiedTime'
+FILE_FIELDS = 'id, name, parents, mimeType, size, md5Checksum, modifiedTime, appProperties'
+
+# Bytes sent per resumable upload request, a multiple of 256 KiB as the API requires
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# Bytes fetched per request when streaming a download to stdout
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+# Minimum seconds between two progress lines for the same transfer
+PROGRESS_INTERVAL = 2.0
+
+# Maximum number of calls the Drive API accepts in one batch request
+BATCH_SIZE = 100
+
+# Alternative root URL for the Drive API, e.g. a local fake server used by the tests
+API_ENDPOINT = os.environ.get('GOOGD_API_ENDPOINT')
+
+
+class WorkerPool(ThreadPoolExecutor):
+    """Thread pool whose tasks run in a copy of the submitter's context, e.g. its output stream."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# The service shared by every operation of the process, and the HTTP client of each thread
+_shared = {}
+_shared_lock = threading.Lock()
+_local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def _discovery_document():
+    # The document bundled with googleapiclient, never fetched over the network
+    return get_static_doc('drive', 'v3')
+
+
+def build_service(credentials):
+    """Build a Drive v3 service from the static discovery document, optionally rooted at API_ENDPOINT."""
+    document = json.loads(_discovery_document())
+    if API_ENDPOINT:
+        # Rebase the whole discovery document so media uploads and batches move too
+        document['rootUrl'] = API_ENDPOINT.rstrip('/') + '/'
+    return build_from_document(document, credentials=credentials)
+
+
+def get_service(credentials):
+    """Return the process-wide Drive service for these credentials, building it on first use."""
+    with _shared_lock:
+        if _shared.get('credentials') is not credentials or _shared.get('endpoint') != API_ENDPOINT:
+            print("Initializing Google Drive client...", file=sys.stderr)
+            with phase('build_service'):
+                service = build_service(credentials)
+            _shared.update(credentials=credentials, endpoint=API_ENDPOINT, service=service, folders=FolderCache())
+        return _shared['service']
+
+
+def get_folder_cache():
+    """Return the folder path cache that belongs with the shared service."""
+    with _shared_lock:
+        return _shared.setdefault('folders', FolderCache())
+
+
+def get_http(credentials):
+    """Return the HTTP client of the calling thread, since httplib2 is not thread-safe."""
+    http = getattr(_local, 'http', None)
+    if http is None or http.credentials is not credentials:
+        # build_http stops httplib2 from following the 308 that resumable uploads answer with
+        http = InstrumentedHttp(google_auth_httplib2.AuthorizedHttp(credentials, http=build_http()))
+        _local.http = http
+    return http
+
+
+class FolderCache:
+    """Process-wide memo of folder paths to Drive folder IDs.
+
+    Each path has its own lock, so concurrent uploads into the same new folder create it
+    once. Entries expire after ``ttl`` seconds so that folders moved or deleted elsewhere
+    are eventually looked up again.
+    """
+    DEFAULT_TTL = 300
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.entries = {}  # (parent ID, path) -> (folder ID, time stored)
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def set(self, key, folder_id):
+        with self.lock:
+            self.entries[key] = (folder_id, time.monotonic())
+
+    def lock_for(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def forget(self, folder_id):
+        """Drop a deleted folder, and everything below it."""
+        with self.lock:
+            for parent_id, path in [key for key, entry in self.entries.items() if entry[0] == folder_id]:
+                for key in [key for key in self.entries if key[0] == parent_id and
+                            (key[1] == path or key[1].startswith(path + '/'))]:
+                    del self.entries[key]
+            for key in [key for key in self.entries if key[0] == folder_id]:
+                del self.entries[key]
 
 
 # Base class for all storage operations
 class StorageOperation(ABC):
-    def __init__(self, credentials):
-        print("Initializing Google Drive client...")
-        self.service = build('drive', 'v3', credentials=credentials)
+    def __init__(self, credentials, index=None):
+        self.credentials = credentials
+        self.service = get_service(credentials)
+        # Optional MetadataIndex consulted before querying the API by name
+        self.index = index
 
     @abstractmethod
     def execute(self):
         pass
 
+    def http(self):
+        return get_http(self.credentials)
 
-# Helper function to get folder ID by folder name
-def get_folder_id_by_name(service, folder_name):
-    query = f"mimeType = 'application/vnd.google-apps.folder' and name = '{folder_name}' and 'root' in parents"
-    results = service.files().list(q=query, fields="files(id, name)").execute()
-    items = results.get('files', [])
+    def _execute(self, request, nbytes=0, retryable=is_retryable):
+        """Execute an API request on the calling thread's HTTP client, within the shared rate limits."""
+        http = self.http()
+        return get_executor().call(lambda: request.execute(http=http), nbytes, retryable=retryable)
+
+    def execute_batch(self, requests, idempotent=True):
+        """Send (ID, request) pairs in a single HTTP round-trip, returning responses and errors by ID.
+
+        Sub-requests that fail with a transient error are sent again one by one. Lost responses
+        are only retried for ``idempotent`` requests: a copy or create whose response was lost
+        may have been applied, and sending it again would make a duplicate.
+        """
+        retryable = is_retryable if idempotent else is_rejected
+        responses, errors = {}, {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        retry = []
+        if len(requests) == 1:
+            retry = [requests[0][0]]
+        else:
+            batch = self.service.new_batch_http_request(callback=callback)
+            for request_id, request in requests:
+                batch.add(request, request_id=request_id)
+            try:
+                http = self.http()
+                get_executor().call(lambda: batch.execute(http=http), cost=len(requests), retryable=retryable)
+                retry = [request_id for request_id, error in errors.items() if is_retryable(error)]
+            except Exception as e:
+                unanswered = [request_id for request_id, _ in requests
+                              if request_id not in responses and request_id not in errors]
+                if idempotent:
+                    print(f"Batch request failed, retrying its {len(unanswered)} requests one by one: {e}")
+                    retry = unanswered
+                else:
+                    print(f"Batch request failed, {len(unanswered)} requests may or may not have been applied "
+                          f"and are not retried: {e}")
+                    errors.update((request_id, e) for request_id in unanswered)
+
+        for request_id, request in requests:
+            if request_id in retry:
+                try:
+                    responses[request_id] = self._execute(request, retryable=retryable)
+                    errors.pop(request_id, None)
+                except Exception as e:
+                    errors[request_id] = e
+        return responses, errors
+
+    def download_chunks(self, downloader):
+        """Yield the status of each chunk of a MediaIoBaseDownload, charging its bytes to the bandwidth limit."""
+        executor = get_executor()
+        done, received = False, 0
+        while not done:
+            status, done = executor.call(downloader.next_chunk)
+            executor.consume(status.resumable_progress - received)
+            received = status.resumable_progress
+            yield status
+
+    def find_files(self, name, parent_id=None, mime_type=None, include_trashed=True):
+        """Resolve a file name, through the metadata index when it has the answer."""
+        with phase('name_lookup'):
+            return self._find_files(name, parent_id, mime_type, include_trashed)
+
+    def _find_files(self, name, parent_id=None, mime_type=None, include_trashed=True):
+        if self.index:
+            self.index.ensure_fresh(self.service, http=self.http())
+            files = self.index.lookup(name, parent_id, mime_type)
+            if files:
+                return files
+        query = f"name = '{quote(name)}'"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        if mime_type:
+            query += f" and mimeType = '{mime_type}'"
+        if not include_trashed:
+            # The index never holds trashed files, so only the query needs the clause
+            query += " and trashed = false"
+        results = self._execute(self.service.files().list(q=query, fields=f"files({FILE_FIELDS}, trashed)"))
+        files = results.get('files', [])
+        for item in files:
+            # Drive leaves out empty appProperties, index entries never have them
+            item.setdefault('appProperties', {})
+        if self.index and self.index.is_built():
+            # Remember the answer, the changes feed keeps it current. Lookups never filter the
+            # index on trashed, so trashed files must stay out of it
+            for item in files:
+                if not item.get('trashed'):
+                    self.index.add(item)
+        return files
+
+    def resolve_folder(self, path, create=False, parent_id='root'):
+        """Return the ID of a slash-separated folder path such as backups/2026/10.
+
+        Segments are resolved one by one through the process-wide folder cache. With
+        ``create``, missing segments are created; once one segment is missing, the ones
+        below it are created without looking them up. Returns None if the path does not
+        exist and ``create`` is False.
+        """
+        cache = get_folder_cache()
+        folder_id, prefix, missing = parent_id, '', False
+        for segment in [segment for segment in path.split('/') if segment]:
+            prefix = f"{prefix}/{segment}" if prefix else segment
+            key = (parent_id, prefix)
+            cached = cache.get(key)
+            if cached is None:
+                with cache.lock_for(key):
+                    # Another thread may have resolved or created it while we waited
+                    cached = cache.get(key)
+                    if cached is None:
+                        cached = None if missing else self.get_folder_id(segment, folder_id)
+                        if cached is None:
+                            if not create:
+                                return None
+                            missing = True
+                            cached = self.create_folder(segment, folder_id)
+                            print(f"Created folder '{prefix}' with ID: {cached}")
+                        cache.set(key, cached)
+            folder_id = cached
+        return folder_id
+
+    def get_folder_id(self, folder_name, parent_id='root'):
+        # A trashed folder of the same name must not receive uploads or be listed as the target
+        folders = self.find_files(folder_name, parent_id, FOLDER_MIME_TYPE, include_trashed=False)
+        return folders[0]['id'] if folders else None
+
+    def create_folder(self, name, parent_id=None):
+        folder_metadata = {
+            'name': name,
+            'mimeType': FOLDER_MIME_TYPE
+        }
+        if parent_id:
+            folder_metadata['parents'] = [parent_id]
+        # Only retried when the server refused it, a create whose response was lost may have been applied
+        folder = self._execute(self.service.files().create(body=folder_metadata, fields=FILE_FIELDS),
+                               retryable=is_rejected)
+        if self.index:
+            self.index.add(folder)
+        return folder.get('id')
+
+    def get_compression(self, item):
+        """Return (codec, original size, original MD5) if the file was uploaded with --compress, else None."""
+        if item.get('mimeType') not in CODECS.values():
+            return None
+        if 'appProperties' not in item:
+            # The metadata index does not keep appProperties
+            item = self._execute(self.service.files().get(fileId=item['id'], fields='appProperties'))
+        return compression_of(item)
+
+    def walk(self, folder_id='root', fields=LIST_FIELDS, jobs=4, page_size=PAGE_SIZE, extra_query=None,
+             raise_errors=False):
+        """Yield (path, item) pairs breadth-first, listing several folders concurrently.
+
+        A folder that cannot be listed is reported and skipped, or raised with raise_errors.
+        """
+        pages = queue.Queue(maxsize=jobs * 2)
+        stop = threading.Event()
+
+        def put(entry):
+            while not stop.is_set():
+                try:
+                    pages.put(entry, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def list_folder(parent_id, prefix):
+            try:
+                query = f"'{parent_id}' in parents" + (f" and {extra_query}" if extra_query else '')
+                for page in iter_pages(self.service, query, fields, page_size, http=self.http()):
+                    put((prefix, page, None))
+                put((prefix, None, None))
+            except Exception as e:
+                put((prefix, None, e))
+
+        pending = deque([(folder_id, '')])
+        in_flight = 0
+        pool = WorkerPool(max_workers=jobs)
+        try:
+            while pending or in_flight:
+                while pending and in_flight < jobs:
+                    pool.submit(list_folder, *pending.popleft())
+                    in_flight += 1
+                prefix, page, error = pages.get()
+                if page is None:
+                    # A folder listing finished, or failed
+                    in_flight -= 1
+                    if error and raise_errors:
+                        raise error
+                    if error:
+                        print(f"Failed to list folder '{prefix or '/'}': {error}", file=sys.stderr)
+                    continue
+                for item in page:
+                    path = prefix + item['name']
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        pending.append((item['id'], path + '/'))
+                    yield path, item
+        finally:
+            # Unblock the workers if the consumer stopped early
+            stop.set()
+            pool.shutdown(wait=True)
+
+    def upload_resumable(self, request, path, sessions=None, key=None):
+        """Send a resumable upload request chunk by chunk, resuming a session saved by an earlier run.
+
+        With ``sessions`` (an UploadSessions), the session URI and offset are saved after every
+        chunk under ``key`` so a rerun continues where the upload stopped.
+        """
+        size = os.path.getsize(path)
+        response = None
+        session = sessions.get(path, key) if sessions else None
+        if session:
+            response = self.resume_upload(request, session['uri'], size)
+            if response is None and request.resumable_uri:
+                print(f"Resuming upload of {path} at {format_size(request.resumable_progress)}")
+        progress = ProgressReporter(f"Uploading {os.path.basename(path)}", size)
+        chunked = False
+        http = self.http()
+        while response is None:
+            nbytes = min(request.resumable.chunksize(), size - request.resumable_progress)
+            status, response = get_executor().call(lambda: request.next_chunk(http=http), nbytes)
+            if status:
+                chunked = True
+                if sessions:
+                    sessions.save(path, key, request.resumable_uri, status.resumable_progress)
+                progress.update(status.resumable_progress)
+        if chunked:
+            progress.update(size)
+        if sessions:
+            sessions.discard(path)
+        return response
+
+    def resume_upload(self, request, uri, size):
+        """Point the request at a saved session, returning the file if that upload had already finished."""
+        http = self.http()
+        response, content = get_executor().call(lambda: http.request(
+            uri, 'PUT', headers={'Content-Range': f'bytes */{size}', 'Content-Length': '0'}))
+        if response.status in (200, 201):
+            return request.postproc(response, content)
+        if response.status == 308:
+            request.resumable_uri = uri
+            request.resumable_progress = int(response['range'].split('-')[1]) + 1 if 'range' in response else 0
+        # Any other answer means the session expired, so the upload starts over
+        return None
+
+    def download_to(self, file_id, destination, modified_time=None, compression=None):
+        """Stream a file's content to a local path, replacing it only once the download completes.
+
+        With ``compression`` (from get_compression), the content is decompressed as it arrives
+        and checked against the original size and MD5.
+        """
+        request = self.service.files().get_media(fileId=file_id)
+        request.http = self.http()
+        tmp_path = f"{destination}.googd-tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                sink = DecompressingWriter(f, *compression) if compression else f
+                for _ in self.download_chunks(MediaIoBaseDownload(sink, request)):
+                    pass
+                if compression:
+                    sink.finish()
+            os.replace(tmp_path, destination)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if modified_time:
+            # Keep the local mtime equal to Drive's so later syncs can skip the file without hashing it
+            mtime_ns = round(from_rfc3339(modified_time) * 1000) * 1000000
+            os.utime(destination, ns=(mtime_ns, mtime_ns))
+
+
+def to_rfc3339(timestamp):
+    """Format a POSIX timestamp the way Drive reports modifiedTime."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def from_rfc3339(value):
+    """Parse a Drive timestamp such as 2026-10-18T09:30:00.000Z into a POSIX timestamp."""
+    return datetime.fromisoformat(value.rstrip('Z')).replace(tzinfo=timezone.utc).timestamp()
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ProgressReporter:
+    """Prints the progress of a transfer at most once per interval, and always at completion."""
+
+    def __init__(self, label, total, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def update(self, done, finished=False):
+        now = time.monotonic()
+        finished = finished or (self.total is not None and done >= self.total)
+        if not finished and now - self.last < self.interval:
+            return
+        self.last = now
+        if self.total is None:
+            # A stream of unknown length
+            print(f"{self.label}: {format_size(done)}")
+            return
+        percent = done * 100 // self.total if self.total else 100
+        print(f"{self.label}: {percent}% ({format_size(done)} of {format_size(self.total)})")
+
+
+class StreamUpload(MediaUpload):
+    """Resumable upload media read from a non-seekable stream such as stdin.
+
+    Only the bytes the server has not acknowledged yet are kept, so memory stays around two
+    chunks however long the stream is. The total size becomes known when the stream ends,
+    which is detected one byte ahead so the last chunk is sent with its final Content-Range.
+    """
+
+    def __init__(self, stream, mimetype='application/octet-stream', chunksize=UPLOAD_CHUNK_SIZE):
+        self._stream = stream
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        self._start = 0  # Stream offset of the first buffered byte
+        self._served = 0  # Stream offset just past the last chunk handed out
+        self._size = None
+
+    def _fill(self, end):
+        while self._size is None and self._start + len(self._buffer) < end:
+            data = self._stream.read(end - self._start - len(self._buffer))
+            if not data:
+                self._size = self._start + len(self._buffer)
+            self._buffer.extend(data)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # Read ahead past the next chunk, so the stream's end is seen before that chunk is sent
+        self._fill(self._served + self._chunksize + 1)
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def stream(self):
+        return None
+
+    def getbytes(self, begin, length):
+        # Everything before begin has been acknowledged by the server
+        del self._buffer[:begin - self._start]
+        self._start = begin
+        self._fill(begin + length)
+        self._served = begin + min(length, len(self._buffer))
+        return bytes(self._buffer[:length])
+
+    def to_json(self):
+        raise NotImplementedError("A stream upload cannot be serialized")
+
+
+class UploadSessions:
+    """JSON file of unfinished resumable upload sessions, keyed by local path.
+
+    A saved session is only reused for the same file contents (size and mtime) and the
+    same destination key, so a changed file is never appended to a stale session.
+    """
+    STATE_FILE = 'upload_sessions.json'  # File holding the unfinished sessions
+
+    def __init__(self, path=None):
+        self.path = path or self.STATE_FILE
+        self.lock = threading.Lock()
+        self.sessions = read_json(self.path) or {}
+
+    @staticmethod
+    def _fingerprint(path, key):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'key': key}
+
+    def get(self, path, key=None):
+        with self.lock:
+            session = self.sessions.get(os.path.abspath(path))
+        if session and all(session.get(k) == v for k, v in self._fingerprint(path, key).items()):
+            return session
+        return None
+
+    def save(self, path, key, uri, offset):
+        session = dict(self._fingerprint(path, key), uri=uri, offset=offset)
+        with self.lock:
+            self.sessions[os.path.abspath(path)] = session
+            write_json(self.path, self.sessions)
+
+    def discard(self, path):
+        with self.lock:
+            if self.sessions.pop(os.path.abspath(path), None) is None:
+                return
+            if self.sessions:
+                write_json(self.path, self.sessions)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def read_json(path):
+    """Load a JSON state file, returning None if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Atomically replace a JSON state file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def local_path(root, rel):
+    """Join a slash-separated Drive path onto a local directory, or None if it would leave it."""
+    parts = rel.split('/')
+    if any(part in ('', '.', '..') for part in parts):
+        return None
+    return os.path.join(root, *parts)
+
+
+def original_digest(item):
+    """The size and MD5 of a Drive file's content before any --compress, either may be None."""
+    compression = compression_of(item)
+    if compression:
+        return compression[1:]
+    return (int(item['size']) if 'size' in item else None), item.get('md5Checksum')
+
+
+def is_current(path, item, hash_cache=None):
+    """Whether the local file already has the Drive file's size and MD5, before any compression."""
+    size, md5 = original_digest(item)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if md5 is None or stat.st_size != size:
+        return False
+    local_md5 = hash_cache.md5(path, stat) if hash_cache else md5_of_file(path)
+    return local_md5 == md5
+
+
+def quote(value):
+    """Escape a value for use inside a single-quoted Drive query string."""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+def iter_pages(service, query, fields, page_size=PAGE_SIZE, http=None):
+    """Yield pages of files matching the query, following nextPageToken."""
+    page_token = None
+    while True:
+        request = service.files().list(
+            q=query, fields=f"nextPageToken, files({fields})", pageSize=page_size, pageToken=page_token
+        )
+        results = get_executor().call(lambda: request.execute(http=http))
+        yield results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def iter_files(service, query, fields, page_size=PAGE_SIZE, http=None):
+    """Yield every file matching the query, one page in memory at a time."""
+    for page in iter_pages(service, query, fields, page_size, http):
+        yield from page
 
-    if not items:
-        return None  # Folder doesn't exist
-    else:
-        return items[0]['id']  # Return the ID of the first folder found
 
 def list_and_choose_file(service):
-    # List files in Google Drive root directory
-    results = service.files().list(q="'root' in parents", fields="files(id, name)").execute()
-    items = results.get('files', [])
+    # List files in Google Drive root directory and ask the user to select one
+    items = []
+    for item in iter_files(service, "'root' in parents", "id, name"):
+        if not items:
+            print("Select a file by number:")
+        items.append(item)
+        print(f"{len(items)}. {item['name']}")
 
     if not items:
         print("No files found in Google Drive.")
         return None
 
-    # List the files and ask the user to select one
-    print("Select a file by number:")
-    for idx, item in enumerate(items):
-        print(f"{idx + 1}. {item['name']}")
-
     try:
         choice = int(input("Enter the number of the file: "))
         if choice < 1 or choice > len(items):
@@ -51,64 +667,268 @@ def list_and_choose_file(service):
         print("Invalid input. Please enter a valid number.")
         return None
 
+def collect_sources(sources):
+    """Expand the sources into files and folders to create, each keyed by its relative folder path.
+
+    A file named by several overlapping sources, such as a.txt and *.txt, is uploaded once,
+    under the first of them.
+    """
+    files, folders, missing = [], [], []
+    seen = set()
+
+    def add_file(path, parts):
+        if path not in seen:
+            seen.add(path)
+            files.append((path, parts))
+
+    for source in sources:
+        matches = sorted(glob.glob(source, recursive=True)) if glob.has_magic(source) else [source]
+        if not matches:
+            missing.append(source)
+        for path in matches:
+            # If it's a relative path, convert it to absolute path based on the current directory
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                base = os.path.dirname(path)
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    parts = tuple(os.path.relpath(dirpath, base).split(os.sep))
+                    if parts not in folders:
+                        folders.append(parts)
+                    for name in sorted(filenames):
+                        add_file(os.path.join(dirpath, name), parts)
+            elif os.path.exists(path):
+                add_file(path, ())
+            elif path not in missing:
+                missing.append(path)
+    return files, folders, missing
+
+
 # Upload operation
 class UploadOperation(StorageOperation):
-    def __init__(self, credentials, source, folder_name=None):
-        super().__init__(credentials)
-        self.source = source
+    def __init__(self, credentials, source, folder_name=None, jobs=4, index=None, chunk_size=UPLOAD_CHUNK_SIZE,
+                 sessions=None, name=None, stdin=None, dedup=False, hash_cache=None, compress=None):
+        super().__init__(credentials, index)
+        # A single path or a list of paths, globs and directories, or '-' for stdin
+        self.sources = [source] if isinstance(source, str) else list(source)
+        # Drive file name for an upload from stdin
+        self.name = name
+        self.stdin = stdin
         self.folder_name = folder_name
+        self.jobs = max(1, jobs)
+        self.chunk_size = chunk_size
+        # Unfinished upload sessions, so an interrupted upload resumes on the next run
+        self.sessions = sessions if sessions is not None else UploadSessions()
+        # Skip files whose identical copy is already in the target folder
+        self.dedup = dedup
+        # Optional HashCache, so unchanged local files are never rehashed
+        self.hash_cache = hash_cache
+        # Codec ('gzip' or 'zstd') compressing the content on the fly, see upload_compressed
+        self.compress = compress
+        self.skipped = []
 
     def execute(self):
-        # Check if the path is relative or absolute
-        if not os.path.isabs(self.source):
-            # If it's a relative path, convert it to absolute path based on the current directory
-            self.source = os.path.abspath(self.source)
+        if self.sources == ['-']:
+            return self.upload_stdin()
+        files, folders, missing = self.collect_sources()
+        for path in missing:
+            print(f"Error: The file {path} does not exist.")
+        if not files and not folders:
+            return []
 
-        # Ensure the file exists at the given path
-        if not os.path.exists(self.source):
-            print(f"Error: The file {self.source} does not exist.")
-            return
-
-        # Get the file name from the local path
-        file_name = os.path.basename(self.source)
-
-        # If a folder name is provided, get the folder ID
+        # If a folder path is provided, get its ID, creating the missing folders
         folder_id = None
         if self.folder_name:
-            folder_id = get_folder_id_by_name(self.service, self.folder_name)
+            folder_id = self.resolve_folder(self.folder_name, create=True)
 
-            # If folder doesn't exist, create it
-            if not folder_id:
-                print(f"Folder '{self.folder_name}' not found. Creating folder...")
-                folder_metadata = {
-                    'name': self.folder_name,
-                    'mimeType': 'application/vnd.google-apps.folder'
-                }
-                folder = self.service.files().create(body=folder_metadata, fields='id').execute()
-                folder_id = folder.get('id')
-                print(f"Created folder '{self.folder_name}' with ID: {folder_id}")
+        # Recreate uploaded directory trees, parents before children
+        folder_ids = {(): folder_id}
+        for parts in folders:
+            folder_ids[parts] = self.resolve_folder('/'.join(parts), create=True, parent_id=folder_id or 'root')
+
+        # Upload the files on a bounded worker pool
+        results = [(path, None, 'file does not exist') for path in missing]
+        with WorkerPool(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self.upload_file, path, folder_ids[parts]): path for path, parts in files}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results.append((path, future.result(), None))
+                except Exception as e:
+                    print(f"Failed to upload {path}: {e}")
+                    results.append((path, None, str(e)))
+        if self.hash_cache:
+            self.hash_cache.flush()
+
+        self.print_summary(results, len(self.skipped))
+        return results
+
+    def collect_sources(self):
+        return collect_sources(self.sources)
+
+    def upload_file(self, path, folder_id=None):
+        if self.dedup:
+            duplicate = self.find_duplicate(path, folder_id)
+            if duplicate:
+                self.skipped.append(path)
+                print(f"Skipped {path}: identical to file ID {duplicate['id']}")
+                return duplicate['id']
+        if self.compress:
+            return self.upload_compressed(path, folder_id)
 
         # Prepare metadata for the upload
-        file_metadata = {'name': file_name}
+        file_metadata = {'name': os.path.basename(path)}
         if folder_id:
             file_metadata['parents'] = [folder_id]
 
-        # Upload the file
-        media = MediaFileUpload(self.source, resumable=True)
-        uploaded_file = self.service.files().create(
-            body=file_metadata, media_body=media, fields='id'
-        ).execute()
+        # Upload the file in chunks, resuming the session of an earlier interrupted run
+        media = MediaFileUpload(path, chunksize=self.chunk_size, resumable=True)
+        request = self.service.files().create(
+            body=file_metadata, media_body=media, fields=FILE_FIELDS if self.index else 'id'
+        )
+        uploaded_file = self.upload_resumable(request, path, self.sessions, key=folder_id)
+        if self.index:
+            self.index.add(uploaded_file)
+
+        print(f"Uploaded {path} with file ID: {uploaded_file.get('id')}")
+        return uploaded_file.get('id')
+
+    def upload_compressed(self, path, folder_id=None):
+        """Upload the file compressed as it is read, tagged with the codec and the original size and MD5.
 
-        print(f"Uploaded {self.source} with file ID: {uploaded_file.get('id')}")
+        The compressed size is not known in advance, so the content goes through a stream
+        upload, which cannot resume a session of an earlier run.
+        """
+        stat = os.stat(path)
+        md5 = self.hash_cache.md5(path, stat) if self.hash_cache else md5_of_file(path)
+        with open(path, 'rb') as f:
+            reader = CompressingReader(f, self.compress)
+            file_id = self.upload_stream(reader, os.path.basename(path), folder_id, CODECS[self.compress],
+                                         app_properties(self.compress, stat.st_size, md5))
+        if (reader.size, reader.md5()) != (stat.st_size, md5):
+            # The file changed while it was read, record what was actually sent
+            self.tag_original(file_id, reader)
+        print(f"Uploaded {path} with file ID: {file_id} "
+              f"({format_size(reader.size)} compressed to {format_size(reader.compressed)})")
+        return file_id
+
+    def tag_original(self, file_id, reader):
+        """Record the size and MD5 of what a CompressingReader read in the file's appProperties."""
+        self._execute(self.service.files().update(
+            fileId=file_id, body={'appProperties': app_properties(self.compress, reader.size, reader.md5())}))
+
+    def find_duplicate(self, path, folder_id=None):
+        """Return the file of the same name in the folder with the local file's size and MD5, if there is one.
+
+        The lookup costs one list request, or none when the metadata index answers it. The local
+        file is only hashed when a candidate of the same size exists.
+        """
+        stat = os.stat(path)
+        candidates = []
+        for item in self.find_files(os.path.basename(path), folder_id or 'root', include_trashed=False):
+            # A file uploaded with --compress is compared by its original content, whose size and
+            # MD5 are fetched when the item came from the metadata index
+            compression = self.get_compression(item)
+            size, md5 = compression[1:] if compression else original_digest(item)
+            if md5 and size == stat.st_size:
+                candidates.append((item, md5))
+        if not candidates:
+            return None
+        local_md5 = self.hash_cache.md5(path, stat) if self.hash_cache else md5_of_file(path)
+        return next((item for item, md5 in candidates if md5 == local_md5), None)
+
+    def upload_stdin(self):
+        if not self.name:
+            print("Error: --file is required to name an upload from stdin.")
+            return []
+        folder_id = None
+        if self.folder_name:
+            folder_id = self.resolve_folder(self.folder_name, create=True)
+        stream = self.stdin or sys.stdin.buffer
+        try:
+            if self.compress:
+                # The original size and MD5 are only known once stdin ends
+                stream = CompressingReader(stream, self.compress)
+                file_id = self.upload_stream(stream, self.name, folder_id, CODECS[self.compress],
+                                             app_properties(self.compress))
+                self.tag_original(file_id, stream)
+            else:
+                file_id = self.upload_stream(stream, self.name, folder_id)
+        except Exception as e:
+            print(f"Failed to upload stdin: {e}")
+            return [('-', None, str(e))]
+        print(f"Uploaded stdin as {self.name} with file ID: {file_id}")
+        return [('-', file_id, None)]
+
+    def upload_stream(self, stream, name, folder_id=None, mimetype=None, properties=None):
+        """Upload a non-seekable stream through a chunked resumable session, without staging it on disk."""
+        file_metadata = {'name': name}
+        if folder_id:
+            file_metadata['parents'] = [folder_id]
+        if mimetype:
+            file_metadata['mimeType'] = mimetype
+        if properties:
+            file_metadata['appProperties'] = properties
+        media = StreamUpload(stream, mimetype or 'application/octet-stream', chunksize=self.chunk_size)
+        request = self.service.files().create(
+            body=file_metadata, media_body=media, fields=FILE_FIELDS if self.index else 'id'
+        )
+        progress = ProgressReporter(f"Uploading {name}", None)
+        http = self.http()
+        response = None
+        while response is None:
+            # A failed chunk is retried from the server's acknowledged offset, which is still buffered
+            status, response = get_executor().call(lambda: request.next_chunk(http=http), self.chunk_size)
+            if status:
+                progress.update(status.resumable_progress)
+        progress.update(media.size(), finished=True)
+        if self.index:
+            self.index.add(response)
+        return response.get('id')
+
+    @staticmethod
+    def print_summary(results, skipped=0):
+        failed = [result for result in results if result[2]]
+        summary = f"Upload summary: {len(results) - len(failed)} succeeded, {len(failed)} failed"
+        if skipped:
+            summary += f" ({skipped} skipped as identical)"
+        print(summary)
+        for path, file_id, error in sorted(results, key=lambda result: result[0]):
+            if error:
+                print(f"  FAILED {path}: {error}")
+            else:
+                print(f"  OK     {path} -> {file_id}")
 
 
 class DownloadOperation(StorageOperation):
-    def __init__(self, credentials, file_name=None, destination_folder='.'):
-        super().__init__(credentials)
+    # Size of each HTTP Range request in ranged mode
+    SEGMENT_SIZE = 8 * 1024 * 1024
+    # Downloads queued per worker in folder mode, so the listing runs ahead but not unbounded
+    QUEUE_DEPTH = 4
+    TREE_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime, appProperties'
+
+    def __init__(self, credentials, file_name=None, destination_folder='.', ranged=False, jobs=4, index=None,
+                 output=None, folder_name=None, recursive=False, hash_cache=None):
+        super().__init__(credentials, index)
         self.file_name = file_name
         self.destination_folder = destination_folder
+        self.ranged = ranged
+        self.jobs = max(1, jobs)
+        # Binary stream, such as stdout, that receives the content instead of a local file
+        self.output = output
+        # Drive folder path whose files are downloaded, with its subfolders if recursive
+        self.folder_name = folder_name
+        self.recursive = recursive
+        # Optional HashCache, so unchanged local copies are never rehashed
+        self.hash_cache = hash_cache
 
     def execute(self):
+        if self.folder_name:
+            return self.download_folder()
+        if self.output is not None:
+            # Keep status messages out of the streamed content
+            with contextlib.redirect_stdout(sys.stderr):
+                return self.download_file_by_name(self.file_name)
         if self.file_name:
             # Directly download the file if filename is provided
             self.download_file_by_name(self.file_name)
@@ -116,11 +936,83 @@ class DownloadOperation(StorageOperation):
             # If no filename provided, list the files and prompt the user to select one
             self.list_and_choose_file_for_download()
 
+    def download_folder(self):
+        """Mirror a Drive folder into a local directory of the same name."""
+        folder_id = self.resolve_folder(self.folder_name)
+        if not folder_id:
+            print(f"Folder '{self.folder_name}' not found in Google Drive.")
+            return None
+        root = os.path.join(self.destination_folder, posixpath.basename(self.folder_name.strip('/')))
+        counts = self.download_tree(folder_id, root, self.recursive)
+        print(f"Downloaded folder to {root}: " + ", ".join(f"{n} {kind}" for kind, n in counts.items()))
+        return counts
+
+    def download_tree(self, folder_id, root, recursive=True, on_item=None):
+        """Download a folder's files into ``root``, returning counts by outcome.
+
+        The folder tree is listed while the files already found download on the worker
+        pool, and files whose local copy has the same size and MD5 are skipped.
+        ``on_item(rel, item)`` sees every listed entry.
+        """
+        os.makedirs(root, exist_ok=True)
+        if recursive:
+            rows = self.walk(folder_id, self.TREE_FIELDS, self.jobs, extra_query='trashed = false')
+        else:
+            rows = ((item['name'], item) for item in iter_files(
+                self.service, f"'{folder_id}' in parents and trashed = false", self.TREE_FIELDS, http=self.http()))
+
+        counts = {'downloaded': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.jobs * self.QUEUE_DEPTH)
+
+        def count(kind):
+            with lock:
+                counts[kind] += 1
+
+        def fetch(rel, item, destination):
+            try:
+                if self.is_current(destination, item):
+                    count('unchanged')
+                    return
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                self.download_to(item['id'], destination, item.get('modifiedTime'), compression_of(item))
+                print(f"Downloaded {rel}")
+                count('downloaded')
+            except Exception as e:
+                print(f"Failed to download {rel}: {e}")
+                count('failed')
+            finally:
+                slots.release()
+
+        with WorkerPool(max_workers=self.jobs) as pool:
+            for rel, item in rows:
+                destination = local_path(root, rel)
+                if destination is None:
+                    print(f"Skipping {rel}: not a valid local path")
+                    count('skipped')
+                    continue
+                if on_item:
+                    on_item(rel, item)
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    if recursive:
+                        os.makedirs(destination, exist_ok=True)
+                    continue
+                if 'md5Checksum' not in item:
+                    print(f"Skipping {rel}: Google Docs files have no binary content")
+                    count('skipped')
+                    continue
+                slots.acquire()
+                pool.submit(fetch, rel, item, destination)
+        if self.hash_cache:
+            self.hash_cache.flush()
+        return counts
+
+    def is_current(self, path, item):
+        return is_current(path, item, self.hash_cache)
+
     def download_file_by_name(self, file_name):
         # Search for the file by its name
-        query = f"name='{file_name}'"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
+        files = self.find_files(file_name)
 
         if not files:
             print(f"No file found with the name '{file_name}'.")
@@ -128,16 +1020,113 @@ class DownloadOperation(StorageOperation):
 
         file_id = files[0]['id']
         print(f"Found file: {file_name} (ID: {file_id})")
+        compression = self.get_compression(files[0])
+
+        if self.output is not None:
+            if not compression:
+                return self.download_stream(file_id, self.output, files[0].get('size'))
+            sink = DecompressingWriter(self.output, *compression)
+            try:
+                self.download_stream(file_id, sink, files[0].get('size'))
+                sink.finish()
+            except IOError as e:
+                print(f"Error: {e}")
+                return False
+            return True
+
+        destination = os.path.join(self.destination_folder, file_name)
+        if compression:
+            # Decompression needs the content in order, so compressed files download as one stream
+            try:
+                self.download_to(file_id, destination, compression=compression)
+            except IOError as e:
+                print(f"Error: {e} for {destination}")
+                return False
+            print(f"Downloaded file to {destination} (decompressed {compression[0]})")
+            return True
+        if self.ranged and 'size' in files[0]:
+            self.download_ranged(file_id, destination, int(files[0]['size']), files[0].get('md5Checksum'))
+            return
 
         # Download the file
         request = self.service.files().get_media(fileId=file_id)
-        with open(f"{self.destination_folder}/{file_name}", 'wb') as f:
-            downloader = MediaIoBaseDownload(f, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
+        request.http = self.http()
+        with open(destination, 'wb') as f:
+            for status in self.download_chunks(MediaIoBaseDownload(f, request)):
                 print(f"Download progress: {int(status.progress() * 100)}%")
-        print(f"Downloaded file to {self.destination_folder}/{file_name}")
+        print(f"Downloaded file to {destination}")
+
+    def download_stream(self, file_id, output, size=None):
+        """Write the file to a binary stream one chunk at a time, so memory stays flat."""
+        request = self.service.files().get_media(fileId=file_id)
+        request.http = self.http()
+        downloader = MediaIoBaseDownload(output, request, chunksize=STREAM_CHUNK_SIZE)
+        progress = ProgressReporter("Download progress", int(size) if size is not None else None)
+        for status in self.download_chunks(downloader):
+            output.flush()
+            progress.update(status.resumable_progress)
+        return True
+
+    def download_ranged(self, file_id, destination, size, md5_checksum=None):
+        """Fetch the file as parallel Range segments, resuming from the sidecar checkpoint if present."""
+        checkpoint_path = destination + '.googd-checkpoint'
+        segments = [(start, min(start + self.SEGMENT_SIZE, size) - 1) for start in range(0, size, self.SEGMENT_SIZE)]
+        state = {'id': file_id, 'size': size, 'md5Checksum': md5_checksum,
+                 'segment_size': self.SEGMENT_SIZE, 'done': []}
+
+        checkpoint = read_json(checkpoint_path)
+        if checkpoint and os.path.exists(destination) and \
+                all(checkpoint.get(key) == state[key] for key in ('id', 'size', 'md5Checksum', 'segment_size')):
+            state['done'] = checkpoint['done']
+            print(f"Resuming download: {len(state['done'])} of {len(segments)} segments already done")
+        else:
+            # Preallocate the destination so segments can be written in place
+            with open(destination, 'wb') as f:
+                f.truncate(size)
+            write_json(checkpoint_path, state)
+
+        done = set(state['done'])
+        pending = [index for index in range(len(segments)) if index not in done]
+        lock = threading.Lock()
+        failures = []
+        with open(destination, 'r+b') as f, WorkerPool(max_workers=self.jobs) as pool:
+            def fetch(index):
+                start, end = segments[index]
+                request = self.service.files().get_media(fileId=file_id)
+                request.headers['range'] = f'bytes={start}-{end}'
+                data = self._execute(request, nbytes=end - start + 1)
+                if len(data) != end - start + 1:
+                    raise IOError(f"Expected {end - start + 1} bytes for range {start}-{end}, got {len(data)}")
+                with lock:
+                    f.seek(start)
+                    f.write(data)
+                    f.flush()
+                    state['done'].append(index)
+                    write_json(checkpoint_path, state)
+
+            futures = {pool.submit(fetch, index): index for index in pending}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append(futures[future])
+                    print(f"Failed to download segment {futures[future]}: {e}")
+                with lock:
+                    print(f"Download progress: {int(len(state['done']) * 100 / len(segments))}%")
+
+        if failures:
+            print(f"{len(failures)} segments failed. Rerun the download to fetch only the missing ranges.")
+            return False
+
+        if md5_checksum and md5_of_file(destination) != md5_checksum:
+            # Start from scratch next time, the partial state cannot be trusted
+            os.remove(checkpoint_path)
+            print(f"Error: MD5 checksum mismatch for {destination}")
+            return False
+
+        os.remove(checkpoint_path)
+        print(f"Downloaded file to {destination}")
+        return True
 
     def list_and_choose_file_for_download(self):
         selected_file = list_and_choose_file(self.service)
@@ -145,35 +1134,196 @@ class DownloadOperation(StorageOperation):
             self.download_file_by_name(selected_file['name'])
 
 # List operation
-class ListOperation(StorageOperation):
-    def __init__(self, credentials):
-        super().__init__(credentials)
+def split_fields(spec):
+    """Split a fields selector such as 'id, owners(emailAddress)' on its top-level commas."""
+    parts, depth, current = [], 0, ''
+    for char in spec:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return [part for part in parts if part]
 
-    def execute(self):
-        # List files in Google Drive's root directory
-        results = self.service.files().list(
-            q="'root' in parents",
-            fields="files(id, name, mimeType, modifiedTime)"
-        ).execute()
-        items = results.get('files', [])
 
-        if not items:
+class ListFilter:
+    """Filters of a listing, split between the Drive query and a check of each returned row.
+
+    Mime type, name prefix, modification time, trashed and owner go into the ``q``
+    expression, so Drive only sends matching files. Substring and size filters, which the
+    query language cannot express, run on the rows as they stream in. The row check also
+    covers the pushed filters, for the folders a recursive listing fetches regardless.
+    """
+
+    def __init__(self, mime_type=None, name_contains=None, name_prefix=None, modified_after=None,
+                 modified_before=None, trashed=None, owner=None, min_size=None, max_size=None):
+        self.mime_type = mime_type
+        self.name_contains = name_contains
+        self.name_prefix = name_prefix
+        # POSIX timestamps
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+        self.trashed = trashed
+        # An email address, or 'me'
+        self.owner = owner
+        # Bytes
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def __bool__(self):
+        return any(value is not None for value in vars(self).values())
+
+    def query(self):
+        """The part of the filters Drive evaluates, as a q expression, or None."""
+        clauses = []
+        if self.mime_type:
+            if self.mime_type.endswith('/*'):
+                clauses.append(f"mimeType contains '{quote(self.mime_type[:-1])}'")
+            else:
+                clauses.append(f"mimeType = '{quote(self.mime_type)}'")
+        if self.name_prefix:
+            # Drive matches 'contains' on names by prefix, the row check makes it exact
+            clauses.append(f"name contains '{quote(self.name_prefix)}'")
+        if self.modified_after is not None:
+            clauses.append(f"modifiedTime > '{to_rfc3339(self.modified_after)}'")
+        if self.modified_before is not None:
+            clauses.append(f"modifiedTime < '{to_rfc3339(self.modified_before)}'")
+        if self.trashed is not None:
+            clauses.append(f"trashed = {'true' if self.trashed else 'false'}")
+        if self.owner:
+            clauses.append(f"'{quote(self.owner)}' in owners")
+        return ' and '.join(clauses) or None
+
+    def fields(self):
+        """The file fields the row check reads."""
+        fields = []
+        if self.mime_type:
+            fields.append('mimeType')
+        if self.name_contains or self.name_prefix:
+            fields.append('name')
+        if self.modified_after is not None or self.modified_before is not None:
+            fields.append('modifiedTime')
+        if self.trashed is not None:
+            fields.append('trashed')
+        if self.owner:
+            fields.append('ownedByMe' if self.owner == 'me' else 'owners(emailAddress)')
+        if self.min_size is not None or self.max_size is not None:
+            fields.append('size')
+        return fields
+
+    def matches(self, item):
+        mime_type = item.get('mimeType', '')
+        if self.mime_type and not (mime_type.startswith(self.mime_type[:-1]) if self.mime_type.endswith('/*')
+                                   else mime_type == self.mime_type):
+            return False
+        name = item.get('name', '').lower()
+        if self.name_prefix and not name.startswith(self.name_prefix.lower()):
+            return False
+        if self.name_contains and self.name_contains.lower() not in name:
+            return False
+        if self.modified_after is not None or self.modified_before is not None:
+            modified = from_rfc3339(item['modifiedTime'])
+            if self.modified_after is not None and modified <= self.modified_after:
+                return False
+            if self.modified_before is not None and modified >= self.modified_before:
+                return False
+        if self.trashed is not None and bool(item.get('trashed')) != self.trashed:
+            return False
+        if self.owner == 'me' and not item.get('ownedByMe'):
+            return False
+        if self.owner and self.owner != 'me' and not any(
+                owner.get('emailAddress', '').lower() == self.owner.lower() for owner in item.get('owners', [])):
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            # Folders and Google Docs have no size, so they never match a size filter
+            if 'size' not in item:
+                return False
+            size = int(item['size'])
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return True
+
+
+class ListingPrinter:
+    """Prints listing rows as text or JSONL, limited to a fields projection if one is given."""
+
+    def __init__(self, output_format='text', fields=None):
+        self.output_format = output_format
+        # Fields to print, such as 'id, name, size'; only these and what the filters need are fetched
+        self.fields = split_fields(fields) if fields else None
+        self.columns = [field.split('(')[0] for field in self.fields] if self.fields else None
+        self.count = 0
+
+    def request_fields(self, filters):
+        """The fields selector of the list requests: the projection, what the filters read and what paths need."""
+        fields = list(self.fields or split_fields(LIST_FIELDS))
+        for field in ['id', 'name', 'mimeType'] + filters.fields():
+            if field not in fields:
+                fields.append(field)
+        return ', '.join(fields)
+
+    def row(self, path, item):
+        if self.output_format == 'jsonl':
+            if self.columns:
+                item = {column: item[column] for column in self.columns if column in item}
+            print(json.dumps(dict(item, path=path)))
+        else:
+            if not self.count:
+                print("Listing files in root directory:")
+            if self.columns:
+                print(", ".join([f"Name: {path}"] + [f"{column}: {item.get(column)}"
+                                                     for column in self.columns if column != 'name']))
+            else:
+                # Display file details (name, type, last modified date)
+                mime_type = item['mimeType']
+                modified_time = item['modifiedTime']
+                print(f"Name: {path}, Type: {mime_type}, Last Modified: {modified_time}")
+        self.count += 1
+
+    def finish(self):
+        if not self.count and self.output_format != 'jsonl':
             print("No files found in Google Drive.")
-            return
 
-        # Display file details (name, type, last modified date)
-        print("Listing files in root directory:")
-        for item in items:
-            name = item['name']
-            mime_type = item['mimeType']
-            modified_time = item['modifiedTime']
-            print(f"Name: {name}, Type: {mime_type}, Last Modified: {modified_time}")
 
+class ListOperation(StorageOperation):
+    def __init__(self, credentials, recursive=False, output_format='text', page_size=PAGE_SIZE, jobs=4,
+                 filters=None, fields=None):
+        super().__init__(credentials)
+        self.recursive = recursive
+        self.page_size = page_size
+        self.jobs = max(1, jobs)
+        self.filters = filters or ListFilter()
+        self.printer = ListingPrinter(output_format, fields)
+
+    def execute(self):
+        # List files in Google Drive's root directory, printing rows as pages arrive
+        fields = self.printer.request_fields(self.filters)
+        query = self.filters.query()
+        if self.recursive:
+            # Folders that do not match are still fetched, to descend into them
+            extra_query = f"({query} or mimeType = '{FOLDER_MIME_TYPE}')" if query else None
+            rows = self.walk(fields=fields, jobs=self.jobs, page_size=self.page_size, extra_query=extra_query)
+        else:
+            query = "'root' in parents" + (f" and {query}" if query else '')
+            rows = ((item['name'], item) for item in iter_files(
+                self.service, query, fields, self.page_size, http=self.http()))
+        for path, item in rows:
+            if not self.filters or self.filters.matches(item):
+                self.printer.row(path, item)
+        self.printer.finish()
 
 class RemoveOperation(StorageOperation):
-    def __init__(self, credentials, filename=None):
-        super().__init__(credentials)
+    def __init__(self, credentials, filename=None, index=None, folder_name=None, dry_run=False):
+        super().__init__(credentials, index)
         self.filename = filename
+        self.folder_name = folder_name  # Drive folder path holding the file (default: My Drive)
+        self.dry_run = dry_run
 
     def execute(self):
         if self.filename:  # Direct deletion by filename
@@ -182,23 +1332,759 @@ class RemoveOperation(StorageOperation):
             self.list_and_choose_file_for_removal()
 
     def remove_file_by_name(self, file_name):
-        # Find the file in the root directory by filename
-        query = f"name = '{file_name}' and 'root' in parents"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
-        items = results.get('files', [])
+        parent_id = 'root'
+        if self.folder_name:
+            parent_id = self.resolve_folder(self.folder_name)
+            if not parent_id:
+                print(f"Folder '{self.folder_name}' not found in Google Drive.")
+                return
+        items = self.find_files(file_name, parent_id)
 
         if not items:
             print(f"File with name {file_name} not found in Google Drive.")
             return
 
         # Delete the first matching file
-        file_id = items[0]['id']
-        self.service.files().delete(fileId=file_id).execute()
-        print(f"Removed file with name: {file_name} (ID: {file_id})")
+        self.remove(items[0]['id'], file_name)
+
+    def remove(self, file_id, name):
+        if self.dry_run:
+            print(f"Would remove: {name} (ID: {file_id})")
+            return
+        self.delete_file(file_id)
+        print(f"Removed file with name: {name} (ID: {file_id})")
+
+    def delete_file(self, file_id):
+        self._execute(self.service.files().delete(fileId=file_id))
+        get_folder_cache().forget(file_id)
+        if self.index:
+            self.index.remove(file_id)
 
     def list_and_choose_file_for_removal(self):
         selected_file = list_and_choose_file(self.service)
         if selected_file:
-            file_id = selected_file['id']
-            self.service.files().delete(fileId=file_id).execute()
-            print(f"Removed file with name: {selected_file['name']} (ID: {file_id})")
\ No newline at end of file
+            self.remove(selected_file['id'], selected_file['name'])
+
+# Rebuild the local metadata index
+class RefreshIndexOperation(StorageOperation):
+    def __init__(self, credentials, index):
+        super().__init__(credentials, index)
+
+    def execute(self):
+        count = self.index.refresh(self.service, http=self.http())
+        print(f"Indexed {count} files into {self.index.path}")
+
+
+# Bulk delete operation, sending the deletions as batch requests
+def bulk_remove_query(folder_id=None, older_than=None, pattern=None):
+    """The Drive query selecting the files a bulk removal may delete; glob patterns are matched afterwards."""
+    clauses = ['trashed = false', f"mimeType != '{FOLDER_MIME_TYPE}'"]
+    if folder_id:
+        clauses.append(f"'{folder_id}' in parents")
+    if older_than is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=older_than)
+        clauses.append(f"modifiedTime < '{cutoff.strftime('%Y-%m-%dT%H:%M:%S')}'")
+    if pattern and not glob.has_magic(pattern):
+        clauses.append(f"name = '{quote(pattern)}'")
+    return ' and '.join(clauses)
+
+
+class BulkRemoveOperation(RemoveOperation):
+    def __init__(self, credentials, pattern=None, folder_name=None, older_than=None, ids=None, dry_run=False,
+                 index=None):
+        super().__init__(credentials, index=index)
+        self.pattern = pattern
+        self.folder_name = folder_name
+        self.older_than = older_than  # Age in days
+        self.ids = ids  # Iterable of file IDs, one per line
+        self.dry_run = dry_run
+
+    def execute(self):
+        # Collect the targets first, deleting while paging could skip results
+        targets = list(self.iter_targets())
+        if self.dry_run:
+            for file_id, name in targets:
+                print(f"Would remove: {name} (ID: {file_id})")
+            print(f"{len(targets)} files would be removed")
+            return targets
+
+        removed, failed = 0, []
+        for start in range(0, len(targets), BATCH_SIZE):
+            chunk = dict(targets[start:start + BATCH_SIZE])
+            deleted, errors = self.execute_batch(
+                [(file_id, self.service.files().delete(fileId=file_id)) for file_id in chunk])
+            for file_id, error in errors.items():
+                if isinstance(error, HttpError) and error.resp.status == 404:
+                    deleted[file_id] = None  # Already gone, e.g. an earlier attempt's response was lost
+                else:
+                    print(f"Failed to remove {chunk[file_id]} (ID: {file_id}): {error}")
+                    failed.append(file_id)
+            for file_id in deleted:
+                get_folder_cache().forget(file_id)
+                if self.index:
+                    self.index.remove(file_id)
+            removed += len(deleted)
+        print(f"Removed {removed} files, {len(failed)} failed")
+        return failed
+
+    def iter_targets(self):
+        """Yield (file ID, name) pairs for every file selected for deletion."""
+        if self.ids is not None:
+            seen = set()
+            for line in self.ids:
+                file_id = line.strip()
+                if file_id and file_id not in seen:
+                    seen.add(file_id)
+                    yield file_id, file_id
+            return
+
+        folder_id = None
+        if self.folder_name:
+            folder_id = self.resolve_folder(self.folder_name)
+            if not folder_id:
+                print(f"Folder '{self.folder_name}' not found in Google Drive.")
+                return
+
+        query = bulk_remove_query(folder_id, self.older_than, self.pattern)
+        for item in iter_files(self.service, query, 'id, name', http=self.http()):
+            if not self.pattern or fnmatch.fnmatchcase(item['name'], self.pattern):
+                yield item['id'], item['name']
+
+# Copy or move files and folder trees inside Drive; no content passes through this host
+class CopyOperation(StorageOperation):
+    TREE_FIELDS = 'id, name, mimeType, parents'
+
+    def __init__(self, credentials, source, destination, move=False, jobs=4, index=None):
+        super().__init__(credentials, index)
+        # Drive path of a file or folder, with an optional glob in its last segment, such as reports/*.csv
+        self.source = source.strip('/')
+        # Drive folder path receiving the items, created if missing
+        self.destination = destination.strip('/')
+        self.move = move
+        self.jobs = max(1, jobs)
+
+    def execute(self):
+        parent_id, items = self.find_sources()
+        if not items:
+            print(f"No file or folder matches '{self.source}' in Google Drive.")
+            return None
+        destination_id = self.resolve_folder(self.destination, create=True) if self.destination else 'root'
+        if self.move:
+            return self.move_items(items, parent_id, destination_id)
+        return self.copy_items(items, parent_id, destination_id)
+
+    def find_sources(self):
+        """Return the source's parent folder ID and the items the source names."""
+        parent, _, name = self.source.rpartition('/')
+        parent_id = self.resolve_folder(parent) if parent else 'root'
+        if not parent_id:
+            return None, []
+        if glob.has_magic(name):
+            query = f"'{parent_id}' in parents and trashed = false"
+            items = [item for item in iter_files(self.service, query, FILE_FIELDS, http=self.http())
+                     if fnmatch.fnmatchcase(item['name'], name)]
+        else:
+            items = self.find_files(name, parent_id, include_trashed=False)
+        # Only this parent matters, and index entries do not list parents
+        return parent_id, [dict(item, parents=[parent_id]) for item in items]
+
+    def move_items(self, items, parent_id, destination_id):
+        """Reparent each item with one metadata update; a folder takes everything below it along."""
+        if parent_id == destination_id:
+            print(f"'{self.source}' is already in {self.destination or 'My Drive'}")
+            return {}
+        moved, errors = self.run_batches([
+            (item['id'], self.service.files().update(fileId=item['id'], addParents=destination_id,
+                                                     removeParents=parent_id, fields=FILE_FIELDS))
+            for item in items])
+        for item in items:
+            if item['id'] in errors:
+                print(f"Failed to move {item['name']}: {errors[item['id']]}")
+                continue
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                # Cached paths of the folder and its subfolders are stale now
+                get_folder_cache().forget(item['id'])
+            if self.index:
+                self.index.add(moved[item['id']])
+            print(f"Moved {item['name']} to {self.destination or 'My Drive'}")
+        print(f"Move summary: {len(moved)} moved, {len(errors)} failed")
+        return errors
+
+    def copy_items(self, items, parent_id, destination_id):
+        """Copy files with files.copy and recreate folder trees, level by level, in parallel batches."""
+        # List every source tree first, so nothing created below can be listed as a source
+        levels = {0: [item for item in items if item['mimeType'] == FOLDER_MIME_TYPE]}
+        files = [item for item in items if item['mimeType'] != FOLDER_MIME_TYPE]
+        for folder in levels[0]:
+            for path, item in self.walk(folder['id'], self.TREE_FIELDS, self.jobs, extra_query='trashed = false'):
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    levels.setdefault(path.count('/') + 1, []).append(item)
+                else:
+                    files.append(item)
+
+        # Source folder ID -> ID of its copy
+        copies = {parent_id: destination_id}
+        failed = {}
+        for depth in sorted(levels):
+            created, errors = self.run_batches([
+                (item['id'], self.service.files().create(
+                    body={'name': item['name'], 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent]},
+                    fields=FILE_FIELDS))
+                for item, parent in self.with_copy_parents(levels[depth], copies, failed)], idempotent=False)
+            failed.update(errors)
+            for source_id, folder in created.items():
+                copies[source_id] = folder['id']
+                if self.index:
+                    self.index.add(folder)
+
+        copied, errors = self.run_batches([
+            (item['id'], self.service.files().copy(
+                fileId=item['id'], body={'name': item['name'], 'parents': [parent]}, fields=FILE_FIELDS))
+            for item, parent in self.with_copy_parents(files, copies, failed)], idempotent=False)
+        failed.update(errors)
+        if self.index:
+            for item in copied.values():
+                self.index.add(item)
+
+        names = {item['id']: item['name'] for level in levels.values() for item in level}
+        names.update((item['id'], item['name']) for item in files)
+        for source_id, error in failed.items():
+            print(f"Failed to copy {names.get(source_id, source_id)}: {error}")
+        print(f"Copy summary: {len(copied)} files and {len(copies) - 1} folders copied, {len(failed)} failed")
+        return failed
+
+    @staticmethod
+    def with_copy_parents(items, copies, failed):
+        """Pair each item with the copy of its parent folder, failing the items whose parent was not copied."""
+        for item in items:
+            parent = next((copies[source] for source in item.get('parents', []) if source in copies), None)
+            if parent is None:
+                failed[item['id']] = "its folder was not copied"
+            else:
+                yield item, parent
+
+    def run_batches(self, requests, idempotent=True):
+        """Send (ID, request) pairs in batches, several at once, returning responses and errors by ID."""
+        responses, errors = {}, {}
+        chunks = [requests[start:start + BATCH_SIZE] for start in range(0, len(requests), BATCH_SIZE)]
+        with WorkerPool(max_workers=self.jobs) as pool:
+            for chunk_responses, chunk_errors in pool.map(lambda chunk: self.execute_batch(chunk, idempotent),
+                                                          chunks):
+                responses.update(chunk_responses)
+                errors.update(chunk_errors)
+        return responses, errors
+
+
+# Mirror a local directory and a Drive folder, in either direction
+class SyncOperation(StorageOperation):
+    SYNC_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime, appProperties'
+
+    def __init__(self, credentials, local_dir, folder_name, direction='up', jobs=4, hash_cache=None, index=None,
+                 chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__(credentials, index)
+        self.chunk_size = chunk_size
+        self.local_dir = os.path.abspath(local_dir)
+        self.folder_name = folder_name
+        self.direction = direction
+        self.jobs = max(1, jobs)
+        # Optional HashCache, so unchanged local files are never rehashed
+        self.hash_cache = hash_cache
+
+    def execute(self):
+        if self.direction == 'up' and not os.path.isdir(self.local_dir):
+            print(f"Error: The directory {self.local_dir} does not exist.")
+            return None
+        folder_id = self.resolve_folder(self.folder_name, create=self.direction == 'up')
+        if not folder_id:
+            print(f"Folder '{self.folder_name}' not found in Google Drive.")
+            return None
+        if self.direction == 'down':
+            os.makedirs(self.local_dir, exist_ok=True)
+
+        # A folder that cannot be listed must abort the sync, or its files would look missing
+        remote = dict(self.walk(folder_id, self.SYNC_FIELDS, self.jobs, extra_query='trashed = false',
+                                raise_errors=True))
+        local_files, local_dirs = self.scan_local()
+        if self.direction == 'up':
+            tasks, unchanged = self.plan_upload(folder_id, remote, local_files, local_dirs)
+        else:
+            tasks, unchanged = self.plan_download(remote, local_files)
+
+        counts = {'uploaded': 0, 'updated': 0, 'downloaded': 0, 'unchanged': unchanged, 'failed': 0}
+        with WorkerPool(max_workers=self.jobs) as pool:
+            futures = {pool.submit(task, *task_args): (kind, rel) for kind, rel, task, task_args in tasks}
+            for future in as_completed(futures):
+                kind, rel = futures[future]
+                try:
+                    future.result()
+                    counts[kind] += 1
+                    print(f"{kind.capitalize()} {rel}")
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(f"Failed to sync {rel}: {e}")
+        if self.hash_cache:
+            self.hash_cache.flush()
+        print("Sync complete: " + ", ".join(f"{count} {kind}" for kind, count in counts.items()))
+        return counts
+
+    def scan_local(self):
+        """Return {relative path: (absolute path, stat)} for files and the set of relative directories."""
+        files, dirs = {}, set()
+        if not os.path.isdir(self.local_dir):
+            return files, dirs
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            with os.scandir(os.path.join(self.local_dir, rel_dir)) as entries:
+                for entry in entries:
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.add(rel)
+                        pending.append(rel)
+                    elif entry.is_file() and not entry.name.endswith('.googd-tmp'):
+                        files[rel] = (entry.path, entry.stat())
+        return files, dirs
+
+    def is_unchanged(self, path, stat, item):
+        # A file uploaded with --compress is compared by its original content
+        size, md5 = original_digest(item)
+        if md5 is None or size != stat.st_size:
+            return False
+        if stat.st_mtime_ns // 1000000 == round(from_rfc3339(item['modifiedTime']) * 1000):
+            return True
+        local_md5 = self.hash_cache.md5(path, stat) if self.hash_cache else md5_of_file(path)
+        return local_md5 == md5
+
+    def plan_upload(self, folder_id, remote, local_files, local_dirs):
+        folder_ids = {'': folder_id}
+        folder_ids.update((rel, item['id']) for rel, item in remote.items() if item['mimeType'] == FOLDER_MIME_TYPE)
+        # Sorted, so parents are created before their children
+        for rel in sorted(local_dirs):
+            if rel not in folder_ids:
+                parent, name = posixpath.split(rel)
+                folder_ids[rel] = self.create_folder(name, folder_ids[parent])
+
+        tasks, unchanged = [], 0
+        for rel, (path, stat) in local_files.items():
+            item = remote.get(rel)
+            if item is None:
+                tasks.append(('uploaded', rel, self.push_file,
+                              (path, stat, None, folder_ids[posixpath.dirname(rel)])))
+            elif item['mimeType'] == FOLDER_MIME_TYPE:
+                print(f"Skipping {rel}: a folder with that name exists in Google Drive")
+            elif self.is_unchanged(path, stat, item):
+                unchanged += 1
+            else:
+                tasks.append(('updated', rel, self.push_file, (path, stat, item['id'], None)))
+        return tasks, unchanged
+
+    def plan_download(self, remote, local_files):
+        tasks, unchanged = [], 0
+        for rel, item in remote.items():
+            destination = local_path(self.local_dir, rel)
+            if destination is None:
+                print(f"Skipping {rel}: not a valid local path")
+            elif item['mimeType'] == FOLDER_MIME_TYPE:
+                os.makedirs(destination, exist_ok=True)
+            elif 'md5Checksum' not in item:
+                print(f"Skipping {rel}: Google Docs files have no binary content")
+            elif rel in local_files and self.is_unchanged(*local_files[rel], item):
+                unchanged += 1
+            else:
+                tasks.append(('downloaded', rel, self.download_to,
+                              (item['id'], destination, item['modifiedTime'], compression_of(item))))
+        return tasks, unchanged
+
+    def push_file(self, path, stat, file_id=None, parent_id=None):
+        """Upload a new file, or new content for an existing one, stamped with the local mtime."""
+        # Truncated to milliseconds, the precision Drive keeps, so the next sync sees equal times
+        metadata = {'modifiedTime': to_rfc3339(stat.st_mtime_ns // 1000000 / 1000)}
+        media = MediaFileUpload(path, chunksize=self.chunk_size, resumable=True)
+        if file_id:
+            request = self.service.files().update(fileId=file_id, body=metadata, media_body=media, fields='id')
+        else:
+            metadata.update(name=os.path.basename(path), parents=[parent_id])
+            request = self.service.files().create(body=metadata, media_body=media, fields='id')
+        return self.upload_resumable(request, path).get('id')
+
+
+class Checkpoint:
+    """Append-only JSONL log of the manifest jobs that finished, so a rerun skips the ones that succeeded.
+
+    A record holds the job's line number and a CRC of the line, so a job whose line was
+    edited since runs again. Completed lines are remembered in an array of eight bytes
+    per line, which keeps million-line manifests in bounded memory whatever order the
+    jobs finished in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = array('q')
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A record cut short by a crash
+                    if record.get('status') == 'ok':
+                        self._mark(record['line'], record['crc'])
+        except FileNotFoundError:
+            pass
+        self.file = open(path, 'a')
+
+    def _mark(self, line, crc):
+        if line >= len(self.done):
+            # Grow geometrically so marking lines in order stays linear
+            self.done.frombytes(bytes(8 * max(line + 1 - len(self.done), len(self.done))))
+        self.done[line] = crc + 1
+
+    def is_done(self, line, crc):
+        with self.lock:
+            return line < len(self.done) and self.done[line] == crc + 1
+
+    def record(self, line, crc, status, error=None):
+        record = {'line': line, 'crc': crc, 'status': status}
+        if error:
+            record['error'] = error
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            if status == 'ok':
+                self._mark(line, crc)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+# Run the upload, download, delete and list jobs of a JSONL manifest over one service
+class JobsFileOperation(StorageOperation):
+    # Jobs read ahead per worker, so the manifest is streamed rather than loaded
+    QUEUE_DEPTH = 4
+
+    def __init__(self, credentials, jobs_file, checkpoint=None, jobs=4, index=None, chunk_size=UPLOAD_CHUNK_SIZE,
+                 hash_cache=None, cwd=None, sessions=None):
+        super().__init__(credentials, index)
+        self.jobs_file = jobs_file
+        self.checkpoint_path = checkpoint or f"{jobs_file}.checkpoint"
+        self.jobs = max(1, jobs)
+        self.chunk_size = chunk_size
+        # Optional HashCache for uploads with "dedup"
+        self.hash_cache = hash_cache
+        # Relative paths in the manifest are relative to this directory
+        self.cwd = cwd or os.getcwd()
+        self.sessions = sessions if sessions is not None else UploadSessions()
+        self.remover = RemoveOperation(credentials, index=index)
+        self.output_lock = threading.Lock()
+        self.handlers = {'upload': self.upload_job, 'download': self.download_job, 'delete': self.delete_job,
+                         'list': self.list_job}
+
+    def execute(self):
+        if not os.path.isfile(self.jobs_file):
+            print(f"Error: The jobs file {self.jobs_file} does not exist.")
+            return None
+        counts = {'succeeded': 0, 'failed': 0, 'skipped': 0}
+        counts_lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.jobs * self.QUEUE_DEPTH)
+        checkpoint = Checkpoint(self.checkpoint_path)
+
+        def run(number, line, crc):
+            try:
+                self.run_job(json.loads(line))
+            except Exception as e:
+                checkpoint.record(number, crc, 'failed', str(e))
+                print(f"Job on line {number} failed: {e}")
+                kind = 'failed'
+            else:
+                checkpoint.record(number, crc, 'ok')
+                kind = 'succeeded'
+            finally:
+                slots.release()
+            with counts_lock:
+                counts[kind] += 1
+
+        try:
+            with WorkerPool(max_workers=self.jobs) as pool, open(self.jobs_file) as manifest:
+                for number, line in enumerate(manifest, 1):
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    crc = zlib.crc32(line.encode())
+                    if checkpoint.is_done(number, crc):
+                        with counts_lock:
+                            counts['skipped'] += 1
+                        continue
+                    slots.acquire()
+                    pool.submit(run, number, line, crc)
+        finally:
+            checkpoint.close()
+            if self.hash_cache:
+                self.hash_cache.flush()
+        print(f"Jobs summary: {counts['succeeded']} succeeded, {counts['failed']} failed, "
+              f"{counts['skipped']} skipped as already done")
+        return counts
+
+    def run_job(self, job):
+        handler = self.handlers.get(job.get('op'))
+        if handler is None:
+            raise ValueError(f"unknown op {job.get('op')!r}")
+        handler(job)
+
+    def folder_id(self, job, create=False):
+        """ID of the job's folder path, or None for the whole drive."""
+        if not job.get('folder'):
+            return None
+        folder_id = self.resolve_folder(job['folder'], create=create)
+        if not folder_id:
+            raise LookupError(f"folder '{job['folder']}' not found")
+        return folder_id
+
+    def find_one(self, job):
+        files = self.find_files(job['file'], self.folder_id(job), include_trashed=False)
+        if not files:
+            raise LookupError(f"no file named '{job['file']}'")
+        return files[0]
+
+    def upload_job(self, job):
+        path = os.path.join(self.cwd, job['path'])
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"{path} is not a file")
+        uploader = UploadOperation(self.credentials, path, jobs=1, index=self.index, chunk_size=self.chunk_size,
+                                   sessions=self.sessions, dedup=job.get('dedup', False), hash_cache=self.hash_cache,
+                                   compress=job.get('compress'))
+        uploader.upload_file(path, self.folder_id(job, create=True))
+
+    def download_job(self, job):
+        item = self.find_one(job)
+        destination = os.path.join(self.cwd, job.get('output', '.'))
+        target = local_path(destination, item['name'])
+        if target is None:
+            print(f"Skipping {item['name']}: not a valid local path")
+            return
+        os.makedirs(destination, exist_ok=True)
+        self.download_to(item['id'], target, item.get('modifiedTime'), self.get_compression(item))
+        print(f"Downloaded {item['name']} to {destination}")
+
+    def delete_job(self, job):
+        file_id = job.get('id') or self.find_one(job)['id']
+        self.remover.delete_file(file_id)
+        print(f"Removed file ID: {file_id}")
+
+    def list_job(self, job):
+        parent = self.folder_id(job) or 'root'
+        for page in iter_pages(self.service, f"'{parent}' in parents and trashed = false", LIST_FIELDS,
+                               http=self.http()):
+            rows = '\n'.join(json.dumps(dict(item, folder=job.get('folder', ''))) for item in page)
+            if rows:
+                # One write per page, so concurrent list jobs never interleave within a line
+                with self.output_lock:
+                    print(rows)
+
+
+# Follow the Drive changes feed, applying each change to a local mirror or printing it
+class WatchOperation(StorageOperation):
+    MAX_INTERVAL = 120.0  # Longest wait between two polls of an idle drive
+    CHANGE_FIELDS = ('nextPageToken, newStartPageToken, '
+                     'changes(fileId, removed, file(id, name, parents, mimeType, size, md5Checksum, modifiedTime, '
+                     'trashed, appProperties))')
+
+    def __init__(self, credentials, folder_name=None, mirror=None, output_format='text', interval=5.0, jobs=4,
+                 state_path=None, hash_cache=None, index=None):
+        super().__init__(credentials, index)
+        # Drive folder path to watch, or None for the whole drive
+        self.folder_name = folder_name
+        # Local directory kept identical to the folder, or None to only print the changes
+        self.mirror = os.path.abspath(mirror) if mirror else None
+        self.output_format = output_format
+        self.interval = interval
+        self.state_path = state_path or WatchState.STATE_FILE
+        self.downloader = DownloadOperation(credentials, jobs=jobs, index=index, hash_cache=hash_cache)
+        self.state = None
+        self.stopped = threading.Event()
+
+    def execute(self):
+        if not self.prepare():
+            return None
+        interval = self.interval
+        try:
+            while not self.stopped.is_set():
+                try:
+                    changed = self.poll()
+                except Exception as e:
+                    # The executor has already retried, keep watching at a slower pace
+                    print(f"Could not read the changes feed: {e}", file=sys.stderr)
+                    changed = 0
+                # Poll again soon after activity, back off while the drive is idle
+                interval = self.interval if changed else min(self.MAX_INTERVAL, interval * 2)
+                self.stopped.wait(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.state.close()
+        return self.state
+
+    def stop(self):
+        self.stopped.set()
+
+    def prepare(self):
+        """Load the saved cursor, or take a new one and list (and mirror) the watched folder once."""
+        self.state = WatchState(self.state_path)
+        if self.state.matches(self.folder_name, self.mirror):
+            return True
+
+        # Take the cursor first so changes made during the listing are replayed later
+        token = self._execute(self.service.changes().getStartPageToken())['startPageToken']
+        if self.folder_name:
+            folder_id = self.resolve_folder(self.folder_name)
+            if not folder_id:
+                print(f"Folder '{self.folder_name}' not found in Google Drive.")
+                return False
+        else:
+            folder_id = self._execute(self.service.files().get(fileId='root', fields='id'))['id']
+
+        self.state.reset(self.folder_name, self.mirror, folder_id, token)
+        with contextlib.redirect_stdout(sys.stderr if self.output_format == 'jsonl' else sys.stdout):
+            self.scan(folder_id, '')
+            print(f"Watching {self.folder_name or 'My Drive'} for changes...")
+        self.state.commit()
+        return True
+
+    def scan(self, folder_id, prefix):
+        """List (and mirror) the tree of a watched folder at ``prefix``, recording the paths in it.
+
+        Returns the (path, item) pairs found.
+        """
+        found = []
+
+        def remember(rel, item):
+            rel = prefix + rel + ('/' if item['mimeType'] == FOLDER_MIME_TYPE else '')
+            self.state.add(item['id'], rel)
+            found.append((rel, item))
+
+        if self.mirror:
+            root = self.local(prefix) if prefix else self.mirror
+            counts = self.downloader.download_tree(folder_id, root, on_item=remember)
+            print(f"Mirrored into {root}: " + ", ".join(f"{n} {kind}" for kind, n in counts.items()))
+        else:
+            for rel, item in self.walk(folder_id, 'id, name, mimeType', self.downloader.jobs,
+                                       extra_query='trashed = false'):
+                remember(rel, item)
+        return found
+
+    def poll(self):
+        """Apply the changes made since the saved cursor, returning how many there were."""
+        count = 0
+        page_token = self.state.get('page_token')
+        while page_token:
+            results = self._execute(self.service.changes().list(
+                pageToken=page_token, pageSize=1000, fields=self.CHANGE_FIELDS))
+            changes = results.get('changes', [])
+            # Folders first, so files created in a new folder find their parent
+            for change in sorted(changes, key=lambda c: (c.get('file') or {}).get('mimeType') != FOLDER_MIME_TYPE):
+                self.apply(change)
+            count += len(changes)
+            next_token = results.get('newStartPageToken') or results.get('nextPageToken')
+            # Saved with the page's paths, so a restart replays at most one page; an idle poll writes nothing
+            if next_token != page_token:
+                self.state.set('page_token', next_token)
+            self.state.commit()
+            page_token = results.get('nextPageToken')
+        return count
+
+    def path_of(self, item):
+        """The file's path inside the watched folder, or None if it is outside."""
+        for parent in item.get('parents', []):
+            parent_path = self.state.path_of(parent)
+            if parent_path is not None and (parent_path == '' or parent_path.endswith('/')):
+                rel = parent_path + item['name']
+                return rel + '/' if item['mimeType'] == FOLDER_MIME_TYPE else rel
+        return None
+
+    def local(self, rel):
+        return local_path(self.mirror, rel.rstrip('/'))
+
+    def apply(self, change):
+        file_id = change['fileId']
+        if file_id == self.state.get('folder_id'):
+            return
+        item = change.get('file')
+        old = self.state.path_of(file_id)
+        new = None
+        if item and not change.get('removed') and not item.get('trashed'):
+            new = self.path_of(item)
+        if new is None:
+            # Deleted, trashed or moved out of the watched folder
+            if old is not None:
+                self.forget(old)
+                self.emit('removed', file_id, old)
+            return
+        if self.mirror and self.local(new) is None:
+            print(f"Skipping {new}: not a valid local path", file=sys.stderr)
+            return
+
+        kind = 'added' if old is None else 'moved' if old != new else 'modified'
+        if new.endswith('/'):
+            self.move_folder(file_id, old, new)
+        else:
+            self.state.add(file_id, new)
+            if self.mirror:
+                self.mirror_file(item, old, new)
+        self.emit(kind, file_id, new, item, old)
+        if new.endswith('/') and old is None:
+            # A folder moved in or restored from the trash arrives alone, its files are not in the feed
+            with contextlib.redirect_stdout(sys.stderr if self.output_format == 'jsonl' else sys.stdout):
+                found = self.scan(file_id, new)
+            for rel, child in found:
+                self.emit('added', child['id'], rel, child)
+
+    def forget(self, old):
+        """Drop a path, and everything under it if it is a folder, from the state and the mirror."""
+        self.state.remove(old)
+        target = self.local(old) if self.mirror else None
+        if target and os.path.isdir(target):
+            shutil.rmtree(target)
+        elif target and os.path.exists(target):
+            os.remove(target)
+
+    def move_folder(self, folder_id, old, new):
+        if old is not None and old != new:
+            self.state.move(old, new)
+            if self.mirror and os.path.isdir(self.local(old)):
+                os.makedirs(os.path.dirname(self.local(new)), exist_ok=True)
+                os.replace(self.local(old), self.local(new))
+        self.state.add(folder_id, new)
+        if self.mirror:
+            os.makedirs(self.local(new), exist_ok=True)
+
+    def mirror_file(self, item, old, new):
+        destination = self.local(new)
+        if old is not None and old != new and self.local(old) and os.path.exists(self.local(old)):
+            if self.downloader.is_current(self.local(old), item):
+                # Renamed or moved without a content change, so move the local copy too
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                os.replace(self.local(old), destination)
+            else:
+                os.remove(self.local(old))
+        if 'md5Checksum' not in item or self.downloader.is_current(destination, item):
+            return
+        try:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            self.downloader.download_to(item['id'], destination, item.get('modifiedTime'), compression_of(item))
+        except Exception as e:
+            print(f"Failed to download {new}: {e}", file=sys.stderr)
+
+    def emit(self, kind, file_id, path, item=None, old=None):
+        path = path.rstrip('/')
+        old = old.rstrip('/') if old is not None else None
+        if self.output_format == 'jsonl':
+            event = {'event': kind, 'id': file_id, 'path': path}
+            if kind == 'moved':
+                event['old_path'] = old
+            for key in ('mimeType', 'size', 'md5Checksum', 'modifiedTime'):
+                if item and key in item:
+                    event[key] = item[key]
+            print(json.dumps(event), flush=True)
+        else:
+            print(f"{kind.capitalize()} {path}" + (f" (was {old})" if kind == 'moved' else ''), flush=True)
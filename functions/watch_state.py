@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+
+def _subtree_end(prefix):
+    """The smallest string sorting after every path that starts with ``prefix``, which ends with a slash."""
+    return prefix[:-1] + chr(ord('/') + 1)
+
+
+class WatchState:
+    """On-disk state of --watch: the changes feed cursor and the path of every watched file.
+
+    Paths are relative to the watched folder, with a trailing slash for folders. Changes are
+    written as they are applied and made durable by commit(), so each poll costs what it
+    changed rather than the size of the watched tree.
+    """
+    STATE_FILE = 'watch_state.db'  # File holding the cursor and the paths of the watched files
+
+    def __init__(self, path=None):
+        self.path = path or self.STATE_FILE
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript('''
+                CREATE TABLE IF NOT EXISTS paths (
+                    id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE INDEX IF NOT EXISTS paths_path ON paths (path);
+            ''')
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+
+    # -- cursor and settings --------------------------------------------
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def matches(self, folder, mirror):
+        """Whether the state was started for this folder and mirror, so the watch can resume from it."""
+        return (self.get('page_token') is not None and self.get('folder') == (folder or '')
+                and self.get('mirror') == (mirror or ''))
+
+    def reset(self, folder, mirror, folder_id, page_token):
+        """Start over for a new watch, forgetting every recorded path."""
+        with self.lock:
+            self.db.execute('DELETE FROM paths')
+            self.db.execute('DELETE FROM meta')
+        self.set('folder', folder or '')
+        self.set('mirror', mirror or '')
+        self.set('folder_id', folder_id)
+        self.set('page_token', page_token)
+        self.add(folder_id, '')
+
+    # -- paths ----------------------------------------------------------
+    def path_of(self, file_id):
+        with self.lock:
+            row = self.db.execute('SELECT path FROM paths WHERE id = ?', (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, file_id, path):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO paths (id, path) VALUES (?, ?)', (file_id, path))
+
+    def remove(self, path):
+        """Forget a path, and everything under it if it is a folder."""
+        with self.lock:
+            if path.endswith('/'):
+                self.db.execute('DELETE FROM paths WHERE path >= ? AND path < ?', (path, _subtree_end(path)))
+            else:
+                self.db.execute('DELETE FROM paths WHERE path = ?', (path,))
+
+    def move(self, old, new):
+        """Rename a folder path and everything under it."""
+        with self.lock:
+            self.db.execute('UPDATE paths SET path = ? || substr(path, ?) WHERE path >= ? AND path < ?',
+                            (new, len(old) + 1, old, _subtree_end(old)))
@@ -1,44 +1,260 @@
-from functions.auth import Authenticator
-from functions.storage_operations import UploadOperation, DownloadOperation, ListOperation, RemoveOperation
+import os
+import sys
+
 from functions.cli import CLI
 
+
+def needs_terminal(args):
+    """Whether the command uses this process's stdin or stdout, so it cannot run in the daemon."""
+    bulk_delete = args.pattern or args.folder or args.older_than is not None or args.ids_from_stdin
+    interactive = (args.download and not args.file and not args.folder) or (args.delete and not args.file and not bulk_delete)
+    streaming = (args.upload and '-' in args.upload) or (args.download and args.output == '-')
+    # --watch prints changes until it is interrupted
+    return interactive or args.ids_from_stdin or streaming or args.watch
+
+
+def runs_in_process(args):
+    """Whether the command must run in this process instead of being handed to a running daemon."""
+    # --stats and --trace describe this process. --refresh-index builds the on-disk index,
+    # while the daemon may only hold one in memory.
+    return (args.serve or args.no_daemon or needs_terminal(args) or args.stats or args.trace
+            or args.refresh_index)
+
+
+def supports_async(args):
+    """Whether the async engine implements the command; streaming, interactive and sync commands need threads."""
+    if args.sync or args.copy or args.move or args.jobs_file or args.watch or args.refresh_index or args.serve:
+        return False
+    if args.list:
+        return True
+    if args.upload:
+        return '-' not in args.upload and not args.dedup and not args.compress
+    if args.download:
+        return bool(args.file or args.folder) and not args.ranged and args.output != '-'
+    if args.delete:
+        return bool(args.file or args.pattern or args.folder or args.older_than is not None) and not args.ids_from_stdin
+    return False
+
+
+def list_filter(args):
+    """The ListFilter of the --list filter arguments."""
+    from functions.storage_operations import ListFilter
+
+    return ListFilter(args.mime_type, args.name_contains, args.name_prefix, args.modified_after,
+                      args.modified_before, None if args.trashed is None else args.trashed == 'true',
+                      args.owner, args.min_size, args.max_size)
+
+
+def create_async_operation(args, credentials, cwd):
+    """Create the asyncio engine's operation for a command that supports_async accepts."""
+    from functions.async_engine import AsyncListOperation, AsyncUploadOperation, AsyncDownloadOperation, \
+        AsyncRemoveOperation, AsyncBulkRemoveOperation
+    from functions.hash_cache import HashCache
+
+    if args.list:
+        return AsyncListOperation(credentials, recursive=args.recursive, output_format=args.format,
+                                  page_size=args.page_size, jobs=args.jobs, filters=list_filter(args),
+                                  fields=args.fields)
+    if args.upload:
+        return AsyncUploadOperation(credentials, [os.path.join(cwd, source) for source in args.upload], args.folder,
+                                    jobs=args.jobs, chunk_size=args.chunk_size * 1024 * 1024)
+    if args.download:
+        destination = os.path.join(cwd, args.output) if args.output else cwd
+        if args.file:
+            print(f"Downloading file: {args.file}")
+            return AsyncDownloadOperation(credentials, args.file, destination, jobs=args.jobs)
+        return AsyncDownloadOperation(credentials, None, destination, jobs=args.jobs, folder_name=args.folder,
+                                      recursive=args.recursive, hash_cache=HashCache())
+    if args.file:
+        print(f"Deleting file: {args.file}")
+        return AsyncRemoveOperation(credentials, args.file, args.folder, dry_run=args.dry_run)
+    return AsyncBulkRemoveOperation(credentials, args.pattern, args.folder, args.older_than, dry_run=args.dry_run)
+
+
+def create_operation(args, credentials, index=None, cwd=None):
+    """Create the operation selected by the command-line arguments."""
+    from functions.hash_cache import HashCache
+    from functions.storage_operations import UploadOperation, DownloadOperation, ListOperation, RemoveOperation, \
+        RefreshIndexOperation, BulkRemoveOperation, SyncOperation, JobsFileOperation, WatchOperation, CopyOperation
+
+    # Local paths are relative to the caller's directory, which is not ours in daemon mode
+    cwd = cwd or os.getcwd()
+    if args.engine == 'async':
+        return create_async_operation(args, credentials, cwd)
+
+    if args.refresh_index:
+        operation = RefreshIndexOperation(credentials, index)
+    elif args.sync:
+        local_dir, folder_name = args.sync
+        operation = SyncOperation(credentials, os.path.join(cwd, local_dir), folder_name, args.direction,
+                                  jobs=args.jobs, hash_cache=HashCache(), index=index,
+                                  chunk_size=args.chunk_size * 1024 * 1024)
+    elif args.copy or args.move:
+        source, destination = args.copy or args.move
+        operation = CopyOperation(credentials, source, destination, move=bool(args.move), jobs=args.jobs, index=index)
+    elif args.jobs_file:
+        operation = JobsFileOperation(credentials, os.path.join(cwd, args.jobs_file),
+                                      os.path.join(cwd, args.checkpoint) if args.checkpoint else None,
+                                      jobs=args.jobs, index=index, chunk_size=args.chunk_size * 1024 * 1024,
+                                      hash_cache=HashCache(), cwd=cwd)
+    elif args.watch:
+        operation = WatchOperation(credentials, args.folder, os.path.join(cwd, args.output) if args.output else None,
+                                   output_format=args.format, interval=args.poll_interval, jobs=args.jobs,
+                                   state_path=os.path.join(cwd, args.watch_state) if args.watch_state else None,
+                                   hash_cache=HashCache(), index=index)
+    elif args.list:
+        operation = ListOperation(credentials, recursive=args.recursive, output_format=args.format,
+                                  page_size=args.page_size, jobs=args.jobs, filters=list_filter(args),
+                                  fields=args.fields)
+    elif args.upload:
+        sources = [source if source == '-' else os.path.join(cwd, source) for source in args.upload]
+        operation = UploadOperation(credentials, sources, args.folder, jobs=args.jobs, index=index,
+                                    chunk_size=args.chunk_size * 1024 * 1024, name=args.file, dedup=args.dedup,
+                                    hash_cache=HashCache() if args.dedup or args.compress else None,
+                                    compress=args.compress)
+    elif args.download:
+        if args.output == '-':  # Stream the content to stdout, everything else goes to stderr
+            print(f"Downloading file: {args.file}", file=sys.stderr)
+            operation = DownloadOperation(credentials, args.file, cwd, jobs=args.jobs, index=index,
+                                          output=sys.stdout.buffer)
+        elif args.file:  # If --file is specified with the filename
+            print(f"Downloading file: {args.file}")
+            destination = os.path.join(cwd, args.output) if args.output else cwd
+            operation = DownloadOperation(credentials, args.file, destination, ranged=args.ranged, jobs=args.jobs,
+                                          index=index)
+        elif args.folder:  # Download every file of a folder, with its subfolders if --recursive
+            destination = os.path.join(cwd, args.output) if args.output else cwd
+            operation = DownloadOperation(credentials, None, destination, jobs=args.jobs, index=index,
+                                          folder_name=args.folder, recursive=args.recursive, hash_cache=HashCache())
+        else:  # If no file specified, list files and ask user to choose
+            print("Listing files to choose a file for download...")
+            operation = DownloadOperation(credentials, None, cwd, ranged=args.ranged, jobs=args.jobs, index=index)
+    elif args.file:  # If --file is specified with the filename, delete only that file, in --folder if given
+        print(f"Deleting file: {args.file}")
+        operation = RemoveOperation(credentials, args.file, index=index, folder_name=args.folder,
+                                    dry_run=args.dry_run)
+    elif args.pattern or args.folder or args.older_than is not None or args.ids_from_stdin:
+        operation = BulkRemoveOperation(credentials, args.pattern, args.folder, args.older_than,
+                                        ids=sys.stdin if args.ids_from_stdin else None,
+                                        dry_run=args.dry_run, index=index)
+    else:  # If no file specified, list files and ask user to choose
+        print("Listing files to choose a file for deletion...")
+        operation = RemoveOperation(credentials, index=index, dry_run=args.dry_run)
+    return operation
+
+
+def serve(args, credentials):
+    """Run the daemon, keeping the service, connections and metadata cache warm between commands."""
+    from functions.daemon import Daemon
+    from functions.metadata_index import MetadataIndex
+    from functions.storage_operations import get_service, get_http
+
+    service = get_service(credentials)
+    # Cache metadata in memory unless an on-disk index has been built
+    index = MetadataIndex(None if os.path.exists(MetadataIndex.INDEX_FILE) else ':memory:', ttl=args.index_ttl)
+    index.start(service, http=get_http(credentials))
+    parser = CLI().parser
+
+    def handle(argv, cwd):
+        request = parser.parse_args(argv)
+        if needs_terminal(request):
+            print("Error: interactive and stdin commands cannot run in the daemon.", file=sys.stderr)
+            raise SystemExit(2)
+        if request.refresh_index:
+            print("Error: --refresh-index runs in the client, not in the daemon.", file=sys.stderr)
+            raise SystemExit(2)
+        create_operation(request, credentials, None if request.no_index else index, cwd).execute()
+
+    daemon = Daemon(handle)
+    daemon.start()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+
+
 def main():
-    # Initialize CLI and parse arguments
+    # Initialize CLI and parse arguments before the Google client libraries are imported,
+    # so --help and argument errors return immediately
     cli = CLI()
     args = cli.parse_arguments()
+    if args.chunk_size < 1:
+        cli.parser.error("--chunk-size must be at least 1 MiB")
+    if args.upload and '-' in args.upload and (len(args.upload) > 1 or not args.file):
+        cli.parser.error("--upload - reads stdin on its own and needs --file to name the upload")
+    if args.output == '-' and not args.file:
+        cli.parser.error("--output - needs --file")
+    if args.refresh_index and args.no_index:
+        cli.parser.error("--refresh-index builds the metadata index and cannot be combined with --no-index")
+    if args.delete and args.file and (args.pattern or args.older_than is not None or args.ids_from_stdin):
+        cli.parser.error("--delete --file removes one file; it cannot be combined with --pattern, --older-than "
+                         "or --ids-from-stdin")
+    if args.compress:
+        from functions.compression import available
+        if not available(args.compress):
+            cli.parser.error(f"--compress {args.compress} needs the zstandard package: pip install zstandard")
+    if not (args.serve or args.refresh_index or args.sync or args.copy or args.move or args.jobs_file or args.watch
+            or args.list or args.upload or args.download or args.delete):
+        raise ValueError("Invalid command")
+    if args.engine == 'async' and not supports_async(args):
+        cli.parser.error("--engine async supports --list, --upload of paths, --download of a --file or --folder "
+                         "and --delete; use the default thread engine for this command")
+
+    # Hand the command to a running daemon, which already holds auth and open connections
+    if not runs_in_process(args):
+        from functions.daemon import forward
+        status = forward(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+
+    from functions import instrumentation
+    if args.stats or args.trace:
+        instrumentation.enable(args.trace)
+    try:
+        run(args)
+    finally:
+        recorder = instrumentation.disable()
+        if recorder and args.stats:
+            recorder.print_stats()
+
+
+def run(args):
+    """Authenticate and run the command in this process."""
+    from functions.auth import Authenticator
+    from functions.instrumentation import phase
+    from functions.metadata_index import MetadataIndex
+    from functions.rate_limit import configure
+
+    # Every request of this process shares one rate, bandwidth and concurrency budget
+    configure(args.max_rps, args.max_bandwidth * 1024 * 1024 if args.max_bandwidth else None)
 
     # Authenticate
     auth = Authenticator()
-    credentials = auth.authenticate()
+    with phase('auth'):
+        credentials = auth.authenticate()
 
     if not credentials:
         print("Authentication failed. Exiting.")
         return
 
-    # Create operation based on arguments
-    if args.list:
-        operation = ListOperation(credentials)
-    elif args.upload:
-        operation = UploadOperation(credentials, args.upload, args.folder)
-    elif args.download:
-        if args.file:  # If --file is specified with the filename
-            print(f"Downloading file: {args.file}")
-            operation = DownloadOperation(credentials, args.file)
-        else:  # If no file specified, list files and ask user to choose
-            print("Listing files to choose a file for download...")
-            operation = DownloadOperation(credentials)
-    elif args.delete:  # If --delete is specified
-        if args.file:  # If --file is specified with the filename
-            print(f"Deleting file: {args.file}")
-            operation = RemoveOperation(credentials, args.file)
-        else:  # If no file specified, list files and ask user to choose
-            print("Listing files to choose a file for deletion...")
-            operation = RemoveOperation(credentials)
-    else:
-        raise ValueError("Invalid command")
+    if args.serve or args.watch:
+        # Long-running commands outlive the token, so refresh it ahead of expiry instead of inside a request
+        auth.start_background_refresh()
+    if args.serve:
+        serve(args, credentials)
+        return
+
+    # Use the metadata index once it has been built with --refresh-index
+    index = None
+    if args.refresh_index or (not args.no_index and os.path.exists(MetadataIndex.INDEX_FILE)):
+        index = MetadataIndex(ttl=args.index_ttl)
 
-    # Execute operation
-    operation.execute()
+    # Create and execute the operation based on arguments
+    operation = create_operation(args, credentials, index)
+    with phase(f"operation:{type(operation).__name__}"):
+        operation.execute()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,685 @@
+"""A small in-process stand-in for the Drive v3 REST API.
+
+Only the parts of the API used by googD are implemented. Point the storage
+operations at it by setting ``GOOGD_API_ENDPOINT`` to ``server.endpoint``.
+``FakeDrive(latency=..., bandwidth=..., error_rate=...)`` simulates a slow or
+flaky network for the benchmarks.
+"""
+import email
+import hashlib
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import unittest
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from google.auth.credentials import AnonymousCredentials
+
+from functions.rate_limit import RequestExecutor
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# Owner of the files the fake creates, pass owner= to add_file for someone else's file
+OWNER = {'kind': 'drive#user', 'emailAddress': 'me@example.com', 'me': True}
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class QueryError(ValueError):
+    pass
+
+
+# Tokens of the Drive query language: strings, keywords/fields, operators and parentheses
+_TOKEN_RE = re.compile(r"\s*(?:('(?:\\.|[^'\\])*')|(!=|<=|>=|=|<|>)|([(){}])|([A-Za-z_][\w.]*))")
+
+
+def _tokenize(query):
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        match = _TOKEN_RE.match(query, pos)
+        if not match or match.end() == pos:
+            raise QueryError(f"Invalid query near: {query[pos:]!r}")
+        string, op, paren, word = match.groups()
+        if string is not None:
+            tokens.append(('str', re.sub(r"\\(.)", r"\1", string[1:-1])))
+        elif op is not None:
+            tokens.append(('op', op))
+        elif paren is not None:
+            tokens.append(('paren', paren))
+        else:
+            tokens.append(('word', word))
+        pos = match.end()
+        while pos < len(query) and query[pos].isspace():
+            pos += 1
+    return tokens
+
+
+class _QueryParser:
+    """Recursive descent parser producing a predicate over file metadata."""
+
+    def __init__(self, query):
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def parse(self):
+        predicate = self._or()
+        if self.pos != len(self.tokens):
+            raise QueryError(f"Unexpected token {self.tokens[self.pos]!r}")
+        return predicate
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _is_word(self, word):
+        kind, value = self._peek()
+        return kind == 'word' and value.lower() == word
+
+    def _or(self):
+        left = self._and()
+        while self._is_word('or'):
+            self._next()
+            right = self._and()
+            left = (lambda a, b: lambda f: a(f) or b(f))(left, right)
+        return left
+
+    def _and(self):
+        left = self._not()
+        while self._is_word('and'):
+            self._next()
+            right = self._not()
+            left = (lambda a, b: lambda f: a(f) and b(f))(left, right)
+        return left
+
+    def _not(self):
+        if self._is_word('not'):
+            self._next()
+            inner = self._not()
+            return lambda f: not inner(f)
+        return self._term()
+
+    def _value(self):
+        kind, value = self._next()
+        if kind == 'str':
+            return value
+        if kind == 'word' and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        if kind == 'word' and value.isdigit():
+            return int(value)
+        raise QueryError(f"Expected a value, got {value!r}")
+
+    def _term(self):
+        kind, value = self._peek()
+        if kind == 'paren' and value == '(':
+            self._next()
+            inner = self._or()
+            if self._next() != ('paren', ')'):
+                raise QueryError("Unbalanced parentheses")
+            return inner
+        if kind == 'str':
+            # 'value' in parents / owners
+            literal = self._value()
+            if not self._is_word('in'):
+                raise QueryError("Expected 'in'")
+            self._next()
+            _, field = self._next()
+            if field == 'owners':
+                return lambda f: any(literal in (owner['emailAddress'], 'me' if owner.get('me') else None)
+                                     for owner in f.get('owners', []))
+            return lambda f: literal in f.get(field, [])
+        if kind != 'word':
+            raise QueryError(f"Unexpected token {value!r}")
+        field = self._next()[1]
+        if field in ('appProperties', 'properties') and self._is_word('has'):
+            self._next()
+            return self._has(field)
+        op_kind, op = self._next()
+        if op_kind == 'word' and op.lower() == 'contains':
+            literal = self._value()
+            if field == 'name':
+                return lambda f: literal.lower() in f.get('name', '').lower()
+            return lambda f: literal in str(f.get(field, ''))
+        if op_kind != 'op':
+            raise QueryError(f"Expected an operator after {field!r}")
+        literal = self._value()
+        return self._compare(field, op, literal)
+
+    def _has(self, field):
+        if self._next() != ('paren', '{'):
+            raise QueryError("Expected '{'")
+        pairs = {}
+        while True:
+            _, key = self._next()
+            self._next()  # '='
+            pairs[key] = self._value()
+            if self._is_word('and'):
+                self._next()
+                continue
+            break
+        if self._next() != ('paren', '}'):
+            raise QueryError("Expected '}'")
+        return lambda f: f.get(field, {}).get(pairs.get('key')) == pairs.get('value')
+
+    @staticmethod
+    def _compare(field, op, literal):
+        def predicate(f):
+            value = f.get(field)
+            if field == 'size':
+                value = int(value) if value is not None else None
+                if value is None:
+                    return False
+            if field == 'trashed':
+                value = bool(value)
+            if value is None:
+                return op == '!='
+            return {
+                '=': value == literal,
+                '!=': value != literal,
+                '<': value < literal,
+                '<=': value <= literal,
+                '>': value > literal,
+                '>=': value >= literal,
+            }[op]
+        return predicate
+
+
+def parse_query(query):
+    """Compile a Drive ``q`` expression into a predicate over file metadata."""
+    if not query:
+        return lambda f: True
+    return _QueryParser(query).parse()
+
+
+def _split_fields(spec):
+    """Split a fields selector on top-level commas."""
+    parts, depth, current = [], 0, ''
+    for char in spec:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def project(resource, fields):
+    """Apply a partial-response ``fields`` selector to a resource."""
+    if not fields or fields == '*':
+        return resource
+    result = {}
+    for part in _split_fields(fields):
+        if '(' in part:
+            key, inner = part.split('(', 1)
+            inner = inner[:-1]
+            if key in resource:
+                value = resource[key]
+                result[key] = [project(item, inner) for item in value] \
+                    if isinstance(value, list) else project(value, inner)
+        else:
+            key = part.split('/')[0]
+            if key in resource:
+                result[key] = resource[key]
+    return result
+
+
+class FakeDrive:
+    """In-memory file store shared by all request handlers."""
+
+    def __init__(self, latency=0.0, bandwidth=None, error_rate=0.0, seed=0):
+        self.lock = threading.Lock()
+        # Network conditions: seconds added to every round trip, bytes per second for
+        # request and response bodies, and the share of requests failing with a 503
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.files = {}
+        self.content = {}
+        self.sessions = {}
+        self.requests = []
+        # IDs of changed files, the position in this list is the change cursor
+        self.changes = []
+        # Pending injected failures: [method, path regex, status, remaining count]
+        self.faults = []
+        self._ids = itertools.count(1)
+
+    def inject_error(self, method, path_pattern, status=500, times=1):
+        """Fail the next matching requests with the given HTTP status."""
+        with self.lock:
+            self.faults.append([method, re.compile(path_pattern), status, times])
+
+    def take_fault(self, method, path):
+        with self.lock:
+            for fault in self.faults:
+                if fault[0] == method and fault[1].fullmatch(path) and fault[3] > 0:
+                    fault[3] -= 1
+                    return fault[2]
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 503
+        return None
+
+    def transfer_delay(self, nbytes):
+        if self.bandwidth and nbytes:
+            time.sleep(nbytes / self.bandwidth)
+
+    def new_id(self):
+        return f"fake{next(self._ids):08d}"
+
+    def add_file(self, name, content=b'', parents=('root',), mime_type='text/plain', **extra):
+        with self.lock:
+            return self._insert({'name': name, 'mimeType': mime_type, 'parents': list(parents), **extra}, content)
+
+    def add_folder(self, name, parent='root'):
+        return self.add_file(name, None, parents=(parent,), mime_type=FOLDER_MIME_TYPE)
+
+    def update_file(self, file_id, content=None, add_parents=None, remove_parents=None, **metadata):
+        with self.lock:
+            self._update(file_id, metadata, content, add_parents, remove_parents)
+
+    def find(self, name, parent=None):
+        with self.lock:
+            return [dict(f) for f in self.files.values()
+                    if f['name'] == name and (parent is None or parent in f.get('parents', []))]
+
+    def children(self, parent):
+        with self.lock:
+            return [dict(f) for f in self.files.values() if parent in f.get('parents', [])]
+
+    def _insert(self, metadata, content):
+        file_id = self.new_id()
+        now = _now()
+        resource = {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': metadata.get('name', 'Untitled'),
+            'mimeType': metadata.get('mimeType') or 'application/octet-stream',
+            'parents': list(metadata.get('parents') or ['root']),
+            'createdTime': now,
+            'modifiedTime': metadata.get('modifiedTime', now),
+            'trashed': False,
+            'owners': [dict(metadata.get('owner') or OWNER)],
+        }
+        resource['ownedByMe'] = resource['owners'][0].get('me', False)
+        for key in ('appProperties', 'properties', 'description'):
+            if key in metadata:
+                resource[key] = dict(metadata[key]) if isinstance(metadata[key], dict) else metadata[key]
+        # Folders and Google Docs have no binary content
+        if not resource['mimeType'].startswith('application/vnd.google-apps.'):
+            content = content or b''
+            self.content[file_id] = content
+            resource['size'] = str(len(content))
+            resource['md5Checksum'] = hashlib.md5(content).hexdigest()
+        self.files[file_id] = resource
+        self.changes.append(file_id)
+        return file_id
+
+    def _update(self, file_id, metadata, content=None, add_parents=None, remove_parents=None):
+        resource = self.files[file_id]
+        for key in ('name', 'mimeType', 'description', 'trashed'):
+            if key in metadata:
+                resource[key] = metadata[key]
+        for key in ('appProperties', 'properties'):
+            if key in metadata:
+                merged = dict(resource.get(key, {}), **metadata[key])
+                resource[key] = {k: v for k, v in merged.items() if v is not None}
+        parents = [p for p in resource['parents'] if p not in (remove_parents or '').split(',')]
+        resource['parents'] = parents + [p for p in (add_parents or '').split(',') if p and p not in parents]
+        if content is not None:
+            self.content[file_id] = content
+            resource['size'] = str(len(content))
+            resource['md5Checksum'] = hashlib.md5(content).hexdigest()
+        resource['modifiedTime'] = metadata.get('modifiedTime', _now())
+        self.changes.append(file_id)
+
+    def _remove(self, file_id):
+        for child_id in [i for i, f in self.files.items() if file_id in f.get('parents', [])]:
+            self._remove(child_id)
+        self.files.pop(file_id, None)
+        self.content.pop(file_id, None)
+        self.changes.append(file_id)
+
+    def remove(self, file_id):
+        with self.lock:
+            self._remove(file_id)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeDrive/1.0'
+    # Headers and body are written separately; without this, delayed ACKs add 40 ms to some responses
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- plumbing -------------------------------------------------------
+    @property
+    def drive(self):
+        return self.server.drive
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.drive.transfer_delay(length)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.drive.transfer_delay(len(body))
+            self.wfile.write(body)
+
+    def _error(self, status, message, reason='notFound'):
+        self._send(status, {'error': {'code': status, 'message': message,
+                                      'errors': [{'reason': reason, 'message': message}]}})
+
+    def _dispatch(self):
+        if self.drive.latency:
+            time.sleep(self.drive.latency)
+        self._handle(self.command, self.path, self._read_body())
+
+    def _handle(self, method, target, body):
+        parsed = urllib.parse.urlsplit(target)
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items()}
+        path = parsed.path
+        with self.drive.lock:
+            self.drive.requests.append((method, path, self.headers.get('Range')))
+        status = self.drive.take_fault(method, path)
+        if status:
+            return self._error(status, "Injected failure", reason='backendError')
+        self.route(method, path, params, body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = lambda self: self._dispatch()
+
+    # -- routing --------------------------------------------------------
+    def route(self, method, path, params, body):
+        match = re.fullmatch(r'/drive/v3/files/([^/]+)', path)
+        if path == '/drive/v3/files' and method == 'GET':
+            return self.list_files(params)
+        if path == '/drive/v3/files' and method == 'POST':
+            return self.create_file(params, json.loads(body or b'{}'), None)
+        if path == '/upload/drive/v3/files' and method == 'POST':
+            return self.start_upload(params, body)
+        upload_match = re.fullmatch(r'/upload/drive/v3/files/([^/]+)', path)
+        if upload_match and method == 'PATCH':
+            return self.start_upload(params, body, upload_match.group(1))
+        if path == '/batch/drive/v3' and method == 'POST':
+            return self.batch(body)
+        if path.startswith('/upload/session/') and method == 'PUT':
+            return self.upload_chunk(path.rsplit('/', 1)[1], body)
+        if path == '/drive/v3/changes/startPageToken' and method == 'GET':
+            return self.start_page_token()
+        if path == '/drive/v3/changes' and method == 'GET':
+            return self.list_changes(params)
+        if match and method == 'GET':
+            return self.get_file(match.group(1), params)
+        if match and method == 'PATCH':
+            return self.save_file(params, json.loads(body or b'{}'), None, match.group(1))
+        if match and method == 'DELETE':
+            return self.delete_file(match.group(1))
+        copy_match = re.fullmatch(r'/drive/v3/files/([^/]+)/copy', path)
+        if copy_match and method == 'POST':
+            return self.copy_file(copy_match.group(1), params, json.loads(body or b'{}'))
+        return self._error(404, f"Unknown endpoint {method} {path}")
+
+    # -- endpoints ------------------------------------------------------
+    def list_files(self, params):
+        try:
+            predicate = parse_query(params.get('q'))
+        except QueryError as e:
+            return self._error(400, str(e), reason='invalid')
+        page_size = min(int(params.get('pageSize') or 100), 1000)
+        offset = int(params.get('pageToken') or 0)
+        with self.drive.lock:
+            matches = [f for f in self.drive.files.values() if predicate(f)]
+        page = matches[offset:offset + page_size]
+        response = {'kind': 'drive#fileList', 'files': [dict(f) for f in page]}
+        if offset + page_size < len(matches):
+            response['nextPageToken'] = str(offset + page_size)
+        self._send(200, project(response, params.get('fields')))
+
+    def get_file(self, file_id, params):
+        with self.drive.lock:
+            resource = self.drive.files.get(file_id)
+            content = self.drive.content.get(file_id)
+        if file_id == 'root':
+            resource = {'kind': 'drive#file', 'id': 'root', 'name': 'My Drive', 'mimeType': FOLDER_MIME_TYPE}
+        if resource is None:
+            return self._error(404, f"File not found: {file_id}.")
+        if params.get('alt') != 'media':
+            return self._send(200, project(dict(resource), params.get('fields')))
+        if content is None:
+            return self._error(403, "Only files with binary content can be downloaded.",
+                               reason='fileNotDownloadable')
+        range_header = self.headers.get('Range')
+        if not range_header:
+            return self._send(200, content, 'application/octet-stream')
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+        start = int(match.group(1) or 0)
+        end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+        if start >= len(content) and content:
+            return self._send(416, b'', headers={'Content-Range': f'bytes */{len(content)}'})
+        chunk = content[start:end + 1]
+        self._send(206, chunk, 'application/octet-stream',
+                   {'Content-Range': f'bytes {start}-{start + len(chunk) - 1}/{len(content)}'})
+
+    def create_file(self, params, metadata, content):
+        self.save_file(params, metadata, content)
+
+    def save_file(self, params, metadata, content, file_id=None):
+        """Create a file, or update an existing one when file_id is given."""
+        with self.drive.lock:
+            if file_id is None:
+                file_id = self.drive._insert(metadata, content)
+            elif file_id in self.drive.files:
+                self.drive._update(file_id, metadata, content, params.get('addParents'), params.get('removeParents'))
+            else:
+                file_id = None
+            resource = dict(self.drive.files[file_id]) if file_id else None
+        if resource is None:
+            return self._error(404, "File not found.")
+        self._send(200, project(resource, params.get('fields')))
+
+    def copy_file(self, file_id, params, metadata):
+        """Copy a file's metadata and content server-side; like Drive, folders cannot be copied."""
+        with self.drive.lock:
+            source = self.drive.files.get(file_id)
+            if source is None or source['mimeType'] == FOLDER_MIME_TYPE:
+                resource = None
+            else:
+                copied = {key: source[key] for key in ('name', 'mimeType', 'parents', 'appProperties', 'properties',
+                                                       'description') if key in source}
+                copied.update(metadata)
+                resource = dict(self.drive.files[self.drive._insert(copied, self.drive.content.get(file_id))])
+        if resource is None:
+            if source is None:
+                return self._error(404, f"File not found: {file_id}.")
+            return self._error(403, "Folders cannot be copied.", reason='fileNotCopyable')
+        self._send(200, project(resource, params.get('fields')))
+
+    def start_upload(self, params, body, file_id=None):
+        upload_type = params.get('uploadType')
+        if upload_type == 'resumable':
+            metadata = json.loads(body or b'{}')
+            with self.drive.lock:
+                session_id = self.drive.new_id()
+                self.drive.sessions[session_id] = {'metadata': metadata, 'data': bytearray(), 'file_id': file_id,
+                                                   'params': params, 'fields': params.get('fields')}
+            host = self.headers.get('Host')
+            return self._send(200, b'', headers={'Location': f'http://{host}/upload/session/{session_id}'})
+        if upload_type == 'multipart':
+            message = email.message_from_bytes(
+                b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+            parts = message.get_payload()
+            metadata = json.loads(parts[0].get_payload(decode=True) or b'{}')
+            content = parts[1].get_payload(decode=True)
+            return self.save_file(params, metadata, content, file_id)
+        if upload_type == 'media':
+            return self.save_file(params, {}, body, file_id)
+        return self._error(400, f"Unsupported uploadType {upload_type}", reason='invalid')
+
+    def upload_chunk(self, session_id, body):
+        with self.drive.lock:
+            session = self.drive.sessions.get(session_id)
+        if session is None:
+            return self._error(404, "Upload session expired.")
+        # Without a Content-Range the body is the complete (possibly empty) upload
+        content_range = self.headers.get('Content-Range') or f'bytes 0-{len(body) - 1}/{len(body)}'
+        if not body and 'Content-Range' not in self.headers:
+            content_range = 'bytes */0'
+        match = re.fullmatch(r'bytes (\*|(\d+)-(\d+))/(\*|\d+)', content_range.strip())
+        if not match:
+            return self._error(400, f"Bad Content-Range {content_range!r}", reason='invalid')
+        _, start, _, total = match.groups()
+        data = session['data']
+        if start is not None:
+            if int(start) != len(data):
+                return self._send(308, b'', headers=self._range_header(data))
+            data.extend(body)
+        if total != '*' and len(data) >= int(total):
+            with self.drive.lock:
+                self.drive.sessions.pop(session_id, None)
+            return self.save_file(session['params'], session['metadata'], bytes(data), session['file_id'])
+        self._send(308, b'', headers=self._range_header(data))
+
+    @staticmethod
+    def _range_header(data):
+        return {'Range': f'bytes=0-{len(data) - 1}'} if data else {}
+
+    def delete_file(self, file_id):
+        with self.drive.lock:
+            missing = file_id not in self.drive.files
+            if not missing:
+                self.drive._remove(file_id)
+        if missing:
+            return self._error(404, f"File not found: {file_id}.")
+        self._send(204, b'')
+
+    def batch(self, body):
+        """Run each application/http part of a multipart/mixed batch and collect the raw responses."""
+        message = email.message_from_bytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+        boundary = 'batch_' + self.drive.new_id()
+        output = b''
+        saved = self.wfile, self.headers, self.command
+        try:
+            for part in message.get_payload():
+                raw = part.get_payload().replace('\r\n', '\n')
+                head, _, sub_body = raw.partition('\n\n')
+                request_line, _, header_text = head.partition('\n')
+                method, target = request_line.split(' ')[:2]
+                self.wfile = io.BytesIO()
+                self.command = method
+                self.headers = email.message_from_string(header_text + '\n\n')
+                self._handle(method, target, sub_body.encode())
+                content_id = part['Content-ID'].strip('<>')
+                output += (f'--{boundary}\r\nContent-Type: application/http\r\n'
+                           f'Content-ID: <response-{content_id}>\r\n\r\n').encode()
+                output += self.wfile.getvalue() + b'\r\n'
+        finally:
+            self.wfile, self.headers, self.command = saved
+        output += f'--{boundary}--\r\n'.encode()
+        self._send(200, output, f'multipart/mixed; boundary={boundary}')
+
+    def start_page_token(self):
+        with self.drive.lock:
+            token = str(len(self.drive.changes))
+        self._send(200, {'kind': 'drive#startPageToken', 'startPageToken': token})
+
+    def list_changes(self, params):
+        page_size = min(int(params.get('pageSize') or 100), 1000)
+        start = int(params['pageToken'])
+        with self.drive.lock:
+            file_ids = self.drive.changes[start:start + page_size]
+            end = start + len(file_ids)
+            changes = []
+            for file_id in file_ids:
+                resource = self.drive.files.get(file_id)
+                change = {'kind': 'drive#change', 'changeType': 'file', 'fileId': file_id,
+                          'removed': resource is None}
+                if resource is not None:
+                    change['file'] = dict(resource)
+                changes.append(change)
+            more = end < len(self.drive.changes)
+        response = {'kind': 'drive#changeList', 'changes': changes}
+        if more:
+            response['nextPageToken'] = str(end)
+        else:
+            response['newStartPageToken'] = str(end)
+        self._send(200, project(response, params.get('fields')))
+
+
+class _Server(ThreadingHTTPServer):
+    # Room for a burst of new connections from many concurrent clients
+    request_queue_size = 128
+
+
+class FakeDriveServer:
+    """Runs a :class:`FakeDrive` behind an HTTP server on a background thread."""
+
+    def __init__(self, drive=None):
+        self.drive = drive or FakeDrive()
+        self.httpd = _Server(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.drive = self.drive
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeDriveTestCase(unittest.TestCase):
+    """Test case that points every storage operation at a fresh fake Drive."""
+
+    def setUp(self):
+        self.server = FakeDriveServer().start()
+        self.addCleanup(self.server.stop)
+        self.drive = self.server.drive
+        patcher = patch('functions.storage_operations.API_ENDPOINT', self.server.endpoint)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Retry injected failures without the production backoff delays
+        patcher = patch('functions.rate_limit._executor', RequestExecutor(base_delay=0.01, max_delay=0.05))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.credentials = AnonymousCredentials()
@@ -0,0 +1,231 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from functions import async_engine
+from functions.async_engine import AsyncBulkRemoveOperation, AsyncDownloadOperation, AsyncDrive, \
+    AsyncListOperation, AsyncRemoveOperation, AsyncRequestExecutor, AsyncUploadOperation
+from functions.storage_operations import DownloadOperation, ListFilter, UploadOperation
+from tests.fake_drive import FakeDriveTestCase
+
+
+class AsyncEngineTestCase(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.stdout = io.StringIO()
+        patcher = patch('sys.stdout', self.stdout)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('sys.stderr', new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+
+class TestAsyncDrive(AsyncEngineTestCase):
+
+    def test_connections_are_kept_alive(self):
+        for i in range(5):
+            self.drive.add_file(f'file{i}.txt')
+
+        async def run():
+            drive = AsyncDrive(self.credentials)
+            try:
+                for i in range(5):
+                    await drive.find(f'file{i}.txt')
+                return drive.http.opened
+            finally:
+                await drive.close()
+
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_errors_are_retried(self):
+        self.drive.add_file('report.txt', b'hello')
+        self.drive.inject_error('GET', '/drive/v3/files$', status=503, times=2)
+
+        async def run():
+            drive = AsyncDrive(self.credentials)
+            try:
+                return await drive.find('report.txt')
+            finally:
+                await drive.close()
+
+        self.assertEqual([item['name'] for item in asyncio.run(run())], ['report.txt'])
+
+
+    def test_throttling_lowers_concurrency(self):
+        self.drive.add_file('report.txt')
+        self.drive.inject_error('GET', '/drive/v3/files$', status=429)
+        executor = AsyncRequestExecutor(concurrency=16)
+
+        async def run():
+            drive = AsyncDrive(self.credentials, executor)
+            try:
+                return await drive.find('report.txt')
+            finally:
+                await drive.close()
+
+        self.assertEqual(len(asyncio.run(run())), 1)
+        self.assertLess(executor.concurrency.limit, 16)
+
+
+class TestAsyncOperations(AsyncEngineTestCase):
+
+    def test_list_recursive_with_filters(self):
+        docs = self.drive.add_folder('docs')
+        deep = self.drive.add_folder('deep', docs)
+        self.drive.add_file('a.pdf', parents=[docs], mime_type='application/pdf')
+        self.drive.add_file('b.pdf', parents=[deep], mime_type='application/pdf')
+        self.drive.add_file('c.txt', parents=[deep])
+
+        AsyncListOperation(self.credentials, recursive=True, output_format='jsonl',
+                           filters=ListFilter(mime_type='application/pdf')).execute()
+
+        rows = [json.loads(line) for line in self.stdout.getvalue().splitlines()]
+        self.assertEqual(sorted(row['path'] for row in rows), ['docs/a.pdf', 'docs/deep/b.pdf'])
+
+    def test_upload_small_and_chunked_files(self):
+        small = self.write('tree/small.txt', b'small')
+        large = self.write('tree/large.bin', os.urandom(2500))
+
+        results = AsyncUploadOperation(self.credentials, [os.path.join(self.tmp.name, 'tree')], 'backups/2026',
+                                       chunk_size=1024).execute()
+
+        self.assertEqual(sorted(path for path, _, error in results if not error), [large, small])
+        tree = self.drive.find('tree')[0]
+        uploaded = {f['name']: self.drive.content[f['id']] for f in self.drive.children(tree['id'])}
+        self.assertEqual(uploaded['small.txt'], b'small')
+        with open(large, 'rb') as f:
+            self.assertEqual(uploaded['large.bin'], f.read())
+        # The large file took a session and three chunks
+        self.assertEqual(sum(1 for r in self.drive.requests if r[0] == 'PUT'), 3)
+
+    def test_download_file_and_folder(self):
+        self.drive.add_file('report.txt', b'hello world')
+        alpha = self.drive.add_folder('alpha')
+        src = self.drive.add_folder('src', alpha)
+        self.drive.add_file('main.py', b'print(1)', parents=[src])
+        self.drive.inject_error('GET', '/drive/v3/files/[^/]+$', status=500)
+
+        AsyncDownloadOperation(self.credentials, 'report.txt', self.tmp.name).execute()
+        counts = AsyncDownloadOperation(self.credentials, None, self.tmp.name, folder_name='alpha',
+                                        recursive=True).execute()
+
+        with open(os.path.join(self.tmp.name, 'report.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'hello world')
+        with open(os.path.join(self.tmp.name, 'alpha', 'src', 'main.py'), 'rb') as f:
+            self.assertEqual(f.read(), b'print(1)')
+        self.assertEqual(counts, {'downloaded': 1, 'unchanged': 0, 'skipped': 0, 'failed': 0})
+        self.assertFalse([name for name in os.listdir(self.tmp.name) if name.endswith('.part')])
+
+    @patch.object(DownloadOperation, 'QUEUE_DEPTH', 2)
+    def test_folder_download_queue_is_bounded(self):
+        logs = self.drive.add_folder('logs')
+        for i in range(30):
+            self.drive.add_file(f'{i:02d}.log', b'x', parents=[logs])
+        download = AsyncDrive.download
+        tasks = []
+
+        async def counting_download(drive, *args):
+            tasks.append(sum(1 for task in asyncio.all_tasks() if task.get_coro().__name__ == 'fetch'))
+            await download(drive, *args)
+
+        with patch.object(AsyncDrive, 'download', counting_download):
+            counts = AsyncDownloadOperation(self.credentials, None, self.tmp.name, jobs=2,
+                                            folder_name='logs').execute()
+
+        self.assertEqual(counts['downloaded'], 30)
+        # At most jobs * QUEUE_DEPTH downloads were queued at once
+        self.assertLessEqual(max(tasks), 4)
+
+    def test_download_decompresses_gzip_uploads(self):
+        data = b'line\n' * 10000
+        path = self.write('upload/app.log', data)
+        UploadOperation(self.credentials, path, compress='gzip').execute()
+        destination = os.path.join(self.tmp.name, 'out')
+        os.makedirs(destination)
+
+        AsyncDownloadOperation(self.credentials, 'app.log', destination).execute()
+
+        with open(os.path.join(destination, 'app.log'), 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_remove_by_name_and_pattern(self):
+        self.drive.add_file('keep.txt')
+        self.drive.add_file('old.txt')
+        for i in range(30):
+            self.drive.add_file(f'scratch{i}.tmp')
+
+        AsyncRemoveOperation(self.credentials, 'old.txt').execute()
+        failed = AsyncBulkRemoveOperation(self.credentials, pattern='*.tmp').execute()
+
+        self.assertEqual(failed, [])
+        self.assertEqual(sorted(f['name'] for f in self.drive.children('root')), ['keep.txt'])
+        self.assertIn("Removed 30 files, 0 failed", self.stdout.getvalue())
+
+    def test_bulk_remove_reports_connection_failures_and_continues(self):
+        broken = self.drive.add_file('broken.tmp')
+        for i in range(5):
+            self.drive.add_file(f'scratch{i}.tmp')
+        delete = AsyncDrive.delete
+
+        async def flaky_delete(drive, file_id):
+            if file_id == broken:
+                raise ConnectionError('connection reset')
+            await delete(drive, file_id)
+
+        with patch.object(AsyncDrive, 'delete', flaky_delete):
+            failed = AsyncBulkRemoveOperation(self.credentials, pattern='*.tmp').execute()
+
+        self.assertEqual(failed, [broken])
+        self.assertEqual([f['name'] for f in self.drive.children('root')], ['broken.tmp'])
+        self.assertIn(f"Failed to remove broken.tmp (ID: {broken}): connection reset", self.stdout.getvalue())
+        self.assertIn("Removed 5 files, 1 failed", self.stdout.getvalue())
+
+    def test_bulk_remove_dry_run_deletes_nothing(self):
+        self.drive.add_file('a.tmp')
+
+        targets = AsyncBulkRemoveOperation(self.credentials, pattern='*.tmp', dry_run=True).execute()
+
+        self.assertEqual([name for _, name in targets], ['a.tmp'])
+        self.assertEqual(len(self.drive.children('root')), 1)
+
+
+class TestAsyncHttpClient(unittest.TestCase):
+
+    def test_chunked_response_is_decoded(self):
+        async def handle(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n')
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            client = async_engine.AsyncHttpClient()
+            try:
+                return await client.request('GET', f'http://127.0.0.1:{port}/')
+            finally:
+                await client.close()
+                server.close()
+
+        response = asyncio.run(run())
+        self.assertEqual((response.status, response.body), (200, b'hello world'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,76 +1,118 @@
+import json
 import os
-import pickle
+import tempfile
+import threading
 import unittest
-from unittest import mock
-from unittest.mock import patch, Mock, MagicMock
+from datetime import timedelta
+from unittest.mock import patch
 
-from google.auth.credentials import AnonymousCredentials
+from google.oauth2.credentials import Credentials
 
-from functions.auth import Authenticator
+from functions.auth import Authenticator, _utcnow
+
+
+def make_credentials(token='access', expires_in=3600):
+    return Credentials(token=token, refresh_token='refresh', client_id='client', client_secret='secret',
+                       token_uri='https://oauth2.googleapis.com/token',
+                       expiry=_utcnow() + timedelta(seconds=expires_in))
+
+
+def fake_refresh(credentials, request):
+    credentials.token = 'refreshed'
+    credentials.expiry = _utcnow() + timedelta(hours=1)
 
 
 class TestAuthenticator(unittest.TestCase):
 
-    @patch('functions.auth.pickle.load', return_value=None)
-    @patch('functions.auth.pickle.dump')
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.token_file = os.path.join(self.tmp.name, 'token.json')
+        patcher = patch.object(Authenticator, 'CREDENTIALS_FILE', self.token_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Authenticator._cache.clear()
+        self.addCleanup(Authenticator._cache.clear)
+
+    def store(self, credentials):
+        with open(self.token_file, 'w') as f:
+            f.write(credentials.to_json())
+
     @patch('functions.auth.InstalledAppFlow.from_client_secrets_file')
-    @patch('functions.auth.Request')
-    def test_authenticate_new_user(self, mock_request, mock_flow, mock_pickle_dump, mock_pickle_load):
-        # Mock the OAuth flow to simulate a successful login
-        mock_creds = mock.Mock()
-        mock_creds.valid = True
-        mock_flow.return_value.run_local_server.return_value = mock_creds
+    def test_authenticate_new_user(self, mock_flow):
+        mock_flow.return_value.run_local_server.return_value = make_credentials()
 
-        auth = Authenticator()
-        creds = auth.authenticate()
+        creds = Authenticator().authenticate()
 
-        self.assertEqual(creds, mock_creds)
-        mock_pickle_dump.assert_called_once()
+        self.assertEqual(creds.token, 'access')
+        with open(self.token_file) as f:
+            self.assertEqual(json.load(f)['refresh_token'], 'refresh')
+        self.assertEqual(os.stat(self.token_file).st_mode & 0o777, 0o600)
 
-    @patch('pickle.load')
     @patch.object(Authenticator, 'perform_oauth_flow')
-    def test_authenticate_existing_valid_creds(self, mock_perform_oauth_flow, mock_pickle_load):
-        # Create a mock credentials object
-        mock_creds = MagicMock(spec=AnonymousCredentials)
+    def test_authenticate_existing_valid_creds(self, mock_perform_oauth_flow):
+        self.store(make_credentials())
 
-        # Mock the attributes that the 'authenticate' method accesses
-        mock_creds.expired = False  # Simulate valid credentials
-        mock_creds.valid = True  # Simulate valid credentials
-        mock_creds.refresh_token = "mock_refresh_token"  # Simulate a valid refresh token
+        with patch.object(Credentials, 'refresh') as refresh:
+            creds = Authenticator().authenticate()
 
-        # Mock pickle.load to return the mock credentials
-        mock_pickle_load.return_value = mock_creds
+        self.assertEqual(creds.token, 'access')
+        refresh.assert_not_called()
+        mock_perform_oauth_flow.assert_not_called()
 
-        # Simulate that the credentials file exists and contains valid credentials
-        auth = Authenticator()
-        creds = auth.authenticate()
+    @patch.object(Authenticator, 'perform_oauth_flow')
+    def test_authenticate_invalid_creds(self, mock_perform_oauth_flow):
+        # A pickled token from an earlier version is not loaded, the user logs in again
+        with open(self.token_file, 'wb') as f:
+            f.write(b'\x80\x04\x95 not json')
+        mock_perform_oauth_flow.return_value = make_credentials(token='new')
 
-        # Assert that the credentials returned match the mocked credentials
-        self.assertEqual(creds, mock_creds)
+        credentials = Authenticator().authenticate()
 
-        # Ensure that perform_oauth_flow was not called since credentials were valid
-        mock_perform_oauth_flow.assert_not_called()
+        mock_perform_oauth_flow.assert_called_once()
+        self.assertEqual(credentials.token, 'new')
+
+    def test_concurrent_authentications_refresh_once(self):
+        self.store(make_credentials(expires_in=-60))
+        results = []
 
+        def authenticate():
+            Authenticator._cache.clear()  # As if every thread were a separate process
+            results.append(Authenticator().authenticate().token)
 
-    @patch('pickle.load', side_effect=pickle.PickleError)  # Mock pickle.load to simulate an invalid token
-    @patch.object(Authenticator, 'perform_oauth_flow')  # Mock perform_oauth_flow to avoid real OAuth flow
-    def test_authenticate_invalid_creds(self, mock_perform_oauth_flow, mock_pickle_load):
-        # Simulate that the credentials file doesn't exist or is invalid
-        if os.path.exists(Authenticator.CREDENTIALS_FILE):
-            os.remove(Authenticator.CREDENTIALS_FILE)  # Ensure the token.json file is removed or invalid
+        with patch.object(Credentials, 'refresh', autospec=True, side_effect=fake_refresh) as refresh:
+            threads = [threading.Thread(target=authenticate) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
 
-        # Make sure the mock for perform_oauth_flow returns some fake credentials
-        mock_perform_oauth_flow.return_value = "mocked_credentials"
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(results, ['refreshed'] * 8)
 
-        # Create an Authenticator instance and call authenticate
+    def test_background_refresh_updates_credentials_in_place(self):
+        self.store(make_credentials(expires_in=600))
         auth = Authenticator()
-        credentials = auth.authenticate()
+        auth.REFRESH_MARGIN = 60
+        creds = auth.authenticate()
+        self.assertEqual(creds.token, 'access')
 
-        # Assert that the mock for perform_oauth_flow was called once
-        mock_perform_oauth_flow.assert_called_once()
+        refreshed = threading.Event()
+
+        def refresh(credentials, request):
+            fake_refresh(credentials, request)
+            refreshed.set()
+
+        auth.REFRESH_MARGIN = 900
+        with patch.object(Credentials, 'refresh', autospec=True, side_effect=refresh):
+            thread = auth.start_background_refresh()
+            self.assertTrue(refreshed.wait(5))
+            auth.stop()
+            thread.join(5)
 
-        # Check that the returned credentials match what we mocked
-        self.assertEqual(credentials, "mocked_credentials")
+        self.assertEqual(creds.token, 'refreshed')
+        with open(self.token_file) as f:
+            self.assertEqual(json.load(f)['token'], 'refreshed')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,46 @@
+import contextlib
+import io
+import json
+import unittest
+
+from benchmarks import bench_operations
+
+
+class TestOperationsBenchmark(unittest.TestCase):
+
+    def test_quick_suite_reports_json(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            status = bench_operations.main(['--quick', '--latency-ms', '0', '--error-rate', '0.05',
+                                            '--scenario', 'upload', '--scenario', 'bulk_remove'])
+
+        self.assertEqual(status, 0)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual([r['scenario'] for r in report['results']], ['upload', 'upload', 'bulk_remove'])
+        for result in report['results']:
+            self.assertGreater(result['requests'], 0)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertIn('mb_per_sec', report['results'][0])
+
+    def test_both_engines_are_measured(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            status = bench_operations.main(['--quick', '--latency-ms', '0', '--engine', 'both',
+                                            '--scenario', 'download_ranged', '--scenario', 'bulk_remove'])
+
+        self.assertEqual(status, 0)
+        results = json.loads(stdout.getvalue())['results']
+        # The async engine has no ranged downloads
+        self.assertEqual([(r['scenario'], r['engine']) for r in results],
+                         [('download_ranged', 'threads'), ('bulk_remove', 'threads'), ('bulk_remove', 'async')])
+        self.assertEqual(results[2]['requests'], 101)
+
+    def test_percentile_uses_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(bench_operations.percentile(samples, 0.50), 50)
+        self.assertEqual(bench_operations.percentile(samples, 0.99), 99)
+        self.assertEqual(bench_operations.percentile([7], 0.95), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
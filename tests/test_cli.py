@@ -1,8 +1,12 @@
+import argparse
+import time
 import unittest
 from unittest.mock import patch
-from functions.cli import CLI
+from functions.cli import CLI, parse_size, positive_int
 import sys
 
+import googD
+
 class TestCLI(unittest.TestCase):
 
     @patch('sys.argv', new=['googD.py', '--upload', 'file.txt'])
@@ -10,7 +14,14 @@ class TestCLI(unittest.TestCase):
         cli = CLI()
         args = cli.parse_arguments()
         self.assertTrue(args.upload)
-        self.assertEqual(args.upload, 'file.txt')
+        self.assertEqual(args.upload, ['file.txt'])
+
+    @patch('sys.argv', new=['googD.py', '--upload', 'a.txt', 'logs/', '*.csv', '--jobs', '8'])
+    def test_parse_arguments_upload_many(self):
+        cli = CLI()
+        args = cli.parse_arguments()
+        self.assertEqual(args.upload, ['a.txt', 'logs/', '*.csv'])
+        self.assertEqual(args.jobs, 8)
 
     @patch('sys.argv', new=['googD.py', '--list'])
     def test_parse_arguments_list(self):
@@ -25,5 +36,80 @@ class TestCLI(unittest.TestCase):
         self.assertTrue(args.download)
         self.assertEqual(args.file, 'file.txt')
 
+    @patch('sys.argv', new=['googD.py', '--list', '--mime-type', 'application/pdf', '--min-size', '100M',
+                            '--modified-after', '1d', '--modified-before', '2026-10-18T12:00:00+00:00',
+                            '--fields', 'id,name,size'])
+    def test_parse_arguments_list_filters(self):
+        args = CLI().parse_arguments()
+        self.assertEqual(args.min_size, 100 * 1024 * 1024)
+        self.assertAlmostEqual(args.modified_after, time.time() - 86400, delta=60)
+        self.assertEqual(args.modified_before, 1792324800)
+        self.assertEqual(args.fields, 'id,name,size')
+
+    @patch('sys.argv', new=['googD.py', '--list', '--recursive', '--engine', 'async'])
+    def test_parse_arguments_engine(self):
+        args = CLI().parse_arguments()
+        self.assertEqual(args.engine, 'async')
+        self.assertEqual(CLI().parser.parse_args(['--list']).engine, 'threads')
+
+    @patch('functions.storage_operations.BulkRemoveOperation')
+    @patch('functions.storage_operations.RemoveOperation')
+    def test_delete_file_in_folder_removes_only_that_file(self, remove, bulk_remove):
+        args = CLI().parser.parse_args(['--delete', '--file', 'report.pdf', '--folder', 'Projects'])
+
+        googD.create_operation(args, None, cwd='/tmp')
+
+        remove.assert_called_once_with(None, 'report.pdf', index=None, folder_name='Projects', dry_run=False)
+        bulk_remove.assert_not_called()
+
+    @patch('functions.storage_operations.RemoveOperation')
+    def test_delete_file_honours_dry_run(self, remove):
+        args = CLI().parser.parse_args(['--delete', '--file', 'report.pdf', '--dry-run'])
+
+        googD.create_operation(args, None, cwd='/tmp')
+
+        remove.assert_called_once_with(None, 'report.pdf', index=None, folder_name=None, dry_run=True)
+
+    @patch('functions.async_engine.AsyncBulkRemoveOperation')
+    @patch('functions.async_engine.AsyncRemoveOperation')
+    def test_async_delete_file_in_folder(self, remove, bulk_remove):
+        args = CLI().parser.parse_args(['--delete', '--file', 'report.pdf', '--folder', 'Projects', '--dry-run',
+                                        '--engine', 'async'])
+
+        googD.create_operation(args, None, cwd='/tmp')
+
+        remove.assert_called_once_with(None, 'report.pdf', 'Projects', dry_run=True)
+        bulk_remove.assert_not_called()
+
+    def test_refresh_index_is_not_forwarded_to_the_daemon(self):
+        parser = CLI().parser
+
+        self.assertTrue(googD.runs_in_process(parser.parse_args(['--refresh-index'])))
+        self.assertFalse(googD.runs_in_process(parser.parse_args(['--list'])))
+
+    @patch('sys.stderr')
+    @patch('sys.argv', new=['googD.py', '--refresh-index', '--no-index'])
+    def test_refresh_index_rejects_no_index(self, stderr):
+        with self.assertRaises(SystemExit) as raised:
+            googD.main()
+        self.assertEqual(raised.exception.code, 2)
+
+    def test_parse_size_rejects_garbage(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_size('lots')
+
+    def test_positive_int_rejects_zero_and_negatives(self):
+        self.assertEqual(positive_int('8'), 8)
+        for value in ('0', '-3', 'many'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                positive_int(value)
+
+    @patch('sys.stderr')
+    def test_page_size_and_jobs_must_be_positive(self, stderr):
+        for argv in (['--list', '--page-size', '0'], ['--upload', 'a.txt', '--jobs', '-1']):
+            with patch('sys.argv', new=['googD.py'] + argv), self.assertRaises(SystemExit) as raised:
+                CLI().parse_arguments()
+            self.assertEqual(raised.exception.code, 2)
+
 if __name__ == '__main__':
     unittest.main()
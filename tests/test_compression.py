@@ -0,0 +1,53 @@
+import gzip
+import hashlib
+import io
+import os
+import unittest
+
+from functions.compression import CompressingReader, DecompressingWriter, app_properties, available, \
+    compression_of
+
+
+class TestCompression(unittest.TestCase):
+
+    def round_trip(self, codec, data):
+        reader = CompressingReader(io.BytesIO(data), codec)
+        compressed = b''.join(iter(lambda: reader.read(1000), b''))
+        output = io.BytesIO()
+        writer = DecompressingWriter(output, codec, len(data), hashlib.md5(data).hexdigest())
+        for start in range(0, len(compressed), 777):
+            writer.write(compressed[start:start + 777])
+        writer.finish()
+        self.assertEqual(output.getvalue(), data)
+        self.assertEqual((reader.size, reader.md5()), (len(data), hashlib.md5(data).hexdigest()))
+        self.assertEqual(reader.compressed, len(compressed))
+        return compressed
+
+    def test_gzip_round_trip(self):
+        data = b'timestamp,level,message\n' * 50000 + os.urandom(1000)
+        compressed = self.round_trip('gzip', data)
+        self.assertLess(len(compressed), len(data) // 5)
+        # Plain gzip, readable by any other tool
+        self.assertEqual(gzip.decompress(compressed), data)
+        self.round_trip('gzip', b'')
+
+    @unittest.skipUnless(available('zstd'), "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        self.round_trip('zstd', b'log line\n' * 100000)
+
+    def test_mismatch_is_detected(self):
+        compressed = gzip.compress(b'hello')
+        writer = DecompressingWriter(io.BytesIO(), 'gzip', 5, hashlib.md5(b'other').hexdigest())
+        writer.write(compressed)
+        with self.assertRaises(IOError):
+            writer.finish()
+
+    def test_compression_of_reads_app_properties(self):
+        self.assertEqual(compression_of({'appProperties': app_properties('gzip', 12, 'abc')}), ('gzip', 12, 'abc'))
+        self.assertEqual(compression_of({'appProperties': app_properties('gzip')}), ('gzip', None, None))
+        self.assertIsNone(compression_of({'appProperties': {'googdCodec': 'lz4'}}))
+        self.assertIsNone(compression_of({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import googD
+from functions import storage_operations
+from functions.cli import CLI
+from functions.daemon import Daemon, forward
+from functions.metadata_index import MetadataIndex
+from functions.storage_operations import WorkerPool
+from tests.fake_drive import FakeDriveTestCase
+
+
+class DaemonTestMixin:
+
+    def start_daemon(self, handler):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, tmp)
+        self.socket_path = os.path.join(tmp, 'googd.sock')
+        daemon = Daemon(handler, self.socket_path, workers=2)
+        daemon.start()
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(daemon.stop)
+        return daemon
+
+    def run_command(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = forward(list(argv), self.socket_path, stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+
+class TestDaemon(DaemonTestMixin, unittest.TestCase):
+
+    def test_forward_without_daemon(self):
+        self.assertIsNone(forward(['--list'], os.path.join(tempfile.gettempdir(), 'no-such-googd.sock')))
+
+    def test_output_and_exit_status_are_relayed(self):
+        def handler(argv, cwd):
+            print(f"running {' '.join(argv)} in {cwd}")
+            with WorkerPool(max_workers=2) as pool:
+                pool.submit(print, "from a worker thread")
+            if argv == ['fail']:
+                raise SystemExit(3)
+
+        self.start_daemon(handler)
+
+        status, stdout, _ = self.run_command('--list')
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, f"running --list in {os.getcwd()}\nfrom a worker thread\n")
+
+        status, _, _ = self.run_command('fail')
+        self.assertEqual(status, 3)
+
+    def test_socket_of_another_user_is_not_used(self):
+        calls = []
+        self.start_daemon(lambda argv, cwd: calls.append(argv))
+
+        with patch('functions.daemon.os.getuid', return_value=os.getuid() + 1):
+            status, _, stderr = self.run_command('--list')
+            self.assertIsNone(status)
+            self.assertIn("not using the googD daemon", stderr)
+            with self.assertRaises(RuntimeError):
+                Daemon(print, self.socket_path).start()
+        self.assertEqual(calls, [])
+        self.assertTrue(os.path.exists(self.socket_path))
+
+    def test_socket_directory_is_private(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, tmp)
+        socket_dir = os.path.join(tmp, 'googd')
+        daemon = Daemon(print, os.path.join(socket_dir, 'googd.sock'))
+        daemon.start()
+        daemon.close()
+        self.addCleanup(os.rmdir, socket_dir)
+
+        self.assertEqual(os.stat(socket_dir).st_mode & 0o777, 0o700)
+        os.chmod(socket_dir, 0o755)
+        with self.assertRaises(RuntimeError):
+            Daemon(print, os.path.join(socket_dir, 'googd.sock')).start()
+
+    def test_errors_are_reported(self):
+        def handler(argv, cwd):
+            raise RuntimeError("boom")
+
+        self.start_daemon(handler)
+
+        status, _, stderr = self.run_command('--list')
+        self.assertEqual(status, 1)
+        self.assertIn("Error: boom", stderr)
+
+
+class TestDaemonCommands(DaemonTestMixin, FakeDriveTestCase):
+
+    def test_commands_reuse_service_and_metadata_cache(self):
+        self.drive.add_file('notes.txt', b'notes')
+        index = MetadataIndex(':memory:')
+        self.addCleanup(index.close)
+        parser = CLI().parser
+
+        def handler(argv, cwd):
+            googD.create_operation(parser.parse_args(argv), self.credentials, index, cwd).execute()
+
+        self.start_daemon(handler)
+        index.start(storage_operations.get_service(self.credentials))
+        service = storage_operations.get_service(self.credentials)
+
+        status, stdout, _ = self.run_command('--list')
+        self.assertEqual(status, 0)
+        self.assertIn("Name: notes.txt, Type: text/plain", stdout)
+
+        status, _, _ = self.run_command('--download', '--file', 'notes.txt')
+        self.assertEqual(status, 0)
+        downloaded = os.path.join(os.getcwd(), 'notes.txt')
+        self.addCleanup(os.remove, downloaded)
+        self.assertEqual(index.lookup('notes.txt')[0]['size'], '5')
+
+        del self.drive.requests[:]
+        status, stdout, _ = self.run_command('--delete', '--file', 'notes.txt')
+        self.assertEqual(status, 0)
+        # The name came from the in-memory cache, only the delete went to the API
+        self.assertEqual([r[0] for r in self.drive.requests], ['DELETE'])
+        self.assertIs(storage_operations.get_service(self.credentials), service)
+
+
+if __name__ == '__main__':
+    unittest.main()
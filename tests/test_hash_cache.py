@@ -0,0 +1,39 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from functions.hash_cache import HashCache
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'data.bin')
+        with open(self.path, 'wb') as f:
+            f.write(b'first')
+        self.cache = HashCache(os.path.join(self.tmp.name, 'hash_cache.db'))
+        self.addCleanup(lambda: self.cache.close())
+
+    def test_unchanged_file_is_not_rehashed(self):
+        self.assertEqual(self.cache.md5(self.path), hashlib.md5(b'first').hexdigest())
+        self.cache.close()
+        self.cache = HashCache(os.path.join(self.tmp.name, 'hash_cache.db'))
+
+        with patch('functions.hash_cache.md5_of_file') as md5_of_file:
+            self.assertEqual(self.cache.md5(self.path), hashlib.md5(b'first').hexdigest())
+        md5_of_file.assert_not_called()
+
+    def test_modified_file_is_rehashed(self):
+        self.cache.md5(self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'second!')
+
+        self.assertEqual(self.cache.md5(self.path), hashlib.md5(b'second!').hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from functions import instrumentation
+from functions.instrumentation import endpoint_name, phase
+from functions.storage_operations import DownloadOperation, ListOperation
+from tests.fake_drive import FakeDriveTestCase
+
+
+class TestEndpointName(unittest.TestCase):
+
+    def test_ids_are_grouped(self):
+        self.assertEqual(endpoint_name('GET', 'http://h/drive/v3/files/abc123?alt=media'), 'GET /drive/v3/files/:id')
+        self.assertEqual(endpoint_name('PUT', 'http://h/upload/session/xyz'), 'PUT /upload/session/:id')
+        self.assertEqual(endpoint_name('GET', 'http://h/drive/v3/files?q=x'), 'GET /drive/v3/files')
+
+
+class TestInstrumentation(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(instrumentation.disable)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch('sys.stdout', new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('sys.stderr', new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_requests_phases_and_retries(self):
+        self.drive.add_file('report.txt', b'hello world')
+        self.drive.inject_error('GET', '/drive/v3/files$', status=503)
+        recorder = instrumentation.enable()
+
+        with phase('operation'):
+            DownloadOperation(self.credentials, 'report.txt', self.tmp.name).execute()
+
+        summary = instrumentation.disable().summary()
+        self.assertEqual(summary['phases']['operation']['count'], 1)
+        self.assertEqual(summary['phases']['name_lookup']['count'], 1)
+        self.assertEqual(summary['requests']['GET /drive/v3/files']['count'], 2)
+        self.assertEqual(summary['requests']['GET /drive/v3/files']['errors'], 1)
+        self.assertEqual(summary['requests']['GET /drive/v3/files/:id']['received'], len(b'hello world'))
+        self.assertEqual(summary['retries'], {'HTTP 503 backendError': 1})
+        self.assertIsNone(instrumentation.get_recorder())
+        recorder.print_stats(io.StringIO())
+
+    def test_trace_file_is_valid_json(self):
+        self.drive.add_file('a.txt')
+        trace_path = os.path.join(self.tmp.name, 'trace.json')
+        instrumentation.enable(trace_path)
+
+        with phase('list'):
+            ListOperation(self.credentials).execute()
+        instrumentation.disable()
+
+        with open(trace_path) as f:
+            events = json.load(f)
+        names = {event['name'] for event in events}
+        self.assertIn('list', names)
+        self.assertIn('GET /drive/v3/files', names)
+        self.assertTrue(all(event['ph'] in ('X', 'i') for event in events))
+
+    def test_nothing_is_recorded_when_disabled(self):
+        self.drive.add_file('a.txt')
+        ListOperation(self.credentials).execute()
+        self.assertIsNone(instrumentation.get_recorder())
+
+
+if __name__ == '__main__':
+    unittest.main()
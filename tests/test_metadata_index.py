@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from functions.metadata_index import MetadataIndex
+from functions.storage_operations import RefreshIndexOperation, RemoveOperation, UploadOperation, FOLDER_MIME_TYPE
+from tests.fake_drive import FakeDriveTestCase
+
+
+class TestMetadataIndex(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.docs = self.drive.add_folder('docs')
+        self.report = self.drive.add_file('report.pdf', b'pdf', parents=[self.docs])
+        self.notes = self.drive.add_file('notes.txt', b'notes')
+        self.index = MetadataIndex(os.path.join(self.tmp, 'index.db'), ttl=300)
+        self.addCleanup(self.index.close)
+        RefreshIndexOperation(self.credentials, self.index).execute()
+
+    def api_calls(self):
+        return [r[:2] for r in self.drive.requests]
+
+    def test_refresh_builds_index(self):
+        self.assertEqual(self.index.lookup('notes.txt', 'root')[0]['id'], self.notes)
+        self.assertEqual(self.index.lookup('docs', 'root', FOLDER_MIME_TYPE)[0]['id'], self.docs)
+        report = self.index.lookup('report.pdf', self.docs)[0]
+        self.assertEqual(report['size'], '3')
+        self.assertEqual(report['md5Checksum'], self.drive.files[self.report]['md5Checksum'])
+        self.assertEqual(self.index.lookup('report.pdf', 'root'), [])
+
+    def test_unbuilt_index_misses(self):
+        index = MetadataIndex(os.path.join(self.tmp, 'empty.db'))
+        self.addCleanup(index.close)
+        self.assertIsNone(index.lookup('notes.txt'))
+
+    def test_delete_resolves_name_from_index(self):
+        del self.drive.requests[:]
+
+        RemoveOperation(self.credentials, 'notes.txt', index=self.index).execute()
+
+        self.assertEqual(self.api_calls(), [('DELETE', f'/drive/v3/files/{self.notes}')])
+        self.assertNotIn(self.notes, self.drive.files)
+        self.assertEqual(self.index.lookup('notes.txt'), [])
+
+    def test_stale_index_applies_changes_feed(self):
+        added = self.drive.add_file('new.txt', b'new')
+        self.drive.remove(self.report)
+        del self.drive.requests[:]
+
+        self.assertEqual(len(self.index.lookup('report.pdf')), 1)
+        with patch('functions.metadata_index.time.time', return_value=self.index_synced_at() + 301):
+            RemoveOperation(self.credentials, 'new.txt', index=self.index).execute()
+
+        self.assertEqual(self.api_calls(), [('GET', '/drive/v3/changes'), ('DELETE', f'/drive/v3/files/{added}')])
+        self.assertEqual(self.index.lookup('report.pdf'), [])
+
+    def test_upload_records_new_folders(self):
+        path = os.path.join(self.tmp, 'a.txt')
+        with open(path, 'w') as f:
+            f.write('a')
+
+        UploadOperation(self.credentials, path, 'backups', index=self.index).execute()
+
+        folder = self.index.lookup('backups', 'root', FOLDER_MIME_TYPE)[0]
+        self.assertEqual(self.index.lookup('a.txt', folder['id'])[0]['size'], '1')
+
+    def index_synced_at(self):
+        return float(self.index._get_meta('synced_at'))
+
+
+if __name__ == '__main__':
+    unittest.main()
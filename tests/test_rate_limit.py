@@ -0,0 +1,80 @@
+import io
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from functions.rate_limit import RequestExecutor, TokenBucket
+from functions.storage_operations import ListOperation
+from tests.fake_drive import FakeDriveTestCase
+
+
+def http_error(status, reason='backendError', headers=None):
+    resp = httplib2.Response(dict({'status': status}, **(headers or {})))
+    content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}]}}).encode()
+    return HttpError(resp, content)
+
+
+class TestRequestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.sleep = MagicMock()
+        self.executor = RequestExecutor(rate=None, max_retries=3, sleep=self.sleep)
+        patcher = patch('sys.stderr', new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_throttling_and_honours_retry_after(self):
+        function = MagicMock(side_effect=[http_error(429, headers={'retry-after': '7'}), {'id': 'x'}])
+
+        self.assertEqual(self.executor.call(function), {'id': 'x'})
+
+        self.assertEqual(function.call_count, 2)
+        self.assertGreaterEqual(self.sleep.call_args[0][0], 7)
+        self.assertLess(self.executor.concurrency.limit, 17)
+
+    def test_rate_limit_403_is_retried_but_forbidden_is_not(self):
+        function = MagicMock(side_effect=[http_error(403, 'userRateLimitExceeded'), 'ok'])
+        self.assertEqual(self.executor.call(function), 'ok')
+
+        function = MagicMock(side_effect=http_error(403, 'insufficientFilePermissions'))
+        with self.assertRaises(HttpError):
+            self.executor.call(function)
+        function.assert_called_once()
+
+    def test_gives_up_after_max_retries(self):
+        function = MagicMock(side_effect=http_error(503))
+
+        with self.assertRaises(HttpError):
+            self.executor.call(function)
+
+        self.assertEqual(function.call_count, 4)
+        delays = [call[0][0] for call in self.sleep.call_args_list]
+        self.assertTrue(all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(delays)))
+
+    def test_token_bucket_delays_callers_past_the_burst(self):
+        bucket = TokenBucket(rate=10)
+        bucket.acquire(10, self.sleep)
+        self.sleep.assert_not_called()
+
+        bucket.acquire(5, self.sleep)
+        self.assertAlmostEqual(self.sleep.call_args[0][0], 0.5, places=1)
+
+
+class TestRetriesAgainstFakeDrive(FakeDriveTestCase):
+
+    def test_listing_survives_transient_errors(self):
+        self.drive.add_file('report.pdf')
+        self.drive.inject_error('GET', '/drive/v3/files', status=503, times=2)
+
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout, patch('sys.stderr', new_callable=io.StringIO):
+            ListOperation(self.credentials).execute()
+
+        self.assertIn('report.pdf', stdout.getvalue())
+        self.assertEqual(len([r for r in self.drive.requests if r[:2] == ('GET', '/drive/v3/files')]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
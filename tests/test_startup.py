@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+
+from functions import storage_operations
+from functions.storage_operations import ListOperation, RemoveOperation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_help_does_not_import_google_libraries(self):
+        result = subprocess.run([sys.executable, '-X', 'importtime', 'googD.py', '--help'],
+                                cwd=ROOT, capture_output=True, text=True)
+
+        self.assertEqual(result.returncode, 0)
+        self.assertIn('usage:', result.stdout)
+        self.assertNotIn('googleapiclient', result.stderr)
+        self.assertNotIn('google.auth', result.stderr)
+
+    @patch.dict(storage_operations._shared, clear=True)
+    @patch('functions.storage_operations.build_service')
+    def test_operations_share_one_service(self, mock_build_service):
+        mock_build_service.return_value = MagicMock()
+        credentials = MagicMock()
+
+        first = ListOperation(credentials)
+        second = RemoveOperation(credentials, 'file.txt')
+
+        mock_build_service.assert_called_once_with(credentials)
+        self.assertIs(first.service, second.service)
+
+    def test_service_uses_static_discovery_document(self):
+        with patch('httplib2.Http.request', side_effect=AssertionError("network used")):
+            service = storage_operations.build_service(MagicMock(universe_domain='googleapis.com'))
+
+        self.assertTrue(hasattr(service, 'files'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,19 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 
 from google.api_core.universe import UniverseMismatchError
-from functions.storage_operations import UploadOperation, DownloadOperation, ListOperation, RemoveOperation
+from googleapiclient.errors import HttpError
+from functions.storage_operations import UploadOperation, DownloadOperation, ListOperation, RemoveOperation, \
+    BulkRemoveOperation, CopyOperation, RefreshIndexOperation, SyncOperation, JobsFileOperation, ListFilter, WatchOperation, UploadSessions, WorkerPool, write_json, \
+    from_rfc3339
+from functions.hash_cache import HashCache
+from functions.metadata_index import MetadataIndex
+from tests.fake_drive import FakeDriveTestCase, FOLDER_MIME_TYPE
 
 
 class TestUploadOperation(unittest.TestCase):
@@ -53,6 +64,419 @@ class TestUploadOperation(unittest.TestCase):
                 print("Skipping UniverseMismatchError as the domain is intentionally mocked.")
                 pass
 
+class TestParallelUpload(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, 'artifacts', 'logs', 'empty'))
+        for rel, data in [('a.txt', b'alpha'), ('b.csv', b'1,2'), ('c.csv', b''),
+                          ('artifacts/build.bin', b'\x00' * 1000), ('artifacts/logs/run.log', b'ok')]:
+            with open(os.path.join(root, rel), 'wb') as f:
+                f.write(data)
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+    def test_upload_paths_globs_and_directories(self):
+        sources = [self.path('a.txt'), self.path('*.csv'), self.path('artifacts')]
+        results = UploadOperation(self.credentials, sources, 'backup', jobs=3).execute()
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(error is None for _, _, error in results))
+
+        backup = self.drive.find('backup', 'root')[0]
+        self.assertEqual(backup['mimeType'], FOLDER_MIME_TYPE)
+        self.assertEqual({f['name'] for f in self.drive.children(backup['id'])},
+                         {'a.txt', 'b.csv', 'c.csv', 'artifacts'})
+        artifacts = self.drive.find('artifacts', backup['id'])[0]
+        logs = self.drive.find('logs', artifacts['id'])[0]
+        self.assertEqual(len(self.drive.find('empty', logs['id'])), 1)
+        run_log = self.drive.find('run.log', logs['id'])[0]
+        self.assertEqual(self.drive.content[run_log['id']], b'ok')
+        self.assertEqual(self.drive.find('build.bin')[0]['size'], '1000')
+
+    def test_overlapping_sources_upload_once(self):
+        sources = [self.path('a.txt'), os.path.join(self.tmp.name, '.', 'a.txt'), self.path('*.txt'),
+                   self.path('artifacts', 'logs'), self.path('artifacts')]
+        with patch('sys.stdout', new_callable=io.StringIO):
+            results = UploadOperation(self.credentials, sources, 'backup').execute()
+
+        self.assertEqual(sorted(os.path.basename(path) for path, _, _ in results), ['a.txt', 'build.bin', 'run.log'])
+        self.assertEqual(len(self.drive.find('a.txt')), 1)
+        self.assertEqual(len(self.drive.find('run.log')), 1)
+
+    def test_summary_mixes_failures_and_successes(self):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            UploadOperation.print_summary([('a.txt', 'id-1', None), ('a.txt', None, 'HTTP 500')])
+
+        self.assertIn('1 succeeded, 1 failed', stdout.getvalue())
+
+    def test_upload_reports_missing_files(self):
+        results = UploadOperation(self.credentials, [self.path('a.txt'), self.path('nope.txt')]).execute()
+
+        errors = {os.path.basename(path): error for path, _, error in results}
+        self.assertIsNone(errors['a.txt'])
+        self.assertEqual(errors['nope.txt'], 'file does not exist')
+        self.assertEqual(self.drive.find('a.txt', 'root')[0]['size'], '5')
+
+
+class TestDedupUpload(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'artifact.bin')
+        with open(self.path, 'wb') as f:
+            f.write(b'build output')
+        self.hash_cache = HashCache(os.path.join(self.tmp.name, 'hash_cache.db'))
+        self.addCleanup(self.hash_cache.close)
+        patcher = patch('sys.stdout', new_callable=io.StringIO)
+        self.stdout = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self):
+        return UploadOperation(self.credentials, self.path, 'builds', dedup=True,
+                               hash_cache=self.hash_cache).execute()
+
+    def uploads(self):
+        return [r for r in self.drive.requests if r[:2] == ('POST', '/upload/drive/v3/files')]
+
+    def test_identical_file_is_not_uploaded_again(self):
+        first = self.upload()
+        second = self.upload()
+
+        self.assertEqual(len(self.uploads()), 1)
+        self.assertEqual(second[0][1], first[0][1])
+        builds = self.drive.find('builds', 'root')[0]
+        self.assertEqual(len(self.drive.find('artifact.bin', builds['id'])), 1)
+        self.assertIn('1 skipped as identical', self.stdout.getvalue())
+
+    def test_compressed_upload_is_found_through_the_index(self):
+        index = MetadataIndex(os.path.join(self.tmp.name, 'index.db'))
+        self.addCleanup(index.close)
+        RefreshIndexOperation(self.credentials, index).execute()
+
+        for _ in range(3):
+            UploadOperation(self.credentials, self.path, 'builds', dedup=True, hash_cache=self.hash_cache,
+                            compress='gzip', index=index).execute()
+
+        self.assertEqual(len(self.drive.find('artifact.bin')), 1)
+        self.assertIn('1 skipped as identical', self.stdout.getvalue())
+
+    def test_changed_or_trashed_copies_are_uploaded(self):
+        self.upload()
+        with open(self.path, 'wb') as f:
+            f.write(b'build output 2')
+        self.upload()
+        self.assertEqual(len(self.uploads()), 2)
+
+        for item in self.drive.find('artifact.bin'):
+            self.drive.files[item['id']]['trashed'] = True
+        self.upload()
+        self.assertEqual(len(self.uploads()), 3)
+
+
+class TestFolderPaths(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.files = []
+        for i in range(20):
+            self.files.append(os.path.join(self.tmp.name, f'part{i:02d}.bin'))
+            with open(self.files[-1], 'wb') as f:
+                f.write(b'x' * i)
+
+    def lookups(self):
+        return [r for r in self.drive.requests if r[:2] == ('GET', '/drive/v3/files')]
+
+    def folder_chain(self, *names):
+        parent = 'root'
+        for name in names:
+            folders = self.drive.find(name, parent)
+            self.assertEqual(len(folders), 1, name)
+            parent = folders[0]['id']
+        return parent
+
+    def test_upload_into_nested_path_creates_missing_segments_once(self):
+        backups = self.drive.add_folder('backups')
+        with patch('sys.stdout', new_callable=io.StringIO):
+            results = UploadOperation(self.credentials, self.files, 'backups/2026/10', jobs=8).execute()
+
+        self.assertTrue(all(error is None for _, _, error in results))
+        self.assertEqual(self.folder_chain('backups', '2026', '10'),
+                         self.drive.find('10', self.drive.find('2026', backups)[0]['id'])[0]['id'])
+        self.assertEqual(len(self.drive.children(self.folder_chain('backups', '2026', '10'))), 20)
+        # Once '2026' was found missing, '10' was created without a lookup
+        self.assertEqual(len(self.lookups()), 2)
+
+        self.drive.requests.clear()
+        with patch('sys.stdout', new_callable=io.StringIO):
+            UploadOperation(self.credentials, self.files[0], 'backups/2026/10').execute()
+        self.assertEqual(self.lookups(), [])
+
+    def test_trashed_folder_is_not_resolved(self):
+        trashed = self.drive.add_folder('backups')
+        self.drive.files[trashed]['trashed'] = True
+        with patch('sys.stdout', new_callable=io.StringIO):
+            UploadOperation(self.credentials, self.files[0], 'backups').execute()
+
+        self.assertEqual(self.drive.children(trashed), [])
+        backups = [f for f in self.drive.find('backups') if f['id'] != trashed]
+        self.assertEqual([f['name'] for f in self.drive.children(backups[0]['id'])], ['part00.bin'])
+
+    def test_trashed_folder_is_not_cached_in_the_index(self):
+        index = MetadataIndex(os.path.join(self.tmp.name, 'index.db'))
+        self.addCleanup(index.close)
+        with patch('sys.stdout', new_callable=io.StringIO):
+            RefreshIndexOperation(self.credentials, index).execute()
+        trashed = self.drive.add_folder('backups')
+        self.drive.files[trashed]['trashed'] = True
+
+        # A lookup that includes trashed files, such as deleting by name, finds the folder
+        operation = UploadOperation(self.credentials, self.files[0], 'backups', index=index)
+        self.assertEqual([f['id'] for f in operation.find_files('backups', 'root')], [trashed])
+        with patch('sys.stdout', new_callable=io.StringIO):
+            operation.execute()
+
+        self.assertEqual(index.lookup('backups', 'root', FOLDER_MIME_TYPE)[0]['mimeType'], FOLDER_MIME_TYPE)
+        self.assertNotEqual(index.lookup('backups', 'root', FOLDER_MIME_TYPE)[0]['id'], trashed)
+        self.assertEqual(self.drive.children(trashed), [])
+
+    def test_folder_create_is_only_retried_when_rejected(self):
+        operation = UploadOperation(self.credentials, [])
+        creates = lambda: [r for r in self.drive.requests if r[:2] == ('POST', '/drive/v3/files')]
+
+        self.drive.inject_error('POST', '/drive/v3/files$', status=429)
+        operation.create_folder('throttled')
+        self.assertEqual((len(creates()), len(self.drive.find('throttled'))), (2, 1))
+
+        self.drive.inject_error('POST', '/drive/v3/files$', status=503)
+        with self.assertRaises(HttpError):
+            operation.create_folder('unavailable')
+        self.assertEqual(len(creates()), 3)
+
+    def test_concurrent_resolution_creates_one_folder(self):
+        operation = UploadOperation(self.credentials, [])
+        with patch('sys.stdout', new_callable=io.StringIO), WorkerPool(max_workers=8) as pool:
+            ids = set(pool.map(lambda _: operation.resolve_folder('a/b', create=True), range(16)))
+
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(ids.pop(), self.folder_chain('a', 'b'))
+
+    def test_deleted_folder_is_forgotten(self):
+        operation = RemoveOperation(self.credentials)
+        with patch('sys.stdout', new_callable=io.StringIO):
+            folder_id = operation.resolve_folder('logs/old', create=True)
+            operation.delete_file(self.folder_chain('logs'))
+
+        self.assertIsNone(operation.resolve_folder('logs/old'))
+        self.assertNotIn(folder_id, self.drive.files)
+
+
+class TestResumableUpload(FakeDriveTestCase):
+    CHUNK = 256 * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, 'big.bin')
+        self.data = os.urandom(self.CHUNK * 4 + 100)
+        with open(self.source, 'wb') as f:
+            f.write(self.data)
+        self.state_file = os.path.join(self.tmp.name, 'upload_sessions.json')
+
+    def upload(self):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            results = UploadOperation(self.credentials, self.source, chunk_size=self.CHUNK,
+                                      sessions=UploadSessions(self.state_file)).execute()
+        return results, stdout.getvalue()
+
+    def chunk_puts(self):
+        return [r for r in self.drive.requests if r[0] == 'PUT']
+
+    def test_upload_is_sent_in_chunks(self):
+        results, output = self.upload()
+
+        self.assertIsNone(results[0][2])
+        self.assertEqual(self.drive.content[results[0][1]], self.data)
+        self.assertEqual(len(self.chunk_puts()), 5)
+        self.assertIn("Uploading big.bin: 100%", output)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_interrupted_upload_resumes_from_saved_session(self):
+        save = UploadSessions.save
+
+        def crash_after_two_chunks(sessions, path, key, uri, offset):
+            save(sessions, path, key, uri, offset)
+            if offset >= 2 * self.CHUNK:
+                raise ConnectionError("connection reset")
+
+        with patch.object(UploadSessions, 'save', crash_after_two_chunks):
+            results, _ = self.upload()
+        self.assertEqual(results[0][2], "connection reset")
+        with open(self.state_file) as f:
+            self.assertEqual(json.load(f)[self.source]['offset'], 2 * self.CHUNK)
+
+        self.drive.requests.clear()
+        results, output = self.upload()
+
+        self.assertIn("Resuming upload of", output)
+        self.assertEqual(self.drive.content[results[0][1]], self.data)
+        # One status query, then only the three remaining chunks
+        self.assertEqual(len(self.chunk_puts()), 4)
+        self.assertEqual(len(self.drive.find('big.bin')), 1)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_changed_file_starts_a_new_session(self):
+        sessions = UploadSessions(self.state_file)
+        sessions.save(self.source, None, 'http://invalid/session', self.CHUNK)
+        with open(self.source, 'ab') as f:
+            f.write(b'more')
+
+        self.assertIsNone(UploadSessions(self.state_file).get(self.source))
+
+
+class Pipe(io.RawIOBase):
+    """Non-seekable stream that returns at most a few KiB per read, like a pipe."""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(min(size, 5000) if size >= 0 else -1)
+
+
+class TestStreaming(FakeDriveTestCase):
+    CHUNK = 256 * 1024
+
+    def upload(self, data):
+        with patch('sys.stdout', new_callable=io.StringIO):
+            results = UploadOperation(self.credentials, '-', name='dump.sql.gz', chunk_size=self.CHUNK,
+                                      stdin=Pipe(data)).execute()
+        self.assertIsNone(results[0][2])
+        return results[0][1]
+
+    def test_upload_from_a_pipe(self):
+        data = os.urandom(self.CHUNK * 3 + 10)
+        file_id = self.upload(data)
+
+        self.assertEqual(self.drive.content[file_id], data)
+        self.assertEqual(self.drive.files[file_id]['name'], 'dump.sql.gz')
+        self.assertEqual(len([r for r in self.drive.requests if r[0] == 'PUT']), 4)
+
+    def test_upload_ending_on_a_chunk_boundary(self):
+        data = os.urandom(self.CHUNK * 2)
+        self.assertEqual(self.drive.content[self.upload(data)], data)
+        # The end of the stream is seen ahead, so no empty closing request is needed
+        self.assertEqual(len([r for r in self.drive.requests if r[0] == 'PUT']), 2)
+        self.assertEqual(self.drive.content[self.upload(b'')], b'')
+
+    def test_download_to_a_stream(self):
+        data = os.urandom(100000)
+        self.drive.add_file('dump.sql.gz', data)
+        output = io.BytesIO()
+
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            DownloadOperation(self.credentials, 'dump.sql.gz', output=output).execute()
+
+        self.assertEqual(output.getvalue(), data)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertIn('Found file: dump.sql.gz', stderr.getvalue())
+
+
+class TestCompressedTransfers(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data = b'2026-10-18T12:00:00Z INFO request served in 12ms\n' * 20000
+        self.path = os.path.join(self.tmp.name, 'app.log')
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def upload(self, **kwargs):
+        with patch('sys.stdout', new_callable=io.StringIO):
+            results = UploadOperation(self.credentials, kwargs.pop('source', self.path), compress='gzip',
+                                      chunk_size=256 * 1024, **kwargs).execute()
+        self.assertIsNone(results[0][2])
+        return results[0][1]
+
+    def download(self, **kwargs):
+        destination = os.path.join(self.tmp.name, 'out')
+        os.makedirs(destination, exist_ok=True)
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            result = DownloadOperation(self.credentials, kwargs.pop('name', 'app.log'), destination, **kwargs).execute()
+        return result, destination, stdout.getvalue()
+
+    def test_upload_is_compressed_and_tagged(self):
+        file_id = self.upload()
+
+        item = self.drive.files[file_id]
+        self.assertEqual(item['mimeType'], 'application/gzip')
+        self.assertEqual(item['appProperties'], {'googdCodec': 'gzip', 'googdSize': str(len(self.data)),
+                                                 'googdMd5': hashlib.md5(self.data).hexdigest()})
+        self.assertLess(len(self.drive.content[file_id]), len(self.data) // 5)
+
+    def test_download_decompresses(self):
+        self.upload()
+
+        _, destination, output = self.download()
+
+        with open(os.path.join(destination, 'app.log'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertIn('decompressed gzip', output)
+
+    def test_corrupted_original_is_not_kept(self):
+        file_id = self.upload()
+        self.drive.update_file(file_id, appProperties={'googdMd5': hashlib.md5(b'other').hexdigest()})
+
+        result, destination, output = self.download()
+
+        self.assertFalse(result)
+        self.assertIn('MD5 checksum mismatch', output)
+        self.assertEqual(os.listdir(destination), [])
+
+    def test_dedup_compares_the_original(self):
+        first = self.upload()
+        self.assertEqual(self.upload(dedup=True), first)
+        self.assertEqual(len(self.drive.find('app.log')), 1)
+
+    def test_stdin_upload_is_tagged_when_it_ends(self):
+        file_id = self.upload(source='-', name='app.log', stdin=Pipe(self.data))
+        output = io.BytesIO()
+
+        with patch('sys.stdout', new_callable=io.StringIO):
+            DownloadOperation(self.credentials, 'app.log', output=output).execute()
+
+        self.assertEqual(self.drive.files[file_id]['appProperties']['googdSize'], str(len(self.data)))
+        self.assertEqual(output.getvalue(), self.data)
+
+    def test_folder_download_compares_the_original(self):
+        backups = self.drive.add_folder('backups')
+        self.upload(folder_name='backups')
+
+        with patch('sys.stdout', new_callable=io.StringIO):
+            first = DownloadOperation(self.credentials, None, self.tmp.name, folder_name='backups').execute()
+            second = DownloadOperation(self.credentials, None, self.tmp.name, folder_name='backups').execute()
+
+        self.assertEqual((first['downloaded'], second['unchanged']), (1, 1))
+        with open(os.path.join(self.tmp.name, 'backups', 'app.log'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertTrue(self.drive.children(backups))
+
+
 class TestDownloadOperation(unittest.TestCase):
 
     @patch('googleapiclient.discovery.build')  # Patch the build function to mock the API client
@@ -86,7 +510,8 @@ class TestDownloadOperation(unittest.TestCase):
             download_op.execute()
 
             # Assertions to ensure the mock methods were called as expected
-            mock_service.files.return_value.list.assert_called_once_with(q="name='test.txt'", fields="files(id, name)")
+            mock_service.files.return_value.list.assert_called_once_with(
+                q="name='test.txt'", fields="files(id, name, size, md5Checksum)")
             mock_service.files.return_value.get_media.assert_called_once_with(fileId='file_id')
             mock_downloader.next_chunk.assert_called_once()  # Verify that the file download happened
         except UniverseMismatchError:
@@ -95,29 +520,658 @@ class TestDownloadOperation(unittest.TestCase):
             pass
 
 
+class TestFolderDownload(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        projects = self.drive.add_folder('projects')
+        alpha = self.drive.add_folder('alpha', projects)
+        src = self.drive.add_folder('src', alpha)
+        self.drive.add_folder('empty', alpha)
+        self.drive.add_file('README', b'readme', parents=[alpha])
+        self.drive.add_file('main.py', b'print(1)', parents=[src])
+        self.drive.add_file('design', parents=[alpha], mime_type='application/vnd.google-apps.document')
+        self.hash_cache = HashCache(os.path.join(self.tmp.name, 'hash_cache.db'))
+        self.addCleanup(self.hash_cache.close)
+
+    def download(self, recursive=True):
+        with patch('sys.stdout', new_callable=io.StringIO):
+            return DownloadOperation(self.credentials, None, self.tmp.name, jobs=3, folder_name='projects/alpha',
+                                     recursive=recursive, hash_cache=self.hash_cache).execute()
+
+    def media_requests(self):
+        return [r for r in self.drive.requests if r[0] == 'GET' and r[1].startswith('/drive/v3/files/')]
+
+    def read(self, *parts):
+        with open(os.path.join(self.tmp.name, 'alpha', *parts), 'rb') as f:
+            return f.read()
+
+    def test_recursive_download_recreates_the_tree(self):
+        counts = self.download()
+
+        self.assertEqual(counts, {'downloaded': 2, 'unchanged': 0, 'skipped': 1, 'failed': 0})
+        self.assertEqual(self.read('README'), b'readme')
+        self.assertEqual(self.read('src', 'main.py'), b'print(1)')
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp.name, 'alpha', 'empty')))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'alpha', 'design')))
+
+    def test_matching_local_copies_are_skipped(self):
+        self.download()
+        with open(os.path.join(self.tmp.name, 'alpha', 'README'), 'wb') as f:
+            f.write(b'edited')
+        media = len(self.media_requests())
+
+        counts = self.download()
+
+        self.assertEqual((counts['downloaded'], counts['unchanged']), (1, 1))
+        self.assertEqual(len(self.media_requests()), media + 1)
+        self.assertEqual(self.read('README'), b'readme')
+
+    def test_non_recursive_download_takes_only_the_top_level(self):
+        counts = self.download(recursive=False)
+
+        self.assertEqual(counts['downloaded'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'alpha', 'src')))
+
+
+class TestRangedDownload(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.content = os.urandom(10 * 1024 + 123)
+        self.file_id = self.drive.add_file('big.bin', self.content)
+        patcher = patch.object(DownloadOperation, 'SEGMENT_SIZE', 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def range_requests(self):
+        return [r for r in self.drive.requests if r[2]]
+
+    def test_ranged_download(self):
+        DownloadOperation(self.credentials, 'big.bin', self.tmp.name, ranged=True, jobs=4).execute()
+
+        destination = os.path.join(self.tmp.name, 'big.bin')
+        with open(destination, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(len(self.range_requests()), 11)
+        self.assertFalse(os.path.exists(destination + '.googd-checkpoint'))
+
+    def test_ranged_download_resumes_missing_segments(self):
+        destination = os.path.join(self.tmp.name, 'big.bin')
+        with open(destination, 'wb') as f:
+            f.write(self.content[:4096])
+            f.truncate(len(self.content))
+        write_json(destination + '.googd-checkpoint', {
+            'id': self.file_id, 'size': len(self.content), 'md5Checksum': hashlib.md5(self.content).hexdigest(),
+            'segment_size': 1024, 'done': [0, 1, 2, 3]})
+
+        operation = DownloadOperation(self.credentials, 'big.bin', self.tmp.name, ranged=True)
+        operation.execute()
+
+        with open(destination, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(sorted(r[2] for r in self.range_requests())[0], 'bytes=10240-10362')
+        self.assertEqual(len(self.range_requests()), 7)
+
+    def test_ranged_download_detects_checksum_mismatch(self):
+        operation = DownloadOperation(self.credentials, None, self.tmp.name, ranged=True)
+        ok = operation.download_ranged(self.file_id, os.path.join(self.tmp.name, 'big.bin'),
+                                       len(self.content), '0' * 32)
+
+        self.assertFalse(ok)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'big.bin.googd-checkpoint')))
+
+
 class TestListOperation(unittest.TestCase):
 
-    @patch('functions.storage_operations.build')
-    def test_list_operation(self, mock_build):
+    @patch('functions.storage_operations.get_service')
+    def test_list_operation(self, mock_get_service):
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
+        mock_service.files().list().execute.return_value = {'files': []}
 
         list_op = ListOperation(None)
         list_op.execute()
 
-        mock_service.files().list.assert_called_once()
+        mock_service.files().list.assert_called_with(
+            q="'root' in parents", fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
+            pageSize=1000, pageToken=None)
+
+    @patch('functions.storage_operations.get_service')
+    def test_filters_are_pushed_into_the_query(self, mock_get_service):
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
+        mock_service.files().list().execute.return_value = {'files': []}
+        filters = ListFilter(mime_type='application/pdf', name_prefix="q3's", modified_after=1760745600,
+                             trashed=False, owner='me', min_size=100 * 1024 * 1024)
+
+        with patch('sys.stdout', new_callable=io.StringIO):
+            ListOperation(None, filters=filters, fields='id,name').execute()
+
+        mock_service.files().list.assert_called_with(
+            q="'root' in parents and mimeType = 'application/pdf' and name contains 'q3\\'s' "
+              "and modifiedTime > '2025-10-18T00:00:00.000Z' and trashed = false and 'me' in owners",
+            fields="nextPageToken, files(id, name, mimeType, modifiedTime, trashed, ownedByMe, size)",
+            pageSize=1000, pageToken=None)
+
+
+class TestPaginatedList(FakeDriveTestCase):
+
+    def list_output(self, **kwargs):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            ListOperation(self.credentials, **kwargs).execute()
+        return stdout.getvalue().splitlines()
+
+    def list_calls(self):
+        return [r for r in self.drive.requests if r[:2] == ('GET', '/drive/v3/files')]
+
+    def test_list_follows_next_page_token(self):
+        for i in range(25):
+            self.drive.add_file(f'file{i:02d}.txt')
+
+        lines = self.list_output(page_size=10)
+
+        self.assertEqual(lines[0], "Listing files in root directory:")
+        self.assertEqual(len(lines), 26)
+        self.assertTrue(lines[-1].startswith("Name: file24.txt, Type: text/plain"))
+        self.assertEqual(len(self.list_calls()), 3)
+
+    def test_recursive_jsonl_listing(self):
+        docs = self.drive.add_folder('docs')
+        drafts = self.drive.add_folder('drafts', docs)
+        self.drive.add_file('readme.md')
+        self.drive.add_file('a.txt', b'a', parents=[docs])
+        self.drive.add_file('b.txt', b'b', parents=[drafts])
+
+        rows = [json.loads(line) for line in self.list_output(recursive=True, output_format='jsonl', page_size=1)]
+
+        paths = [row['path'] for row in rows]
+        self.assertLess(paths.index('docs'), paths.index('docs/drafts'))
+        self.assertLess(paths.index('docs/drafts'), paths.index('docs/drafts/b.txt'))
+        self.assertEqual(sorted(row['path'] for row in rows),
+                         ['docs', 'docs/a.txt', 'docs/drafts', 'docs/drafts/b.txt', 'readme.md'])
+
+    def test_empty_listing(self):
+        self.assertEqual(self.list_output(), ["No files found in Google Drive."])
+
+    def test_filters_and_projection(self):
+        now = '2026-10-18T12:00:00.000Z'
+        self.drive.add_file('big.pdf', b'x' * 2000, mime_type='application/pdf', modifiedTime=now)
+        self.drive.add_file('small.pdf', b'x' * 10, mime_type='application/pdf', modifiedTime=now)
+        self.drive.add_file('old.pdf', b'x' * 2000, mime_type='application/pdf', modifiedTime='2020-01-01T00:00:00.000Z')
+        self.drive.add_file('big.txt', b'x' * 2000, modifiedTime=now)
+        self.drive.add_file('shared.pdf', b'x' * 2000, mime_type='application/pdf', modifiedTime=now,
+                            owner={'emailAddress': 'bob@example.com'})
+        filters = ListFilter(mime_type='application/pdf', modified_after=from_rfc3339(now) - 86400, min_size=1000)
+
+        rows = [json.loads(line) for line in self.list_output(output_format='jsonl', filters=filters,
+                                                               fields='name,size')]
+
+        self.assertEqual(sorted(row['name'] for row in rows), ['big.pdf', 'shared.pdf'])
+        self.assertEqual(set(rows[0]), {'name', 'size', 'path'})
+
+        filters.owner = 'bob@example.com'
+        self.assertEqual(self.list_output(filters=filters, fields='name,size'),
+                         ["Listing files in root directory:", "Name: shared.pdf, size: 2000"])
+
+    def test_recursive_listing_descends_into_folders_that_do_not_match(self):
+        docs = self.drive.add_folder('docs')
+        reports = self.drive.add_folder('reports', docs)
+        self.drive.add_file('summary.csv', b'1', parents=[reports])
+        self.drive.add_file('notes.txt', b'1', parents=[reports])
+        self.drive.add_folder('csv exports')
+
+        rows = [json.loads(line) for line in self.list_output(
+            recursive=True, output_format='jsonl', filters=ListFilter(name_contains='.csv'))]
+
+        self.assertEqual([row['path'] for row in rows], ['docs/reports/summary.csv'])
 
 class TestRemoveOperation(unittest.TestCase):
 
-    @patch('functions.storage_operations.build')
-    def test_remove_operation(self, mock_build):
+    @patch('functions.storage_operations.get_service')
+    def test_remove_operation(self, mock_get_service):
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
 
         remove_op = RemoveOperation(None, 'file_to_remove.txt')
         remove_op.execute()
 
         mock_service.files().delete.assert_called_once()
 
+class TestBulkRemove(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_ids = [self.drive.add_file(f'scratch{i:03d}.tmp') for i in range(250)]
+        self.keep = self.drive.add_file('keep.txt')
+        self.logs = self.drive.add_folder('logs')
+        self.old_log = self.drive.add_file('old.log', parents=[self.logs], modifiedTime='2020-01-01T00:00:00.000Z')
+        self.new_log = self.drive.add_file('new.log', parents=[self.logs])
+
+    def batch_calls(self):
+        return [r for r in self.drive.requests if r[:2] == ('POST', '/batch/drive/v3')]
+
+    def test_bulk_delete_by_pattern_in_batches(self):
+        BulkRemoveOperation(self.credentials, pattern='*.tmp').execute()
+
+        self.assertEqual(len(self.batch_calls()), 3)
+        self.assertFalse(any(file_id in self.drive.files for file_id in self.tmp_ids))
+        self.assertIn(self.keep, self.drive.files)
+
+    def test_failed_sub_requests_are_retried(self):
+        self.drive.inject_error('DELETE', f'/drive/v3/files/{self.tmp_ids[7]}', status=500)
+
+        failed = BulkRemoveOperation(self.credentials, pattern='scratch00*.tmp').execute()
+
+        self.assertEqual(failed, [])
+        deletes = [r for r in self.drive.requests if r[:2] == ('DELETE', f'/drive/v3/files/{self.tmp_ids[7]}')]
+        self.assertEqual(len(deletes), 2)
+        self.assertNotIn(self.tmp_ids[7], self.drive.files)
+
+    def test_dry_run_deletes_nothing(self):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            targets = BulkRemoveOperation(self.credentials, folder_name='logs', dry_run=True).execute()
+
+        self.assertEqual(sorted(name for _, name in targets), ['new.log', 'old.log'])
+        self.assertIn(f"Would remove: old.log (ID: {self.old_log})", stdout.getvalue())
+        self.assertIn(self.old_log, self.drive.files)
+        self.assertEqual(self.batch_calls(), [])
+
+    def test_delete_by_folder_and_age(self):
+        BulkRemoveOperation(self.credentials, folder_name='logs', older_than=30).execute()
+
+        self.assertNotIn(self.old_log, self.drive.files)
+        self.assertIn(self.new_log, self.drive.files)
+
+    def test_delete_one_file_in_folder(self):
+        with patch('sys.stdout', new_callable=io.StringIO):
+            RemoveOperation(self.credentials, 'old.log', folder_name='logs', dry_run=True).execute()
+            self.assertIn(self.old_log, self.drive.files)
+            RemoveOperation(self.credentials, 'old.log', folder_name='logs').execute()
+
+        self.assertNotIn(self.old_log, self.drive.files)
+        self.assertIn(self.new_log, self.drive.files)
+
+    def test_delete_ids_from_stdin(self):
+        ids = io.StringIO(f"{self.keep}\n\n{self.new_log}\n{self.keep}\n")
+
+        BulkRemoveOperation(self.credentials, ids=ids).execute()
+
+        self.assertNotIn(self.keep, self.drive.files)
+        self.assertNotIn(self.new_log, self.drive.files)
+        self.assertEqual(len(self.batch_calls()), 1)
+
+
+class TestCopyAndMove(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reports = self.drive.add_folder('reports')
+        for name in ('q1.csv', 'q2.csv', 'notes.txt'):
+            self.drive.add_file(name, name.encode(), parents=[self.reports])
+
+    def run_operation(self, source, destination, move=False):
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            result = CopyOperation(self.credentials, source, destination, move=move, jobs=3).execute()
+        self.output = stdout.getvalue()
+        return result
+
+    def content_requests(self):
+        return [r for r in self.drive.requests if r[1].startswith('/upload/') or r[1].startswith('/upload/session')
+                or (r[0] == 'GET' and r[1].startswith('/drive/v3/files/'))]
+
+    def names_in(self, folder_id):
+        return sorted(f['name'] for f in self.drive.children(folder_id))
+
+    def test_copy_glob_into_a_new_folder(self):
+        failed = self.run_operation('reports/*.csv', 'archive/2026')
+
+        self.assertEqual(failed, {})
+        archive = self.drive.find('2026')[0]
+        self.assertEqual(self.names_in(archive['id']), ['q1.csv', 'q2.csv'])
+        copy = next(f for f in self.drive.children(archive['id']) if f['name'] == 'q1.csv')
+        self.assertEqual(self.drive.content[copy['id']], b'q1.csv')
+        self.assertEqual(self.names_in(self.reports), ['notes.txt', 'q1.csv', 'q2.csv'])
+        self.assertEqual(self.content_requests(), [])
+
+    def test_copy_tree_in_batches(self):
+        deep = self.drive.add_folder('deep', self.drive.add_folder('sub', self.reports))
+        for i in range(150):
+            self.drive.add_file(f'f{i:03d}.log', parents=[deep])
+        self.drive.add_file('design', parents=[deep], mime_type='application/vnd.google-apps.document')
+        self.drive.inject_error('POST', '/copy$', status=500)
+
+        failed = self.run_operation('reports', 'backup')
+
+        self.assertEqual(failed, {})
+        copy = next(f for f in self.drive.find('reports') if f['id'] != self.reports)
+        self.assertEqual(copy['parents'], [self.drive.find('backup')[0]['id']])
+        self.assertEqual(self.names_in(copy['id']), ['notes.txt', 'q1.csv', 'q2.csv', 'sub'])
+        deep_copy = next(f for f in self.drive.find('deep') if f['id'] != deep)
+        self.assertEqual(len(self.drive.children(deep_copy['id'])), 151)
+        self.assertIn('154 files and 3 folders copied, 0 failed', self.output)
+        # The 154 file copies took two batches; each single folder went on its own
+        self.assertEqual(len([r for r in self.drive.requests if r[1] == '/batch/drive/v3']), 2)
+        self.assertEqual(self.content_requests(), [])
+
+    def test_failed_batch_of_copies_is_not_sent_again(self):
+        self.drive.inject_error('POST', '/batch/drive/v3$', status=503)
+
+        failed = self.run_operation('reports/*', 'archive')
+
+        self.assertEqual(len(failed), 3)
+        self.assertEqual(self.drive.children(self.drive.find('archive')[0]['id']), [])
+        self.assertEqual(len([r for r in self.drive.requests if r[1] == '/batch/drive/v3']), 1)
+        self.assertIn('may or may not have been applied', self.output)
+
+    def test_throttled_batch_of_copies_is_retried(self):
+        self.drive.inject_error('POST', '/batch/drive/v3$', status=429)
+
+        failed = self.run_operation('reports/*', 'archive')
+
+        self.assertEqual(failed, {})
+        self.assertEqual(self.names_in(self.drive.find('archive')[0]['id']), ['notes.txt', 'q1.csv', 'q2.csv'])
+
+    def test_move_folder_with_one_update(self):
+        sub = self.drive.add_folder('sub', self.reports)
+        self.drive.add_file('deep.txt', parents=[sub])
+        archive = self.drive.add_folder('archive')
+
+        self.run_operation('reports', 'archive', move=True)
+
+        self.assertEqual(self.drive.files[self.reports]['parents'], [archive])
+        self.assertEqual(len([r for r in self.drive.requests if r[0] == 'PATCH']), 1)
+        self.assertEqual(self.names_in('root'), ['archive'])
+        # The moved folder is found at its new path
+        self.run_operation('archive/reports/q1.csv', '', move=True)
+        self.assertEqual(self.names_in('root'), ['archive', 'q1.csv'])
+
+    def test_move_glob(self):
+        self.run_operation('reports/q*.csv', 'old', move=True)
+
+        self.assertEqual(self.names_in(self.drive.find('old')[0]['id']), ['q1.csv', 'q2.csv'])
+        self.assertEqual(self.names_in(self.reports), ['notes.txt'])
+        self.assertIn('Move summary: 2 moved, 0 failed', self.output)
+
+    def test_missing_source(self):
+        self.assertIsNone(self.run_operation('reports/*.pdf', 'archive'))
+        self.assertIn("No file or folder matches 'reports/*.pdf'", self.output)
+        self.assertEqual(self.drive.find('archive'), [])
+
+
+class TestSync(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.local = os.path.join(self.tmp.name, 'project')
+        os.makedirs(os.path.join(self.local, 'src', 'pkg'))
+        for rel, data in [('README', b'readme'), ('src/main.py', b'print(1)'), ('src/pkg/util.py', b'')]:
+            self.write(rel, data)
+        self.hash_cache = HashCache(os.path.join(self.tmp.name, 'hash_cache.db'))
+        self.addCleanup(self.hash_cache.close)
+
+    def write(self, rel, data):
+        with open(os.path.join(self.local, *rel.split('/')), 'wb') as f:
+            f.write(data)
+
+    def sync(self, direction='up', local=None):
+        with patch('sys.stdout', new_callable=io.StringIO):
+            return SyncOperation(self.credentials, local or self.local, 'project', direction, jobs=3,
+                                 hash_cache=self.hash_cache).execute()
+
+    def uploads(self):
+        return [r for r in self.drive.requests if r[1].startswith('/upload/')]
+
+    def test_second_sync_transfers_nothing(self):
+        counts = self.sync()
+        self.assertEqual((counts['uploaded'], counts['failed']), (3, 0))
+        project = self.drive.find('project', 'root')[0]
+        pkg = self.drive.find('pkg', self.drive.find('src', project['id'])[0]['id'])[0]
+        self.assertEqual(self.drive.content[self.drive.find('util.py', pkg['id'])[0]['id']], b'')
+
+        self.drive.requests.clear()
+        with patch('functions.hash_cache.md5_of_file') as md5_of_file:
+            counts = self.sync()
+        self.assertEqual(counts['unchanged'], 3)
+        self.assertEqual(self.uploads(), [])
+        md5_of_file.assert_not_called()
+
+    def test_changed_file_is_updated_in_place(self):
+        self.sync()
+        main_id = self.drive.find('main.py')[0]['id']
+        self.write('src/main.py', b'print(2)')
+        # Same size, so only the checksum tells the files apart
+        os.utime(os.path.join(self.local, 'src', 'main.py'), (0, 0))
+
+        counts = self.sync()
+
+        self.assertEqual((counts['updated'], counts['unchanged']), (1, 2))
+        self.assertEqual(len(self.drive.find('main.py')), 1)
+        self.assertEqual(self.drive.content[main_id], b'print(2)')
+
+    def test_sync_down_mirrors_the_folder(self):
+        project = self.drive.add_folder('project')
+        docs = self.drive.add_folder('docs', project)
+        self.drive.add_file('guide.md', b'# guide', parents=[docs], modifiedTime='2024-05-01T12:00:00.123Z')
+        self.drive.add_file('notes', parents=[project], mime_type='application/vnd.google-apps.document')
+        target = os.path.join(self.tmp.name, 'mirror')
+
+        counts = self.sync('down', target)
+
+        self.assertEqual(counts['downloaded'], 1)
+        guide = os.path.join(target, 'docs', 'guide.md')
+        with open(guide, 'rb') as f:
+            self.assertEqual(f.read(), b'# guide')
+        self.assertEqual(os.stat(guide).st_mtime_ns // 1000000, 1714564800123)
+        self.assertFalse(os.path.exists(os.path.join(target, 'notes')))
+        self.assertEqual(self.sync('down', target)['unchanged'], 1)
+
+    def test_sync_down_decompresses_compressed_uploads(self):
+        data = b'log line\n' * 1000
+        self.write('README', data)
+        with patch('sys.stdout', new_callable=io.StringIO):
+            UploadOperation(self.credentials, os.path.join(self.local, 'README'), 'project', compress='gzip',
+                            hash_cache=self.hash_cache).execute()
+        target = os.path.join(self.tmp.name, 'mirror')
+
+        self.assertEqual(self.sync('down', target)['downloaded'], 1)
+        with open(os.path.join(target, 'README'), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(self.sync('down', target)['unchanged'], 1)
+
+    def test_sync_down_creates_the_local_directory(self):
+        project = self.drive.add_folder('project')
+        self.drive.add_file('top.txt', b'top', parents=[project])
+        target = os.path.join(self.tmp.name, 'new', 'mirror')
+
+        counts = self.sync('down', target)
+
+        self.assertEqual((counts['downloaded'], counts['failed']), (1, 0))
+        with open(os.path.join(target, 'top.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'top')
+
+    def test_sync_down_skips_names_leaving_the_directory(self):
+        project = self.drive.add_folder('project')
+        self.drive.add_file('../escaped.txt', b'x', parents=[project])
+        self.drive.add_file('ok.txt', b'ok', parents=[project])
+        target = os.path.join(self.tmp.name, 'mirror')
+
+        counts = self.sync('down', target)
+
+        self.assertEqual(counts['downloaded'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'escaped.txt')))
+        self.assertEqual(os.listdir(target), ['ok.txt'])
+
+
+class TestJobsFile(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.manifest = os.path.join(self.tmp.name, 'ops.jsonl')
+        with open(os.path.join(self.tmp.name, 'a.txt'), 'wb') as f:
+            f.write(b'alpha')
+        self.old_id = self.drive.add_file('old.log', b'stale')
+        reports = self.drive.add_folder('reports')
+        self.drive.add_file('q3.csv', b'1,2,3', parents=[reports])
+
+    def write_manifest(self, *jobs):
+        with open(self.manifest, 'w') as f:
+            for job in jobs:
+                f.write((job if isinstance(job, str) else json.dumps(job)) + '\n')
+
+    def run_jobs(self):
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            counts = JobsFileOperation(self.credentials, self.manifest, jobs=3, cwd=self.tmp.name,
+                                       sessions=UploadSessions(os.path.join(self.tmp.name, 'sessions.json'))).execute()
+        return counts, stdout.getvalue()
+
+    def test_runs_mixed_jobs_and_skips_finished_ones_on_rerun(self):
+        self.write_manifest(
+            {'op': 'upload', 'path': 'a.txt', 'folder': 'inbox'},
+            {'op': 'download', 'file': 'q3.csv', 'folder': 'reports', 'output': 'out'},
+            {'op': 'delete', 'file': 'old.log'},
+            {'op': 'list', 'folder': 'reports'},
+            {'op': 'download', 'file': 'missing.bin'},
+            'not json',
+        )
+
+        counts, output = self.run_jobs()
+
+        self.assertEqual(counts, {'succeeded': 4, 'failed': 2, 'skipped': 0})
+        inbox = self.drive.find('inbox', 'root')[0]
+        self.assertEqual(self.drive.content[self.drive.find('a.txt', inbox['id'])[0]['id']], b'alpha')
+        with open(os.path.join(self.tmp.name, 'out', 'q3.csv'), 'rb') as f:
+            self.assertEqual(f.read(), b'1,2,3')
+        self.assertNotIn(self.old_id, self.drive.files)
+        self.assertIn('"name": "q3.csv"', output)
+        with open(f"{self.manifest}.checkpoint") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(sorted(r['line'] for r in records if r['status'] == 'ok'), [1, 2, 3, 4])
+
+        # Only the failed jobs and edited lines run again
+        self.drive.add_file('missing.bin', b'found')
+        self.write_manifest(
+            {'op': 'upload', 'path': 'a.txt', 'folder': 'inbox'},
+            {'op': 'download', 'file': 'q3.csv', 'folder': 'reports', 'output': 'out2'},
+            {'op': 'delete', 'file': 'old.log'},
+            {'op': 'list', 'folder': 'reports'},
+            {'op': 'download', 'file': 'missing.bin'},
+            'not json',
+        )
+        counts, _ = self.run_jobs()
+
+        self.assertEqual(counts, {'succeeded': 2, 'failed': 1, 'skipped': 3})
+        self.assertEqual(len(self.drive.find('a.txt')), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'out2', 'q3.csv')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'missing.bin')))
+
+    def test_download_skips_names_leaving_the_output_directory(self):
+        self.drive.add_file('..', b'escape')
+        self.write_manifest({'op': 'download', 'file': '..', 'output': 'out'})
+
+        counts, output = self.run_jobs()
+
+        self.assertEqual(counts['failed'], 0)
+        self.assertIn("Skipping ..: not a valid local path", output)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'out')))
+
+
+
+class TestWatch(FakeDriveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.mirror = os.path.join(self.tmp.name, 'mirror')
+        self.state = os.path.join(self.tmp.name, 'watch_state.db')
+        self.project = self.drive.add_folder('project')
+        self.docs = self.drive.add_folder('docs', self.project)
+        self.readme = self.drive.add_file('README', b'v1', parents=[self.project])
+        self.drive.add_file('elsewhere.txt', b'x')
+
+    def watch(self, **kwargs):
+        operation = WatchOperation(self.credentials, 'project', state_path=self.state, **kwargs)
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            operation.prepare()
+        return operation, stdout
+
+    def poll(self, operation, stdout):
+        with patch('sys.stdout', stdout):
+            return operation.poll()
+
+    def read(self, *parts):
+        with open(os.path.join(self.mirror, *parts), 'rb') as f:
+            return f.read()
+
+    def test_changes_are_applied_to_the_mirror(self):
+        operation, stdout = self.watch(mirror=self.mirror)
+        self.assertEqual(self.read('README'), b'v1')
+
+        guide = self.drive.add_file('guide.md', b'# guide', parents=[self.docs])
+        self.drive.update_file(self.readme, b'v2')
+        self.drive.update_file(self.docs, name='manual')
+        self.drive.add_file('unrelated.txt', b'x')
+        self.poll(operation, stdout)
+
+        self.assertEqual(self.read('README'), b'v2')
+        self.assertEqual(self.read('manual', 'guide.md'), b'# guide')
+        self.assertFalse(os.path.exists(os.path.join(self.mirror, 'docs')))
+        self.assertFalse(os.path.exists(os.path.join(self.mirror, 'unrelated.txt')))
+
+        self.drive.remove(self.docs)
+        self.drive.update_file(self.readme, trashed=True)
+        self.assertGreater(self.poll(operation, stdout), 0)
+
+        self.assertEqual(os.listdir(self.mirror), [])
+        self.assertIsNone(operation.state.path_of(guide))
+        # An idle poll writes nothing to the state
+        writes = operation.state.db.total_changes
+        self.assertEqual(self.poll(operation, stdout), 0)
+        self.assertEqual(operation.state.db.total_changes, writes)
+
+    def test_folder_moved_in_brings_its_files(self):
+        operation, stdout = self.watch(mirror=self.mirror)
+        outside = self.drive.add_folder('outside')
+        inner = self.drive.add_folder('inner', outside)
+        deep = self.drive.add_file('deep.txt', b'deep', parents=[inner])
+        self.poll(operation, stdout)
+
+        self.drive.update_file(outside, add_parents=self.project, remove_parents='root')
+        self.poll(operation, stdout)
+
+        self.assertEqual(self.read('outside', 'inner', 'deep.txt'), b'deep')
+        self.assertEqual(operation.state.path_of(deep), 'outside/inner/deep.txt')
+        self.assertIn('Added outside/inner/deep.txt', stdout.getvalue())
+
+    def test_jsonl_events_resume_from_the_saved_cursor(self):
+        operation, _ = self.watch(output_format='jsonl')
+        notes = self.drive.add_file('notes.txt', b'n', parents=[self.docs])
+        stdout = io.StringIO()
+        self.poll(operation, stdout)
+        self.assertEqual([json.loads(line)['path'] for line in stdout.getvalue().splitlines()], ['docs/notes.txt'])
+
+        # A restarted watch picks up only what changed while it was down
+        self.drive.update_file(notes, add_parents=self.project, remove_parents=self.docs)
+        listings = len([r for r in self.drive.requests if r[:2] == ('GET', '/drive/v3/files')])
+        operation, stdout = self.watch(output_format='jsonl')
+        self.poll(operation, stdout)
+
+        events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([(e['event'], e['path'], e.get('old_path')) for e in events],
+                         [('moved', 'notes.txt', 'docs/notes.txt')])
+        self.assertEqual(len([r for r in self.drive.requests if r[:2] == ('GET', '/drive/v3/files')]), listings)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+from functions.watch_state import WatchState
+
+
+class TestWatchState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'watch_state.db')
+        self.state = WatchState(self.path)
+        self.addCleanup(self.state.close)
+        self.state.reset('project', None, 'folder-id', 'token-1')
+        for file_id, path in [('a', 'docs/'), ('b', 'docs/guide.md'), ('c', 'docs/deep/'), ('d', 'docs/deep/x.txt'),
+                              ('e', 'docs2/'), ('f', 'docs.txt')]:
+            self.state.add(file_id, path)
+
+    def test_move_renames_only_the_subtree(self):
+        self.state.move('docs/', 'manual/')
+
+        self.assertEqual(self.state.path_of('d'), 'manual/deep/x.txt')
+        self.assertEqual(self.state.path_of('e'), 'docs2/')
+        self.assertEqual(self.state.path_of('f'), 'docs.txt')
+
+    def test_remove_drops_only_the_subtree(self):
+        self.state.remove('docs/')
+
+        self.assertIsNone(self.state.path_of('b'))
+        self.assertIsNone(self.state.path_of('d'))
+        self.assertEqual(self.state.path_of('e'), 'docs2/')
+        self.assertEqual(self.state.path_of('folder-id'), '')
+
+    def test_state_survives_a_restart(self):
+        self.state.commit()
+
+        state = WatchState(self.path)
+        self.addCleanup(state.close)
+        self.assertTrue(state.matches('project', None))
+        self.assertFalse(state.matches(None, None))
+        self.assertEqual(state.get('page_token'), 'token-1')
+        self.assertEqual(state.path_of('b'), 'docs/guide.md')
+
+
+if __name__ == '__main__':
+    unittest.main()